@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""
+Замеры производительности, не входят в набор тестов.
+
+Запуск из каталога src::
+
+    $ python -m benchmarks.executor
+    $ python -m benchmarks.wsse
+    $ python -m benchmarks.smev256
+    $ python -m benchmarks.client
+"""
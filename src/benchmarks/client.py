@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""
+Time of signing outgoing client messages in the marshalled hook, as it
+was done before, and in the sending transport
+"""
+import time
+
+from lxml import etree
+from suds.sax.parser import Parser
+
+from spyne_smev.client import Client, _WsseSecurity
+from spyne_smev.wsse import utils
+
+from tests.test_client import _create_envelope
+from tests.test_wsse import (
+    TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS, TEST_X509_CERT)
+
+ITERATIONS = 5
+
+
+def sign_marshalled(root):
+    document = etree.fromstring(root.plain())
+    signed = utils.sign_document(
+        document, TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+    out_object = Parser().parse(string=etree.tostring(signed, encoding="utf8"))
+    root.children = out_object.root().children
+    return root.plain().encode("utf-8")
+
+
+def measure(sign, items):
+    envelope = _create_envelope(items)
+    elapsed = 0
+    for _ in xrange(ITERATIONS):
+        root = Parser().parse(string=envelope).root()
+        started = time.time()
+        message = sign(root)
+        elapsed += time.time() - started
+    utils.verify_document(etree.fromstring(message), TEST_X509_CERT)
+    return elapsed / ITERATIONS
+
+
+if __name__ == '__main__':
+    security = _WsseSecurity(
+        TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS, TEST_X509_CERT,
+        TEST_X509_CERT, "sha1", Client.BOTH)
+    for items in (20, 20000):
+        before = measure(sign_marshalled, items)
+        after = measure(
+            lambda root: security.sign(root.plain().encode("utf-8")), items)
+        print("{0} items, marshalled: {1:.2f} ms, sending: {2:.2f} ms".format(
+            items, before * 1e3, after * 1e3))
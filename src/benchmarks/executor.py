@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+Signatures per second of CryptoExecutor with different number of workers
+"""
+import threading
+import time
+
+from spyne_smev import crypto
+from spyne_smev.executor import CryptoExecutor
+
+from tests.test_wsse import TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS
+
+CLIENTS = 8
+SIGNATURES = 50
+
+
+def measure(workers):
+    executor = CryptoExecutor(workers=workers, max_queue=CLIENTS)
+    pkey = crypto.load_private_key(TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+    data = "x" * 4096
+
+    def client():
+        for _ in xrange(SIGNATURES):
+            executor.run(crypto.sign, data, pkey)
+
+    threads = [threading.Thread(target=client) for _ in xrange(CLIENTS)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    executor.shutdown()
+    return CLIENTS * SIGNATURES / elapsed
+
+
+if __name__ == '__main__':
+    for workers in (1, 2, 4):
+        print("{0} workers: {1:.0f} signatures/s".format(
+            workers, measure(workers)))
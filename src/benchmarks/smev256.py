@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+Time of building smev:Message element from scratch and from the template
+"""
+import time
+
+from spyne_smev.smev256 import Smev256
+
+from tests.test_smev256 import SMEV_PARAMS, _create_ctx
+
+ITERATIONS = 5000
+
+
+def measure(protocol, reset):
+    ctx = _create_ctx()
+    started = time.time()
+    for _ in xrange(ITERATIONS):
+        if reset:
+            protocol._message_template = None
+        protocol._create_message_element(ctx)
+    return (time.time() - started) / ITERATIONS
+
+
+if __name__ == '__main__':
+    protocol = Smev256(**SMEV_PARAMS)
+    before = measure(protocol, True)
+    after = measure(protocol, False)
+    print(
+        "smev:Message from scratch: {0:.1f} us, from template: "
+        "{1:.1f} us".format(before * 1e6, after * 1e6))
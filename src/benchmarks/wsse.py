@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+"""
+Time of signing with sign_document and with precompiled SigningProfile
+"""
+import time
+
+from lxml import etree
+
+from spyne_smev.wsse import utils
+
+from tests.test_wsse import (
+    TEST_ENVELOPE, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS, TEST_X509_CERT)
+
+ITERATIONS = 200
+
+
+def measure(sign):
+    document = etree.fromstring(TEST_ENVELOPE)
+    started = time.time()
+    for _ in xrange(ITERATIONS):
+        signed = sign(document)
+    elapsed = (time.time() - started) / ITERATIONS
+    utils.verify_document(signed, TEST_X509_CERT)
+    return elapsed
+
+
+if __name__ == '__main__':
+    profile = utils.SigningProfile(
+        TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+    before = measure(lambda document: utils.sign_document(
+        document, TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS))
+    after = measure(profile.sign)
+    print("sign_document: {0:.1f} us, SigningProfile.sign: {1:.1f} us".format(
+        before * 1e6, after * 1e6))
@@ -9,6 +9,8 @@ _base.py
 import logging as _logging
 logger = _logging.getLogger(__name__)
 
+import base64 as _base64
+from copy import deepcopy as _deepcopy
 import os
 
 from lxml import etree as _etree
@@ -21,6 +23,22 @@ import _utils
 import _xmlns as _ns
 from wsse.protocols import Soap11WSSE
 from fault import ApiError as _ApiError
+import validation as _validation
+import mtom as _mtom
+
+
+class SmevParts(object):
+    """
+    Элементы СМЭВ входящего сообщения
+    """
+
+    def __init__(self):
+        self.header = None
+        self.message = None
+        self.message_data = None
+        self.app_data = None
+        self.app_document = None
+        self.method = None
 
 
 class BaseSmev(Soap11WSSE):
@@ -31,6 +49,15 @@ class BaseSmev(Soap11WSSE):
         Конкретные реализации протоколов должны перегрузить методы
         :func:`create_in_smev_objects` и :func:`construct_smev_envelope`
 
+    :param smev_validation: Политика проверки входящих сообщений по схеме,
+        по умолчанию проверяются все элементы СМЭВ
+    :type smev_validation: spyne_smev.validation.ValidationPolicy
+    :param mtom: Параметры MTOM, если заданы, документ smev:AppDocument
+        ответа передается вложением
+    :type mtom: spyne_smev.mtom.Mtom
+    :param bool stream_output: Отдавать подписанный ответ по частям
+    :param bool stream_input: Разбирать запрос по мере чтения, длинное
+        содержимое smev:BinaryData переносится во временный файл
     :param smev_params: Словарь с параметрами для СМЭВ
     """
     _smev_schema_path = None
@@ -40,44 +67,154 @@ class BaseSmev(Soap11WSSE):
     def __init__(
             self, app=None, validator=None, xml_declaration=True,
             cleanup_namespaces=True, encoding='UTF-8', pretty_print=False,
-            wsse_security=None, **smev_params):
+            wsse_security=None, wire_logger=None, smev_validation=None,
+            mtom=None, stream_output=False, stream_input=False,
+            **smev_params):
         super(BaseSmev, self).__init__(
             app, validator, xml_declaration,
             cleanup_namespaces, encoding,
-            pretty_print, wsse_security)
+            pretty_print, wsse_security, wire_logger, mtom, stream_output,
+            stream_input)
         self.smev_params = smev_params or {}
-        self._smev_schema = None
+        self.smev_validation = (
+            smev_validation or _validation.ValidationPolicy())
+        if self._ns is not None:
+            self._compile_smev_paths()
+
+    def _compile_smev_paths(self):
+        smev = self._ns["smev"]
+        self._smev_tags = dict(
+            (name, "{{{0}}}{1}".format(smev, name)) for name in (
+                "Header", "Message", "MessageData", "AppData", "AppDocument",
+                "BinaryData"))
+        self._smev_paths = {
+            "soap_header": "./{{{0}}}Header".format(_ns.soapenv),
+            "soap_body": "./{{{0}}}Body".format(_ns.soapenv),
+            "header": "./{{{0}}}Header".format(smev),
+            "sender_code": "./{{{0}}}Sender/{{{0}}}Code".format(smev),
+            "xop_include": "./{{{0}}}Reference/{{{1}}}Include".format(
+                smev, _ns.xop),
+            "digest_value": "./{{{0}}}DigestValue".format(smev),
+            "binary_data": "./{{{0}}}BinaryData".format(smev),
+        }
+        self.spilled_tags = (self._smev_tags["BinaryData"],)
+        self._smev_descendants = dict(
+            (name, _etree.ETXPath("descendant::" + tag))
+            for name, tag in self._smev_tags.iteritems())
 
     def create_in_document(self, ctx, charset=None):
         super(BaseSmev, self).create_in_document(ctx, charset)
         in_document, _ = ctx.in_document
         if ctx.udc is None:
             ctx.udc = _utils.EmptyCtx()
-        ctx.udc.in_smev_header_document = in_document.find(
-            ".//{{{smev}}}Header".format(**self._ns))
-        ctx.udc.in_smev_message_document = in_document.find(
-            ".//{{{smev}}}Message".format(**self._ns))
-        ctx.udc.in_smev_appdoc_document = in_document.find(
-            ".//{{{smev}}}AppDocument".format(**self._ns))
-        message_data = in_document.find(
-            ".//{{{smev}}}MessageData".format(**self._ns))
+        parts = ctx.udc.in_smev_parts = self._locate_smev_parts(in_document)
+        ctx.udc.in_smev_header_document = parts.header
+        ctx.udc.in_smev_message_document = parts.message
+        ctx.udc.in_smev_appdoc_document = parts.app_document
+        message_data = parts.message_data
 
         if any(map(_utils.isnone,
                    (ctx.udc.in_smev_message_document, message_data))):
             raise _Fault("SMEV-100010", "Invalid configuration!")
 
-        map(self._validate_smev_element, filter(_utils.notisnone, (
-            ctx.udc.in_smev_message_document,
-            ctx.udc.in_smev_header_document,
-            message_data)))
-        method_data = message_data.find(
-            ".//{{{smev}}}AppData".format(**self._ns)).getchildren()
-        method = in_document.find(
-            ".//{{{0}}}Body".format(_ns.soapenv)).getchildren()[0]
-        method.clear()
-        method.extend(method_data)
+        self._validate_smev_parts(parts)
+        self._resolve_attachment(ctx, parts)
+        method = parts.method
+        if parts.app_data is not None:
+            # AppData целиком встает на место элемента метода
+            parts.app_data.attrib.update(method.attrib)
+            _utils.transplant(parts.app_data, method, method.tag)
+        else:
+            del method[:]
         self.event_manager.fire_event('smev_in_document_built', ctx)
 
+    def _resolve_attachment(self, ctx, parts):
+        """
+        Находит вложение MTOM, на которое ссылается smev:AppDocument,
+        и сверяет его хэш со значением smev:DigestValue
+        """
+        ctx.udc.in_smev_attachment = None
+        if parts.app_document is None:
+            return
+        include = parts.app_document.find(self._smev_paths["xop_include"])
+        if include is None:
+            self._resolve_spilled(ctx, parts)
+            return
+
+        mtom = self.mtom or _mtom.Mtom()
+        try:
+            attachment = mtom.find_attachment(
+                include, ctx.udc.in_attachments or {})
+        except ValueError, e:
+            raise _Fault("SMEV-102000", unicode(e))
+        digest_value = "".join((parts.app_document.findtext(
+            self._smev_paths["digest_value"]) or "").split())
+        if digest_value != _base64.b64encode(
+                attachment.digest(mtom.digest_method)):
+            raise _Fault(
+                "SMEV-102000", "Attachment digest value doesn't match!")
+        ctx.udc.in_smev_attachment = attachment
+
+    def _resolve_spilled(self, ctx, parts):
+        """
+        Содержимое smev:BinaryData, вынесенное во временный файл при
+        потоковом разборе, декодируется в файл вложения
+        """
+        streams = getattr(ctx.udc, "in_binary_streams", None)
+        spilled = streams and streams.get(parts.app_document.findtext(
+            self._smev_paths["binary_data"]))
+        if spilled:
+            try:
+                ctx.udc.in_smev_attachment = _mtom.Attachment.from_base64(
+                    spilled.chunks())
+            except ValueError, e:
+                raise _Fault("SMEV-102000", unicode(e))
+
+    def _locate_smev_parts(self, in_document):
+        """
+        Находит элементы СМЭВ за один проход по soap Header и Body
+
+        Элементы ищутся на своих местах: smev:Header в soap Header,
+        smev:Message и smev:MessageData в элементе метода внутри Body.
+        Если сообщение построено иначе, выполняется поиск по всему документу.
+
+        :rtype: SmevParts
+        """
+        parts = SmevParts()
+        header = in_document.find(self._smev_paths["soap_header"])
+        if header is not None:
+            parts.header = header.find(self._smev_paths["header"])
+
+        body = in_document.find(self._smev_paths["soap_body"])
+        if body is not None and len(body):
+            parts.method = body[0]
+            for element in parts.method:
+                if element.tag == self._smev_tags["Message"]:
+                    parts.message = element
+                elif element.tag == self._smev_tags["MessageData"]:
+                    parts.message_data = element
+                    for data in element:
+                        if data.tag == self._smev_tags["AppData"]:
+                            parts.app_data = data
+                        elif data.tag == self._smev_tags["AppDocument"]:
+                            parts.app_document = data
+
+        if parts.message is None or parts.message_data is None:
+            search = self._smev_descendants
+            parts.header = _utils.first(search["Header"](in_document))
+            parts.message = _utils.first(search["Message"](in_document))
+            parts.app_document = _utils.first(
+                search["AppDocument"](in_document))
+            parts.message_data = _utils.first(
+                search["MessageData"](in_document))
+            if parts.message_data is not None:
+                parts.app_data = _utils.first(
+                    search["AppData"](parts.message_data))
+            if body is not None and len(body):
+                parts.method = body[0]
+
+        return parts
+
     def deserialize(self, ctx, message):
         super(BaseSmev, self).deserialize(ctx, message)
         self.create_in_smev_objects(ctx)
@@ -89,12 +226,45 @@ class BaseSmev(Soap11WSSE):
             self.construct_smev_envelope(ctx, message)
             self.event_manager.fire_event("after_serialize_smev", ctx)
 
+    @classmethod
+    def preload_schema(cls):
+        """
+        Загружает схему СМЭВ в реестр схем процесса. Вызывается до fork
+        рабочих процессов, чтобы они разделяли уже скомпилированную схему.
+        """
+        _utils.schema_registry.preload(cls._smev_schema_path)
+
+    def _validate_smev_parts(self, parts):
+        """
+        Проверяет элементы СМЭВ по схеме согласно политике проверки
+        """
+        policy = self.smev_validation
+        try:
+            map(self._validate_smev_element, filter(_utils.notisnone, (
+                parts.message, parts.header)))
+            sender_code = parts.message.findtext(
+                self._smev_paths["sender_code"])
+            if policy.should_validate(sender_code):
+                self._validate_smev_element(parts.message_data)
+            elif not (policy.mode == _validation.ASYNC and policy.defer(
+                    self._get_smev_errors, _etree.tostring(
+                        parts.message_data, with_tail=False))):
+                policy.count("skipped")
+                return
+        except _Fault:
+            policy.count("failed")
+            raise
+        if policy.mode != _validation.ASYNC:
+            policy.count("validated")
+
+    def _get_smev_errors(self, element):
+        return _utils.schema_registry.validate(
+            self._smev_schema_path, element)
+
     def _validate_smev_element(self, element):
-        self._smev_schema = self._smev_schema or _utils.load_schema(
-            self._smev_schema_path)
-        if not self._smev_schema.validate(element):
-            errors = "\n".join((
-                err.message for err in self._smev_schema.error_log))
+        errors = self._get_smev_errors(element)
+        if errors:
+            errors = "\n".join(errors)
             raise _Fault(
                 "SMEV-102000",
                 "Message didn't pass validation checks!"
@@ -164,17 +334,15 @@ class BaseSmevWsdl(_Wsdl11):
     smev_schema_path = None
     smev_ns = None
 
-    __smev_schema = None
-
     def __init__(self, interface=None, _with_partnerlink=False):
         super(BaseSmevWsdl, self).__init__(interface, _with_partnerlink)
         self._ns = self.interface.nsmap.copy()
         self._ns.update({'smev': self.smev_ns})
 
     def _get_smev_schema(self):
-        self.__smev_schema = self.__smev_schema or _utils.load_xml(
-            self.smev_schema_path)
-        return self.__smev_schema
+        # документ из реестра общий, поэтому изменяется только его копия
+        return _deepcopy(_utils.schema_registry.get_document(
+            self.smev_schema_path))
 
     def build_interface_document(self, url):
         super(BaseSmevWsdl, self).build_interface_document(url)
@@ -217,10 +385,10 @@ class BaseSmevWsdl(_Wsdl11):
         )
         if import_xop_include is not None:
             import_xop_include.attrib.pop("schemaLocation")
-            xop_include_schema = _utils.load_xml(
-                os.path.join(
+            xop_include_schema = _deepcopy(
+                _utils.schema_registry.get_document(os.path.join(
                     os.path.dirname(__file__), "xsd", "xop-include.xsd")
-            ).getroot()
+                ).getroot())
             self.root_elt.find("./{{{0}}}types".format(_ns.wsdl)).insert(
                 0, xop_include_schema)
 
@@ -7,6 +7,7 @@ factory.py
 :Author: timic
 """
 import os
+import threading
 from StringIO import StringIO
 
 from lxml import etree
@@ -35,6 +36,28 @@ def copy_with_nsmap(element, nsmap):
     return new_element
 
 
+def transplant(element, target, tag=None):
+    """
+    Ставит элемент на место target одной операцией
+
+    Дочерние элементы не перебираются и не копируются, элемент переносится
+    вместе с текстом, хвостами дочерних элементов и пространствами имен.
+    Хвостовой текст target остается на прежнем месте.
+
+    :param element: Переносимый элемент, может быть потомком target
+    :param target: Заменяемый элемент
+    :param tag: Новое имя переносимого элемента
+    :return: element
+    """
+    if tag is not None:
+        element.tag = tag
+    tail = target.tail
+    target.getparent().replace(target, element)
+    element.tail = tail
+
+    return element
+
+
 def namespace(ns):
 
     return ComplexModelMeta(
@@ -71,6 +94,105 @@ def load_schema(schema_path):
     return schema
 
 
+class _SchemaRegistry(object):
+    """
+    Реестр xsd-схем процесса
+
+    Документ каждой схемы разбирается один раз на процесс и хранится по
+    ключу (путь, mtime), при изменении файла прежняя версия удаляется.
+    Скомпилированный XMLSchema хранит журнал ошибок последней проверки,
+    поэтому на время проверки схема выдается одному потоку, а затем
+    возвращается в общий пул. Схемы, загруженные до fork, разделяются
+    дочерними процессами.
+    """
+
+    def __init__(self):
+        self._documents = {}
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path, None
+        if not os.path.exists(path):
+            raise ValueError(path)
+        return path, os.path.getmtime(path)
+
+    def get_document(self, path):
+        """
+        Возвращает разобранный документ, общий для всех потоков.
+        Документ нельзя изменять.
+        """
+        return self._get_document(self._key(path))
+
+    def _get_document(self, key):
+        document = self._documents.get(key)
+        if document is None:
+            with self._lock:
+                document = self._documents.get(key)
+                if document is None:
+                    document = self._load(key[0])
+                    for old_key in self._documents.keys():
+                        if old_key[0] == key[0]:
+                            del self._documents[old_key]
+                            self._schemas.pop(old_key, None)
+                    self._documents[key] = document
+        return document
+
+    @staticmethod
+    def _load(path):
+        if path.startswith('http://') or path.startswith('https://'):
+            import requests
+            response = requests.get(path)
+            return etree.parse(StringIO(response.content), base_url=path)
+        return load_xml(path)
+
+    def _acquire(self, key):
+        with self._lock:
+            schemas = self._schemas.get(key)
+            if schemas:
+                return schemas.pop()
+        return etree.XMLSchema(self._get_document(key))
+
+    def _release(self, key, schema):
+        with self._lock:
+            # схема устаревшей версии файла не возвращается в пул
+            if key in self._documents:
+                self._schemas.setdefault(key, []).append(schema)
+
+    def validate(self, path, element):
+        """
+        Проверяет элемент по схеме
+
+        :return: Список сообщений об ошибках, пустой для верного элемента
+        """
+        key = self._key(path)
+        schema = self._acquire(key)
+        try:
+            if schema.validate(element):
+                return []
+            return [err.message for err in schema.error_log]
+        finally:
+            self._release(key, schema)
+
+    def preload(self, *paths):
+        """
+        Загружает и компилирует схемы заранее, например до fork
+        """
+        for path in paths:
+            key = self._key(path)
+            self._release(key, self._acquire(key))
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._schemas.clear()
+
+
+schema_registry = _SchemaRegistry()
+
+
 def native(s):
     """
     Convert :py:class:`bytes` or :py:class:`unicode` to the native
@@ -99,5 +221,12 @@ else:
         return s
 
 
+def first(items, default=None):
+    """
+    Возвращает первый элемент последовательности или default
+    """
+    return items[0] if items else default
+
+
 isnone = lambda obj: obj is None
 notisnone = lambda obj: not obj is None
\ No newline at end of file
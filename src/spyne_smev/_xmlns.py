@@ -39,6 +39,7 @@ xml_c14n = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
 xml_c14n_wc = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315#WithComments"
 
 xs = "http://www.w3.org/2001/XMLSchema"
+xop = "http://www.w3.org/2004/08/xop/include"
 
 base64enc = (
     "http://docs.oasis-open.org/wss/2004/01"
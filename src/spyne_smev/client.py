@@ -9,12 +9,15 @@ client.py
 import logging as _logging
 logger = _logging.getLogger(__name__)
 
+from copy import deepcopy as _deepcopy
+
 from lxml import etree as _etree
 from suds.client import Client as _SudsClient
 from suds.plugin import MessagePlugin as _MessagePlugin
-from suds.sax.parser import Parser as _Parser
+from suds.transport import Transport as _Transport
 
 from spyne_smev import crypto as _crypto
+from spyne_smev import transport as _transport
 from spyne_smev.wsse import utils as _utils
 
 
@@ -33,6 +36,19 @@ class Client(_SudsClient):
     :param unicode incoming_certificate_path: File path to certificate which
                                                allowed in incoming message
     :param bytes incoming_certificate: Incoming certificate
+    :param trust_store: Certificates allowed in incoming message, used
+                        instead of incoming certificate
+    :type trust_store: spyne_smev.wsse.truststore.TrustStore
+    :param executor: Executor to run signing and verification in
+    :type executor: spyne_smev.executor.CryptoExecutor
+    :param str wsdl_version: Version of the service wsdl. Parsed wsdl is
+                             cached on disk and in memory until the version
+                             changes, for a day if it is not given
+
+    Unless ``transport`` or ``proxy`` is passed, calls are made through
+    :class:`spyne_smev.transport.PooledTransport`, which reuses
+    connections across calls and clients. It doesn't support proxies, so
+    with ``proxy`` the default suds transport is used.
 
     """
 
@@ -46,13 +62,21 @@ class Client(_SudsClient):
             certificate_path=None, certificate=None,
             in_certificate_path=None, in_certificate=None,
             digest_method="sha1",
-            security_direction=BOTH, **kwargs):
+            security_direction=BOTH, trust_store=None, executor=None,
+            wsdl_version=None, **kwargs):
 
         if not security_direction in (self.IN, self.OUT, self.BOTH):
             raise ValueError(
                 "direction should be constant either IN, OUT or BOTH!")
 
         kwargs["prettyxml"] = False
+        if "proxy" not in kwargs:
+            kwargs.setdefault("transport", _transport.PooledTransport())
+        if "cache" not in kwargs:
+            duration = {} if wsdl_version else {"days": 1}
+            kwargs["cache"] = _transport.VersionedObjectCache(
+                version=wsdl_version or "", **duration)
+            kwargs.setdefault("cachingpolicy", 1)
 
         self._private_key_path = private_key_path
         self._certificate_path = certificate_path
@@ -70,9 +94,12 @@ class Client(_SudsClient):
             self._security = _WsseSecurity(
                 self.private_key, private_key_pass or _crypto._ffi.NULL,
                 self.certificate, self.in_certificate,
-                digest_method, security_direction)
+                digest_method, security_direction, trust_store, executor)
             kwargs.setdefault("plugins", []).append(self._security)
         super(Client, self).__init__(url, **kwargs)
+        if self._security and security_direction in (self.OUT, self.BOTH):
+            self.set_options(transport=_SigningTransport(
+                self.options.transport, self._security))
 
     @property
     def private_key(self):
@@ -104,7 +131,8 @@ class Client(_SudsClient):
 class _WsseSecurity(_MessagePlugin):
 
     def __init__(self, private_key, private_key_password, certificate,
-                 in_certificate, digest_method, direction=Client.BOTH):
+                 in_certificate, digest_method, direction=Client.BOTH,
+                 trust_store=None, executor=None):
 
         self.private_key = private_key
         self.private_key_password = private_key_password
@@ -112,25 +140,43 @@ class _WsseSecurity(_MessagePlugin):
         self.in_certificate = in_certificate
         self.digest_method = digest_method
         self.direction = direction
+        self.trust_store = trust_store
+        self.executor = executor
         self._verified = None
+        self._signing_profile = None
 
-    def marshalled(self, context):
-        if self.direction in (Client.OUT, Client.BOTH):
-            logger.debug("Signing document ...")
-            document = _etree.fromstring(context.envelope.plain())
-            try:
-                out_document = _utils.sign_document(
-                    document, self.certificate, self.private_key,
-                    self.private_key_password, self.digest_method)
-            except Exception, e:
-                logger.error("Cannot sign document")
-                logger.exception(e)
-                raise
-            out_string = _etree.tostring(out_document, encoding="utf8")
-            out_object = _Parser().parse(string=out_string)
-            context.envelope.children = out_object.root().children
+    def _call(self, fn, *args, **kwargs):
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        return self.executor.run(fn, *args, **kwargs)
 
-            logger.debug("Successfully signed")
+    @property
+    def signing_profile(self):
+        if self._signing_profile is None:
+            self._signing_profile = _utils.SigningProfile(
+                self.certificate, self.private_key,
+                self.private_key_password, self.digest_method)
+        return self._signing_profile
+
+    def sign(self, message):
+        """
+        Signs serialized envelope: it is parsed once, signed in place and
+        serialized back
+
+        :param bytes message: Soap envelope
+        :return bytes: Signed soap envelope
+        """
+        logger.debug("Signing document ...")
+        document = _etree.fromstring(message)
+        try:
+            self._call(self.signing_profile.sign, document, in_place=True)
+        except Exception, e:
+            logger.error("Cannot sign document")
+            logger.exception(e)
+            raise
+        logger.debug("Successfully signed")
+        return _etree.tostring(
+            document, encoding="UTF-8", xml_declaration=True)
 
     def received(self, context):
         if self.direction in (Client.IN, Client.BOTH):
@@ -138,7 +184,9 @@ class _WsseSecurity(_MessagePlugin):
             self._verified = False
             document = _etree.fromstring(context.reply)
             try:
-                _utils.verify_document(document, self.in_certificate)
+                self._call(
+                    _utils.verify_document, document, self.in_certificate,
+                    trust_store=self.trust_store)
                 self._verified = True
             except Exception, e:
                 logger.exception(e)
@@ -151,4 +199,29 @@ class _WsseSecurity(_MessagePlugin):
 
     @property
     def last_verified(self):
-        return self._verified
\ No newline at end of file
+        return self._verified
+
+
+class _SigningTransport(_Transport):
+    """
+    Signs outgoing messages right before they are sent by ``transport``.
+
+    Suds 0.4 ignores envelope replaced in ``sending`` hook of a plugin,
+    so the final message text is signed here.
+    """
+
+    def __init__(self, transport, security):
+        _Transport.__init__(self)
+        self.transport = transport
+        self.security = security
+        self.options = transport.options
+
+    def open(self, request):
+        return self.transport.open(request)
+
+    def send(self, request):
+        request.message = self.security.sign(request.message)
+        return self.transport.send(request)
+
+    def __deepcopy__(self, memo={}):
+        return self.__class__(_deepcopy(self.transport, memo), self.security)
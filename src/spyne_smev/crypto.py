@@ -10,7 +10,10 @@ import logging as _logging
 logger = _logging.getLogger(__name__)
 # TODO: add log messages
 
+from collections import OrderedDict as _OrderedDict
 from functools import partial as _partial
+import hashlib as _hashlib
+import threading as _threading
 
 from cryptography.hazmat.bindings.openssl.binding import Binding as _Binding
 
@@ -55,37 +58,285 @@ def _exception_from_error_queue(exception_type):
 _raise_current_error = _partial(_exception_from_error_queue, Error)
 
 
-def get_text_digest(text, digest_name="sha1"):
+class PrivateKey(object):
     """
-    Returns binary digest value for given text.
+    Parsed private key handle. Wraps ``EVP_PKEY*`` so PEM data is parsed
+    only once and the key can be reused for any number of signatures.
+
+    :param evp_pkey: ``EVP_PKEY*`` cffi pointer
+    """
+
+    def __init__(self, evp_pkey):
+        self._evp_pkey = evp_pkey
+
+    @classmethod
+    def from_pem(cls, pem_buffer, pass_phrase=_ffi.NULL):
+        """
+        Parses private key from PEM text bypassing the handle cache.
+
+        :param bytes pem_buffer: Private key
+        :param unicode pass_phrase: Private key's passphrase
+        :rtype: PrivateKey
+        """
+        return cls(_load_private_key(pem_buffer, pass_phrase))
+
+
+class Certificate(object):
+    """
+    Parsed X509 certificate handle. Wraps ``X509*`` and lazily extracts
+    certificate's public key and signature algorithm name.
+
+    :param x509: ``X509*`` cffi pointer
+    """
+
+    def __init__(self, x509):
+        self._x509 = x509
+        self._pem = None
+        self._public_key = None
+        self._signature_algorithm_name = None
+
+    @classmethod
+    def from_pem(cls, pem_buffer):
+        """
+        Parses certificate from PEM text bypassing the handle cache.
+
+        :param bytes pem_buffer: Certificate
+        :rtype: Certificate
+        """
+        certificate = cls(_load_certificate(pem_buffer))
+        certificate._pem = pem_buffer
+        return certificate
+
+    @property
+    def pem(self):
+        """
+        PEM text of the certificate
+        """
+        if self._pem is None:
+            bio = _new_mem_buf()
+            if _lib.PEM_write_bio_X509(bio, self._x509) != 1:
+                _raise_current_error()
+            data = _ffi.new("char **")
+            length = _lib.BIO_get_mem_data(bio, data)
+            self._pem = _ffi.buffer(data[0], length)[:]
+        return self._pem
+
+    @property
+    def public_key(self):
+        """
+        ``EVP_PKEY*`` of the certificate's public key
+        """
+        if self._public_key is None:
+            self._public_key = _get_cert_pub_key(self._x509)
+        return self._public_key
+
+    @property
+    def signature_algorithm_name(self):
+        """
+        Short name of the certificate signature algorithm
+        """
+        if self._signature_algorithm_name is None:
+            digest_nid = _lib.OBJ_obj2nid(
+                self._x509.cert_info.signature.algorithm)
+            if digest_nid == _lib.NID_undef:
+                raise ValueError(
+                    "Unsupported certificate signature algorithm")
+
+            digest_name = _lib.OBJ_nid2sn(digest_nid)
+            if digest_name == _ffi.NULL:
+                _raise_current_error()
+            self._signature_algorithm_name = _ffi.string(digest_name)
+
+        return self._signature_algorithm_name
+
+
+class _HandleCache(object):
+    """
+    Bounded thread-safe LRU cache of parsed key/certificate handles.
+
+    :param int maxsize: Maximum number of cached handles
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._handles = _OrderedDict()
+        self._lock = _threading.Lock()
+
+    def get(self, key, factory):
+        with self._lock:
+            handle = self._handles.pop(key, None)
+            if handle is not None:
+                self._handles[key] = handle
+                return handle
+
+        # parsing is done outside of the lock, concurrent misses on the same
+        # key at worst parse the same PEM twice
+        handle = factory()
+        with self._lock:
+            self._handles[key] = handle
+            while len(self._handles) > self.maxsize:
+                self._handles.popitem(last=False)
+
+        return handle
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+    def __len__(self):
+        return len(self._handles)
+
+
+_private_keys = _HandleCache(32)
+_certificates = _HandleCache(256)
+
+
+def _fingerprint(*chunks):
+    digest = _hashlib.sha1()
+    for chunk in chunks:
+        if isinstance(chunk, _utils.text_type):
+            chunk = chunk.encode("ascii")
+        digest.update(chunk)
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def load_private_key(pkey_buffer, pkey_pass=_ffi.NULL):
+    """
+    Returns cached private key handle for given PEM data. Parsed keys are
+    cached by fingerprint of PEM content and passphrase.
+
+    :param pkey_buffer: Private key PEM data or already loaded handle
+    :type pkey_buffer: bytes or PrivateKey
+    :param unicode pkey_pass: Private key's passphrase
+    :rtype: PrivateKey
+    """
+    if isinstance(pkey_buffer, PrivateKey):
+        return pkey_buffer
+
+    if pkey_pass is None or pkey_pass == _ffi.NULL:
+        pkey_pass = _ffi.NULL
+        key = _fingerprint(pkey_buffer)
+    else:
+        key = _fingerprint(pkey_buffer, pkey_pass)
+
+    return _private_keys.get(
+        key, lambda: PrivateKey.from_pem(pkey_buffer, pkey_pass))
+
+
+def load_certificate(cert_data):
+    """
+    Returns cached certificate handle for given PEM data. Parsed
+    certificates are cached by fingerprint of PEM content.
+
+    :param cert_data: Certificate PEM data or already loaded handle
+    :type cert_data: bytes or Certificate
+    :rtype: Certificate
+    """
+    if isinstance(cert_data, Certificate):
+        return cert_data
+
+    return _certificates.get(
+        _fingerprint(cert_data), lambda: Certificate.from_pem(cert_data))
+
+
+def clear_handle_cache():
+    """
+    Drops all cached key and certificate handles
+    """
+    _private_keys.clear()
+    _certificates.clear()
+
+
+_digest_methods = {}
+
+
+def get_digest_method(digest_name):
+    """
+    Returns ``EVP_MD*`` for given digest name. Resolved digest methods are
+    static in libcrypto, so they are memoized by name.
 
-    :param basestring text: Text for digest processing
     :param str digest_name: Digest algorithm name
-    :return str: text digest
+    :raises: ValueError
     """
-    evp_md = _lib.EVP_get_digestbyname(digest_name)
+    md = _digest_methods.get(digest_name)
+    if md is None:
+        md = _lib.EVP_get_digestbyname(_utils.byte_string(digest_name))
+        if md == _ffi.NULL:
+            raise ValueError("No such digest method: {0}".format(digest_name))
+        _digest_methods[digest_name] = md
+    return md
 
-    if evp_md == _ffi.NULL:
-        raise ValueError("No such digest method")
 
-    evp_md_ctx = _lib.EVP_MD_CTX_create()
-    if _lib.EVP_DigestInit_ex(evp_md_ctx, evp_md, _ffi.NULL) == 0:
-        _raise_current_error()
+class Digest(object):
+    """
+    Incremental message digest over ``EVP_MD_CTX``.
 
-    input_buffer = _utils.byte_string(text)
+    Object is file-like (has ``write``), so it can be used as a sink for
+    serializers. After :meth:`final` the context is reinitialized and the
+    object can be reused for the next message.
 
-    if _lib.EVP_DigestUpdate(evp_md_ctx, input_buffer, len(input_buffer)) == 0:
-        _raise_current_error()
+    :param str digest_name: Digest algorithm name
+    :raises: ValueError, spyne_smev.crypto.Error
+    """
+
+    def __init__(self, digest_name="sha1"):
+        self.digest_name = digest_name
+        self._md = get_digest_method(digest_name)
+        md_ctx = _lib.EVP_MD_CTX_create()
+        if md_ctx == _ffi.NULL:
+            _raise_current_error()
+        self._md_ctx = _ffi.gc(md_ctx, _lib.EVP_MD_CTX_destroy)
+        self.reset()
+
+    def reset(self):
+        """
+        Drops all data fed so far
+        """
+        if _lib.EVP_DigestInit_ex(self._md_ctx, self._md, _ffi.NULL) == 0:
+            _raise_current_error()
+
+    def update(self, data):
+        """
+        Feeds next chunk of data
+
+        :param basestring data: Data chunk
+        """
+        input_buffer = _utils.byte_string(data)
+        if _lib.EVP_DigestUpdate(
+                self._md_ctx, input_buffer, len(input_buffer)) == 0:
+            _raise_current_error()
+
+    write = update
+
+    def final(self):
+        """
+        Returns binary digest value of all fed data and resets the context
+
+        :return str: digest
+        """
+        result_buf = _ffi.new("char[]", _lib.EVP_MAX_MD_SIZE)
+        result_len = _ffi.new("unsigned int[]", 1)
+        result_len[0] = len(result_buf)
+        if _lib.EVP_DigestFinal_ex(self._md_ctx, result_buf, result_len) == 0:
+            _raise_current_error()
+        self.reset()
+
+        return b"".join(_ffi.buffer(result_buf, result_len[0]))
 
-    result_buf = _ffi.new("char[]", _lib.EVP_MAX_MD_SIZE)
-    result_len = _ffi.new("unsigned int[]", 1)
-    result_len[0] = len(result_buf)
-    if _lib.EVP_DigestFinal_ex(evp_md_ctx, result_buf, result_len) == 0:
-        _raise_current_error()
 
-    _lib.EVP_MD_CTX_destroy(evp_md_ctx)
+def get_text_digest(text, digest_name="sha1"):
+    """
+    Returns binary digest value for given text.
+
+    :param basestring text: Text for digest processing
+    :param str digest_name: Digest algorithm name
+    :return str: text digest
+    """
+    digest = Digest(digest_name)
+    digest.update(text)
 
-    return b"".join(_ffi.buffer(result_buf, result_len[0]))
+    return digest.final()
 
 
 def sign(
@@ -94,15 +345,14 @@ def sign(
     Sign data with private key. Returns binary signature
 
     :param unicode data: Data to sign
-    :param bytes pkey_buffer: Private key
+    :param pkey_buffer: Private key
+    :type pkey_buffer: bytes or PrivateKey
     :param unicode pkey_pass: Private key's passphrase
     :param str digest_name: Message digest method
     :return bytes: Signature
     """
 
-    md = _lib.EVP_get_digestbyname(_utils.byte_string(digest_name))
-    if md == _ffi.NULL:
-        raise ValueError("No such digest method: {0}".format(digest_name))
+    md = get_digest_method(digest_name)
 
     md_ctx = _ffi.new("EVP_MD_CTX *")
     md_ctx = _ffi.gc(md_ctx, _lib.EVP_MD_CTX_cleanup)
@@ -115,9 +365,9 @@ def sign(
     signature_buffer = _ffi.new("unsigned char []", 512)
     signature_length = _ffi.new("unsigned int *")
     signature_length[0] = len(signature_buffer)
-    pkey = _load_private_key(pkey_buffer, pkey_pass)
+    pkey = load_private_key(pkey_buffer, pkey_pass)
     final_result = _lib.EVP_SignFinal(
-        md_ctx, signature_buffer, signature_length, pkey)
+        md_ctx, signature_buffer, signature_length, pkey._evp_pkey)
 
     if final_result != 1:
         _raise_current_error()
@@ -131,16 +381,14 @@ def verify(data, cert_data, signature, digest_name="sha1"):
     of signature is not correct and Error if internal openssl error occurred.
 
     :param basestring data: Signed data
-    :param basestring cert_data: Certificate
+    :param cert_data: Certificate
+    :type cert_data: basestring or Certificate
     :param basestring signature: Binary signature of data
     :param str digest_name: Digest method name
     :raises: ValueError, spyne_smev.crypto.InvalidSignature,
               spyne_smev.crypto.Error
     """
-    md = _lib.EVP_get_digestbyname(_utils.byte_string(digest_name))
-
-    if md == _ffi.NULL:
-        raise ValueError("No such digest method")
+    md = get_digest_method(digest_name)
 
     md_ctx = _ffi.new("EVP_MD_CTX*")
     md_ctx = _ffi.gc(md_ctx, _lib.EVP_MD_CTX_cleanup)
@@ -151,10 +399,7 @@ def verify(data, cert_data, signature, digest_name="sha1"):
     if _lib.EVP_VerifyUpdate(md_ctx, data, len(data)) == 0:
         _raise_current_error()
 
-    cert = _load_certificate(cert_data)
-    pkey = _get_cert_pub_key(cert)
-    if pkey == _ffi.NULL:
-        _raise_current_error()
+    pkey = load_certificate(cert_data).public_key
 
     result = _lib.EVP_VerifyFinal(
         md_ctx, signature, len(signature), pkey)
@@ -229,14 +474,12 @@ def _load_private_key(pem_buffer, pass_phrase=_ffi.NULL):
 
 
 def get_signature_algorithm_name(certificate):
+    """
+    Returns short name of certificate signature algorithm
 
-    cert = _load_certificate(certificate)
-    digest_nid = _lib.OBJ_obj2nid(cert.cert_info.signature.algorithm)
-    if digest_nid == _lib.NID_undef:
-        raise ValueError("Unsupported certificate signature algorithm")
-
-    digest_name = _lib.OBJ_nid2sn(digest_nid)
-    if digest_name == _ffi.NULL:
-        _raise_current_error()
+    :param certificate: Certificate PEM data or loaded handle
+    :type certificate: basestring or Certificate
+    :return str: Signature algorithm name
+    """
+    return load_certificate(certificate).signature_algorithm_name
 
-    return _ffi.string(digest_name)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+executor.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+import Queue as _queue
+import sys as _sys
+import threading as _threading
+
+
+class ExecutorBusy(Exception):
+    """
+    Executor queue is full, task is rejected
+    """
+
+
+class _Task(object):
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self._done = _threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def run(self):
+        try:
+            self._result = self.fn(*self.args, **self.kwargs)
+        except BaseException:
+            self._exc_info = _sys.exc_info()
+        finally:
+            self._done.set()
+
+    def result(self):
+        self._done.wait()
+        if self._exc_info is not None:
+            exc_type, exc_value, exc_tb = self._exc_info
+            raise exc_type, exc_value, exc_tb
+        return self._result
+
+
+class CryptoExecutor(object):
+    """
+    Bounded pool of worker threads for signing and verification.
+
+    Calls into libcrypto release the GIL, so signature work of several
+    requests runs in parallel on multi-core hosts while the number of
+    threads busy with crypto stays bounded.
+
+    :param int workers: Number of worker threads
+    :param int max_queue: Maximum number of tasks waiting for a worker,
+        :class:`ExecutorBusy` is raised when exceeded
+    """
+
+    def __init__(self, workers=2, max_queue=64):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._queue = _queue.Queue(max_queue)
+        self._threads = []
+        self._lock = _threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for number in xrange(self.workers):
+                thread = _threading.Thread(
+                    target=self._work,
+                    name="spyne-smev-crypto-{0}".format(number))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            task.run()
+            with self._lock:
+                self.completed += 1
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedules ``fn(*args, **kwargs)`` and returns task whose ``result``
+        method waits for and returns the call result.
+
+        :raises: ExecutorBusy
+        """
+        self._start()
+        task = _Task(fn, args, kwargs)
+        try:
+            self._queue.put_nowait(task)
+        except _queue.Full:
+            with self._lock:
+                self.rejected += 1
+            logger.warning("Crypto executor queue is full")
+            raise ExecutorBusy("Crypto executor queue is full")
+
+        with self._lock:
+            self.submitted += 1
+            self.max_queue_depth = max(
+                self.max_queue_depth, self._queue.qsize())
+        return task
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Runs ``fn(*args, **kwargs)`` in a worker thread and waits for
+        the result
+
+        :raises: ExecutorBusy
+        """
+        return self.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        """
+        Stops worker threads after queued tasks are done
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+
+"""
+fanout.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+from copy import deepcopy as _deepcopy
+import Queue as _queue
+import threading as _threading
+import time as _time
+
+from lxml import etree as _etree
+from suds.transport import Request as _Request
+from suds.transport import TransportError as _TransportError
+
+from spyne_smev import _xmlns as _ns
+from spyne_smev import transport as _transport
+from spyne_smev._utils import EmptyCtx as _EmptyCtx
+from spyne_smev._utils import el_name_with_ns as _el_name_with_ns
+from spyne_smev.smev256 import Smev256 as _Smev256
+from spyne_smev.smev256.model import MessageType as _MessageType
+from spyne_smev.smev256.model import ServiceType as _ServiceType
+from spyne_smev.wsse import utils as _utils
+
+_soapenv = _el_name_with_ns(_ns.soapenv)
+_body_path = "./{0}".format(_soapenv("Body"))
+
+
+class CallTimeout(Exception):
+    """
+    Response was not received in time
+    """
+
+
+class SmevFault(Exception):
+    """
+    Soap fault returned by a service
+
+    :ivar faultcode:
+    :ivar faultstring:
+    :ivar document: Response envelope
+    """
+
+    def __init__(self, faultcode, faultstring, document=None):
+        super(SmevFault, self).__init__(faultcode, faultstring)
+        self.faultcode = faultcode
+        self.faultstring = faultstring
+        self.document = document
+
+
+class SmevRequest(object):
+    """
+    Request to a SMEV service
+
+    :param str url: Service url
+    :param str method: Method element name with namespace, ``{ns}Name``
+    :param app_data: Content of ``smev:AppData``, element or list of
+        elements. Elements are copied, so request can be sent again.
+    :param message: Values of ``smev:Message`` fields, the rest are taken
+        from ``smev_params`` of the client protocol
+    :type message: spyne_smev.smev256.model.MessageType
+    :param str soap_action: SOAPAction header, method name by default
+    :param float timeout: Timeout of socket operations of the call in
+        seconds, timeout of the client by default
+    """
+
+    def __init__(
+            self, url, method, app_data=(), message=None, soap_action=None,
+            timeout=None):
+        self.url = url
+        self.method = method
+        if _etree.iselement(app_data):
+            app_data = [app_data]
+        self.app_data = list(app_data)
+        self.message = message
+        self.soap_action = soap_action or _etree.QName(method).localname
+        self.timeout = timeout
+
+
+class SmevResponse(object):
+    """
+    Response of a SMEV service
+
+    :ivar request: Request of the response
+    :ivar document: Response envelope
+    :ivar message: ``smev:Message`` element
+    :ivar app_data: ``smev:AppData`` element or None
+    :ivar app_document: ``smev:AppDocument`` element or None
+    :ivar float elapsed: Duration of the call in seconds
+    """
+
+    def __init__(self, request, document, parts, elapsed):
+        self.request = request
+        self.document = document
+        self.message = parts.message
+        self.app_data = parts.app_data
+        self.app_document = parts.app_document
+        self.elapsed = elapsed
+
+
+class _Gather(object):
+
+    def __init__(self, count):
+        self.results = [None] * count
+        self.remaining = count
+        self.closed = False
+        self.condition = _threading.Condition()
+
+    def set(self, index, result):
+        with self.condition:
+            if self.closed:
+                return
+            self.results[index] = result
+            self.remaining -= 1
+            if not self.remaining:
+                self.condition.notify_all()
+
+    def wait(self, timeout):
+        deadline = None if timeout is None else _time.time() + timeout
+        with self.condition:
+            while self.remaining:
+                if deadline is None:
+                    # wait with timeout, it can be interrupted by signals
+                    self.condition.wait(60)
+                    continue
+                left = deadline - _time.time()
+                if left <= 0:
+                    break
+                self.condition.wait(left)
+            self.closed = True
+            return self.remaining
+
+
+class FanOutClient(object):
+    """
+    Client which calls many SMEV services at once.
+
+    Requests are sent by a bounded number of worker threads over pooled
+    keep-alive connections, envelopes are built by the SMEV 2.5.6
+    protocol, signed and verified with :mod:`spyne_smev.wsse.utils`.
+    Socket calls release the GIL, so threads are enough to keep dozens of
+    requests in flight.
+
+    :param protocol: Protocol building envelopes, its ``smev_params``
+        give constant ``smev:Message`` fields (sender, service, etc.)
+    :type protocol: spyne_smev.smev256.Smev256
+    :param bytes private_key: Private key, requests are not signed
+        without it
+    :param unicode private_key_pass: Private key passphrase
+    :param bytes certificate: Certificate of the private key
+    :param bytes in_certificate: Certificate allowed in responses,
+        responses are not verified without it or ``trust_store``
+    :param trust_store: Certificates allowed in responses
+    :type trust_store: spyne_smev.wsse.truststore.TrustStore
+    :param str digest_method: Body digest method name
+    :param executor: Executor to run signing and verification in
+    :type executor: spyne_smev.executor.CryptoExecutor
+    :param pool: Connection pool, shared one by default
+    :type pool: spyne_smev.transport.ConnectionPool
+    :param int max_concurrency: Maximum number of requests in flight
+        within :meth:`gather`
+    :param float timeout: Default timeout of socket operations of a call
+    """
+
+    def __init__(
+            self, protocol=None, private_key=None, private_key_pass=None,
+            certificate=None, in_certificate=None, trust_store=None,
+            digest_method="sha1", executor=None, pool=None,
+            max_concurrency=8, timeout=60):
+        self.protocol = protocol or _Smev256()
+        self.signing_profile = None
+        if private_key and certificate:
+            self.signing_profile = _utils.SigningProfile(
+                certificate, private_key, private_key_pass, digest_method)
+        self.in_certificate = in_certificate
+        self.trust_store = trust_store
+        self.executor = executor
+        self.pool = pool or _transport.default_pool
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = _threading.Lock()
+
+    @property
+    def metrics(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    def _call(self, fn, *args, **kwargs):
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        return self.executor.run(fn, *args, **kwargs)
+
+    def create_envelope(self, request):
+        """
+        Builds unsigned soap envelope of the request the way
+        :class:`spyne_smev.smev256.Smev256` builds responses
+
+        :type request: SmevRequest
+        :rtype: lxml.etree.Element
+        """
+        out_message = _MessageType(
+            Sender=_MessageType.Sender(),
+            Recipient=_MessageType.Recipient(),
+            Service=_ServiceType(),
+            Status="REQUEST")
+        if request.message is not None:
+            for name in _MessageType._type_info:
+                value = getattr(request.message, name, None)
+                if value is not None:
+                    setattr(out_message, name, value)
+        in_message = _EmptyCtx()
+        in_message.ExchangeType = out_message.ExchangeType or 0
+
+        ctx = _EmptyCtx()
+        ctx.out_error = None
+        ctx.udc = _EmptyCtx()
+        ctx.udc.out_smev_message = out_message
+        ctx.udc.in_smev_message = in_message
+
+        envelope = _etree.Element(
+            _soapenv("Envelope"), nsmap={"soapenv": _ns.soapenv})
+        _etree.SubElement(envelope, _soapenv("Header"))
+        method = _etree.SubElement(
+            _etree.SubElement(envelope, _soapenv("Body")), request.method)
+        method.append(self.protocol._create_message_element(ctx))
+        message_data = self.protocol._create_message_data_element(ctx)
+        message_data[0].extend(_deepcopy(request.app_data))
+        method.append(message_data)
+        return envelope
+
+    def _read_fault(self, document):
+        body = document.find(_body_path)
+        if body is None or not len(body) or (
+                body[0].tag != _soapenv("Fault")):
+            return None
+        fault = body[0]
+        return SmevFault(
+            fault.findtext("faultcode"), fault.findtext("faultstring"),
+            document)
+
+    def call(self, request):
+        """
+        Sends request and waits for the response
+
+        :type request: SmevRequest
+        :rtype: SmevResponse
+        :raises: SmevFault, suds.transport.TransportError, socket.error,
+            ValueError, spyne_smev.crypto.InvalidSignature
+        """
+        started = _time.time()
+        document = self.create_envelope(request)
+        if self.signing_profile is not None:
+            self._call(self.signing_profile.sign, document, in_place=True)
+        message = _etree.tostring(
+            document, encoding="UTF-8", xml_declaration=True)
+
+        transport = _transport.PooledTransport(
+            self.pool, timeout=request.timeout or self.timeout)
+        http_request = _Request(request.url, message)
+        http_request.headers = {
+            "Content-Type": "text/xml; charset=utf-8",
+            "SOAPAction": '"{0}"'.format(request.soap_action),
+        }
+        try:
+            reply = transport.send(http_request)
+        except _TransportError, e:
+            fault = None
+            if e.fp is not None:
+                try:
+                    fault = self._read_fault(_etree.fromstring(e.fp.read()))
+                except _etree.XMLSyntaxError:
+                    pass
+            if fault is None:
+                raise
+            raise fault
+        if reply is None:
+            raise ValueError(
+                "Empty response from {0}".format(request.url))
+
+        response = _etree.fromstring(reply.message)
+        fault = self._read_fault(response)
+        if fault is not None:
+            raise fault
+        if self.in_certificate or self.trust_store:
+            self._call(
+                _utils.verify_document, response, self.in_certificate,
+                trust_store=self.trust_store)
+        return SmevResponse(
+            request, response, self.protocol._locate_smev_parts(response),
+            _time.time() - started)
+
+    def _work(self, requests, pending, state):
+        while not state.closed:
+            try:
+                index = pending.get_nowait()
+            except _queue.Empty:
+                break
+            with self._lock:
+                self.calls += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                result = self.call(requests[index])
+            except Exception, e:
+                logger.warning(
+                    "Call of %s failed: %r", requests[index].url, e)
+                with self._lock:
+                    self.errors += 1
+                result = e
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+            state.set(index, result)
+
+    def gather(
+            self, requests, limit=None, timeout=None,
+            return_exceptions=False):
+        """
+        Sends requests concurrently and waits for all responses
+
+        :param requests: Requests to send
+        :type requests: list of SmevRequest
+        :param int limit: Maximum number of requests in flight,
+            ``max_concurrency`` by default
+        :param float timeout: Time to wait for all responses in seconds,
+            calls not completed by then get :class:`CallTimeout`
+        :param bool return_exceptions: Put errors of failed calls to the
+            result list instead of raising the first of them
+        :return: Responses (or errors) in order of requests
+        :rtype: list of SmevResponse
+        """
+        requests = list(requests)
+        state = _Gather(len(requests))
+        pending = _queue.Queue()
+        for index in xrange(len(requests)):
+            pending.put(index)
+
+        workers = min(limit or self.max_concurrency, len(requests))
+        for number in xrange(workers):
+            thread = _threading.Thread(
+                target=self._work, args=(requests, pending, state),
+                name="spyne-smev-fanout-{0}".format(number))
+            thread.daemon = True
+            thread.start()
+
+        if state.wait(timeout):
+            for index, result in enumerate(state.results):
+                if result is None:
+                    with self._lock:
+                        self.timeouts += 1
+                    state.results[index] = CallTimeout(
+                        "No response from {0} in {1} s".format(
+                            requests[index].url, timeout))
+
+        if not return_exceptions:
+            for result in state.results:
+                if isinstance(result, Exception):
+                    raise result
+        return state.results
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+
+"""
+mtom.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+import base64 as _base64
+import binascii as _binascii
+import cgi as _cgi
+from email.parser import HeaderParser as _HeaderParser
+from tempfile import SpooledTemporaryFile as _SpooledTemporaryFile
+from urllib import unquote as _unquote
+import uuid as _uuid
+
+from spyne_smev import crypto as _crypto
+from spyne_smev import streaming as _streaming
+
+_max_headers_length = 64 * 1024
+
+
+class Attachment(object):
+    """
+    MIME part of MTOM message. Content is kept in a temporary file which
+    stays in memory until ``spool_size`` bytes are written.
+
+    :param str content_id: Content-ID without angle brackets
+    :param str content_type: Content type of the part
+    :param file: File-like object with content, new spooled temporary file
+        is created if omitted
+    :param int spool_size: Maximum size of content kept in memory
+    """
+
+    def __init__(
+            self, content_id=None, content_type="application/octet-stream",
+            file=None, spool_size=1024 * 1024):
+        self.content_id = content_id or "{0}@spyne-smev".format(
+            _uuid.uuid4().hex)
+        self.content_type = content_type
+        self.file = (
+            file if file is not None
+            else _SpooledTemporaryFile(spool_size))
+        self.size = 0
+
+    @classmethod
+    def from_value(cls, value, content_id=None, spool_size=1024 * 1024):
+        """
+        Creates attachment from value of BinaryData field
+
+        :param value: File-like object, ``spyne.model.binary.File`` value,
+            file path or base64 encoded text
+        :rtype: Attachment
+        :raises: ValueError
+        """
+        content_type = getattr(value, "type", None) or (
+            "application/octet-stream")
+        handle = getattr(value, "handle", None)
+        if handle is None and getattr(value, "path", None):
+            handle = open(value.path, "rb")
+        if (handle is None and isinstance(value, basestring)
+                and _streaming.is_stream(value)):
+            handle = open(value, "rb")
+        if handle is None and hasattr(value, "read"):
+            handle = value
+        if handle is not None and hasattr(handle, "seek"):
+            handle.seek(0)
+            return cls(content_id, content_type, handle)
+
+        attachment = cls(content_id, content_type, spool_size=spool_size)
+        if handle is not None:
+            for chunk in iter(lambda: handle.read(64 * 1024), b""):
+                attachment.write(chunk)
+        elif getattr(value, "data", None) is not None:
+            for chunk in value.data:
+                attachment.write(chunk)
+        else:
+            attachment.write(_b64decode(value))
+        return attachment
+
+    @classmethod
+    def from_base64(
+            cls, chunks, content_type="application/octet-stream",
+            spool_size=1024 * 1024):
+        """
+        Creates attachment from base64 encoded content, it is decoded chunk
+        by chunk
+
+        :param chunks: Iterable of base64 encoded content chunks
+        :rtype: Attachment
+        :raises: ValueError
+        """
+        attachment = cls(content_type=content_type, spool_size=spool_size)
+        writer = _Base64Writer(attachment)
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.close()
+        return attachment
+
+    @property
+    def href(self):
+        return "cid:{0}".format(self.content_id)
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def chunks(self, block_size=64 * 1024):
+        """
+        Iterates over content from the beginning
+        """
+        self.file.seek(0)
+        for chunk in iter(lambda: self.file.read(block_size), b""):
+            yield chunk
+
+    def base64_chunks(self, block_size=48 * 1024):
+        """
+        Iterates over base64 encoded content, ``block_size`` bytes of
+        content are encoded at a time
+        """
+        rest = b""
+        for chunk in self.chunks(block_size):
+            chunk = rest + chunk
+            size = len(chunk) // 3 * 3
+            rest = chunk[size:]
+            if size:
+                yield _base64.b64encode(chunk[:size])
+        if rest:
+            yield _base64.b64encode(rest)
+
+    def digest(self, digest_name="sha1"):
+        """
+        Calculates digest of content reading it block by block
+
+        :return str: Binary digest value
+        """
+        digest = _crypto.Digest(digest_name)
+        for chunk in self.chunks():
+            digest.update(chunk)
+        return digest.final()
+
+    def close(self):
+        self.file.close()
+
+
+def _b64decode(data):
+    try:
+        return _base64.b64decode(data)
+    except (TypeError, _binascii.Error), e:
+        raise ValueError("Malformed base64 content: {0}".format(e))
+
+
+class _Base64Writer(object):
+    """
+    Decodes base64 encoded part content on the fly
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.rest = b""
+
+    def write(self, data):
+        data = self.rest + b"".join(data.split())
+        size = len(data) // 4 * 4
+        self.rest = data[size:]
+        if size:
+            self.target.write(_b64decode(data[:size]))
+
+    def close(self):
+        if self.rest:
+            self.target.write(_b64decode(self.rest))
+
+
+class _Chunks(list):
+    """
+    Content of root part, kept in memory
+    """
+
+    def write(self, data):
+        self.append(data)
+
+
+def _content_id(headers):
+    return _unquote(headers.get("Content-ID", "").strip().strip("<>"))
+
+
+def get_content_type(ctx):
+    """
+    Returns parsed Content-Type header of the request being processed
+
+    :return: (mime type, params) or None
+    """
+    transport = ctx.transport
+    environ = getattr(transport, "req_env", None)
+    if environ is None:
+        # django
+        environ = getattr(getattr(transport, "req", None), "META", None)
+    content_type = environ and environ.get("CONTENT_TYPE")
+    return _cgi.parse_header(content_type) if content_type else None
+
+
+def is_related(content_type):
+    return (
+        content_type is not None
+        and content_type[0].lower() == "multipart/related")
+
+
+class Mtom(object):
+    """
+    Settings of MTOM/XOP packaging
+
+    Incoming multipart/related messages are always accepted, attachments of
+    outgoing messages are sent as MIME parts when protocol is created with
+    this object.
+
+    :param str digest_method: Digest algorithm of smev:DigestValue
+    :param int spool_size: Maximum size of attachment kept in memory, larger
+        attachments are spooled to temporary files
+    :param int block_size: Size of blocks attachments are read by
+    """
+
+    def __init__(
+            self, digest_method="sha1", spool_size=1024 * 1024,
+            block_size=64 * 1024):
+        self.digest_method = digest_method
+        self.spool_size = spool_size
+        self.block_size = block_size
+
+    def decode(self, content_type, chunks):
+        """
+        Splits multipart/related message into root part and attachments
+
+        Message is read chunk by chunk, attachments are written to spooled
+        temporary files as they come.
+
+        :param content_type: Parsed Content-Type header,
+            result of ``cgi.parse_header``
+        :param chunks: Iterable of message chunks
+        :return: (list of root part chunks, {content id: Attachment})
+        :raises: ValueError
+        """
+        boundary = content_type[1].get("boundary")
+        if not boundary:
+            raise ValueError("No boundary in multipart message")
+        start = content_type[1].get("start", "").strip("<>") or None
+        if isinstance(chunks, basestring):
+            chunks = (chunks,)
+
+        root = None
+        attachments = {}
+        for content in self._split(boundary, start, chunks):
+            if isinstance(content, Attachment):
+                attachments[content.content_id] = content
+            else:
+                root = content
+        if root is None:
+            raise ValueError("No root part in multipart message")
+
+        return root, attachments
+
+    def _open_part(self, headers, root):
+        if root:
+            content = sink = _Chunks()
+        else:
+            content = sink = Attachment(
+                _content_id(headers) or None, headers.get_content_type(),
+                spool_size=self.spool_size)
+        if headers.get("Content-Transfer-Encoding", "").lower() == "base64":
+            sink = _Base64Writer(sink)
+        return content, sink
+
+    def _split(self, boundary, start, chunks):
+        """
+        Streaming parser of multipart body, yields content of every part
+        once it is read completely
+        """
+        delimiter = b"\r\n--" + boundary
+        # first delimiter is not preceded by CRLF
+        buf = b"\r\n"
+        state = "preamble"
+        content = sink = None
+        first = True
+        for chunk in chunks:
+            buf += chunk
+            while True:
+                if state in ("preamble", "body"):
+                    index = buf.find(delimiter)
+                    if index < 0:
+                        keep = len(delimiter) - 1
+                        if len(buf) > keep:
+                            if sink is not None:
+                                sink.write(buf[:-keep])
+                            buf = buf[-keep:]
+                        break
+                    if sink is not None:
+                        if index:
+                            sink.write(buf[:index])
+                        if isinstance(sink, _Base64Writer):
+                            sink.close()
+                        yield content
+                        content = sink = None
+                    buf = buf[index + len(delimiter):]
+                    state = "delimiter"
+                elif state == "delimiter":
+                    if len(buf) < 2:
+                        break
+                    if buf.startswith(b"--"):
+                        return
+                    index = buf.find(b"\r\n")
+                    if index < 0:
+                        break
+                    buf = buf[index + 2:]
+                    state = "headers"
+                else:
+                    if buf.startswith(b"\r\n"):
+                        index, length = 0, 2
+                    else:
+                        index, length = buf.find(b"\r\n\r\n"), 4
+                    if index < 0:
+                        if len(buf) > _max_headers_length:
+                            raise ValueError("Too long part headers")
+                        break
+                    headers = _HeaderParser().parsestr(buf[:index])
+                    buf = buf[index + length:]
+                    # root part is the first one unless "start" is given
+                    root = (
+                        first if start is None
+                        else _content_id(headers) == start)
+                    content, sink = self._open_part(headers, root)
+                    first = False
+                    state = "body"
+        raise ValueError("Unexpected end of multipart message")
+
+    def encode(self, root_chunks, attachments, root_type="text/xml"):
+        """
+        Builds multipart/related MTOM message
+
+        :param root_chunks: Iterable of SOAP envelope chunks
+        :param attachments: List of :class:`Attachment`
+        :param str root_type: Content type of SOAP envelope
+        :return: (Content-Type header value, iterator of message chunks)
+        """
+        boundary = "MIMEBoundary_{0}".format(_uuid.uuid4().hex)
+        start = "root.message@spyne-smev"
+        content_type = (
+            'multipart/related; type="application/xop+xml"; '
+            'boundary="{0}"; start="<{1}>"; start-info="{2}"'.format(
+                boundary, start, root_type))
+        return content_type, self._encode(
+            boundary, start, root_chunks, attachments, root_type)
+
+    def _encode(self, boundary, start, root_chunks, attachments, root_type):
+        try:
+            yield (
+                "--{0}\r\n"
+                'Content-Type: application/xop+xml; charset=UTF-8; '
+                'type="{1}"\r\n'
+                "Content-Transfer-Encoding: 8bit\r\n"
+                "Content-ID: <{2}>\r\n\r\n".format(boundary, root_type, start))
+            for chunk in root_chunks:
+                yield chunk
+            for attachment in attachments:
+                yield (
+                    "\r\n--{0}\r\n"
+                    "Content-Type: {1}\r\n"
+                    "Content-Transfer-Encoding: binary\r\n"
+                    "Content-ID: <{2}>\r\n\r\n".format(
+                        boundary, attachment.content_type,
+                        attachment.content_id))
+                for chunk in attachment.chunks(self.block_size):
+                    yield chunk
+            yield "\r\n--{0}--\r\n".format(boundary)
+        finally:
+            for attachment in attachments:
+                attachment.close()
+
+    def find_attachment(self, include, attachments):
+        """
+        Returns attachment referenced by xop:Include element
+
+        :raises: ValueError
+        """
+        href = _unquote(include.get("href", ""))
+        if not href.startswith("cid:"):
+            raise ValueError("Unsupported xop:Include href: {0}".format(href))
+        attachment = attachments.get(href[4:])
+        if attachment is None:
+            raise ValueError("Attachment {0} not found".format(href))
+        return attachment
@@ -6,15 +6,219 @@ __init__.py.py
 :Created: 12 Jun 2014  
 :Author: tim    
 """
-from spyne.interface.wsdl.wsdl11 import Wsdl11
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+from collections import OrderedDict as _OrderedDict
+from email.utils import formatdate as _formatdate
+from email.utils import mktime_tz as _mktime_tz
+from email.utils import parsedate_tz as _parsedate_tz
+import gzip as _gzip
+from hashlib import sha1 as _sha1
+from io import BytesIO as _BytesIO
+import threading as _threading
+import time as _time
+import zlib as _zlib
+
+from spyne.const.http import HTTP_200, HTTP_304, HTTP_404, HTTP_500
+from spyne.interface.wsdl.wsdl11 import Wsdl11, REGEX_WSDL as _REGEX_WSDL
+from spyne.server.wsgi import WsgiMethodContext as _WsgiMethodContext
+from spyne.server.wsgi import _gen_http_headers
+
+_wsdl_cache = _OrderedDict()
+_wsdl_cache_lock = _threading.Lock()
+_wsdl_build_locks = {}
+
+
+class WsdlDocument(object):
+    """
+    Построенный wsdl с заранее вычисленными ETag и сжатыми вариантами
+    """
+
+    def __init__(self, data):
+        self.data = data
+        digest = _sha1(data).hexdigest()
+        self.etag = '"{0}"'.format(digest)
+        # строгий ETag у каждого варианта содержимого свой
+        self.etags = {
+            None: self.etag,
+            "gzip": '"{0}-gzip"'.format(digest),
+            "deflate": '"{0}-deflate"'.format(digest),
+        }
+        self.modified = int(_time.time())
+        self.last_modified = _formatdate(self.modified, usegmt=True)
+        buf = _BytesIO()
+        with _gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gzip_file:
+            gzip_file.write(data)
+        self.gzip = buf.getvalue()
+        self.deflate = _zlib.compress(data, 9)
+
+    def is_not_modified(self, req_env, encoding=None):
+        """
+        Проверяет условия If-None-Match и If-Modified-Since запроса.
+        If-Modified-Since учитывается только без If-None-Match.
+
+        :param encoding: Кодировка отдаваемого варианта содержимого
+        """
+        if_none_match = req_env.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            etags = set()
+            for etag in if_none_match.split(","):
+                etag = etag.strip()
+                # слабое сравнение, как требует RFC 7232 для GET
+                etags.add(etag[2:] if etag.startswith("W/") else etag)
+            return "*" in etags or self.etags[encoding] in etags
+
+        if_modified_since = req_env.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since is not None:
+            since = _parsedate_tz(if_modified_since.split(";")[0])
+            return since is not None and self.modified <= _mktime_tz(since)
+        return False
+
+    def get_content(self, req_env):
+        """
+        Выбирает вариант документа по заголовку Accept-Encoding
+
+        :return: (кодировка содержимого или None, содержимое)
+        """
+        accepted = {}
+        for item in req_env.get("HTTP_ACCEPT_ENCODING", "").split(","):
+            params = item.strip().lower().split(";")
+            quality = 1.0
+            for param in params[1:]:
+                name, _, value = param.strip().partition("=")
+                if name == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            accepted[params[0]] = quality
+
+        for encoding in ("gzip", "deflate"):
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding, getattr(self, encoding)
+        return None, self.data
 
 
 class _AllYourInterfaceDocuments(object):
+    """
+    Документы интерфейса приложения. Wsdl строится один раз для каждой пары
+    (приложение, адрес) и дальше отдается из памяти.
+
+    :param wsdl_urls: Адреса, wsdl для которых строятся сразу и хранятся
+        в памяти постоянно
+    :param int max_wsdl_urls: Число прочих адресов, wsdl для которых
+        хранится в памяти. Адрес берется из заголовка Host, сверх этого
+        числа из памяти вытесняется wsdl адреса, запрошенного раньше всех
+    """
 
-    def __init__(self, interface):
+    def __init__(self, interface, wsdl_urls=(), max_wsdl_urls=32):
 
-        interface_document_type = getattr(
+        self._interface_document_type = getattr(
             interface.app.in_protocol,
             '_interface_document_type',
             Wsdl11)
-        self.wsdl11 = interface_document_type(interface)
+        self.wsdl11 = self._interface_document_type(interface)
+        self.max_wsdl_urls = max_wsdl_urls
+        self._pinned = frozenset(self._get_key(url) for url in wsdl_urls)
+        for url in wsdl_urls:
+            self.get_wsdl(url)
+
+    def _get_key(self, url):
+        return self.wsdl11.interface.app, _REGEX_WSDL.sub("", url)
+
+    def get_wsdl(self, url):
+        """
+        :rtype: WsdlDocument
+        """
+        key = self._get_key(url)
+        if key in self._pinned:
+            document = _wsdl_cache.get(key)
+        else:
+            with _wsdl_cache_lock:
+                document = _wsdl_cache.pop(key, None)
+                if document is not None:
+                    _wsdl_cache[key] = document
+        if document is not None:
+            return document
+
+        # wsdl строится вне общей блокировки, одновременные запросы
+        # одного адреса ждут одного построения
+        with _wsdl_cache_lock:
+            build_lock = _wsdl_build_locks.setdefault(key, _threading.Lock())
+        try:
+            with build_lock:
+                document = _wsdl_cache.get(key)
+                if document is not None:
+                    return document
+                # документ интерфейса хранит состояние построения, поэтому
+                # для каждого адреса создается новый
+                wsdl11 = self._interface_document_type(
+                    self.wsdl11.interface)
+                wsdl11.build_interface_document(url)
+                document = WsdlDocument(wsdl11.get_interface_document())
+                with _wsdl_cache_lock:
+                    _wsdl_cache[key] = document
+                    if key not in self._pinned:
+                        self._evict(key[0])
+                return document
+        finally:
+            with _wsdl_cache_lock:
+                _wsdl_build_locks.pop(key, None)
+
+    def _evict(self, app):
+        """
+        Удаляет wsdl адресов приложения сверх max_wsdl_urls, начиная с
+        запрошенного раньше всех. Вызывается под _wsdl_cache_lock
+        """
+        keys = [
+            key for key in _wsdl_cache
+            if key[0] is app and key not in self._pinned]
+        for key in keys[:max(len(keys) - self.max_wsdl_urls, 0)]:
+            logger.info("Wsdl for %s is evicted from cache", key[1])
+            del _wsdl_cache[key]
+
+
+class WsdlMixin(object):
+    """
+    Отдает wsdl из кэша :class:`_AllYourInterfaceDocuments` вместо
+    построения его в spyne WsgiApplication
+    """
+
+    def handle_wsdl_request(self, req_env, start_response, url):
+        ctx = _WsgiMethodContext(self, req_env, 'text/xml; charset=utf-8')
+        headers = ctx.transport.resp_headers
+
+        if self.doc.wsdl11 is None:
+            start_response(HTTP_404, _gen_http_headers(headers))
+            return [HTTP_404]
+
+        try:
+            document = self.doc.get_wsdl(url)
+        except Exception, e:
+            logger.exception(e)
+            ctx.transport.wsdl_error = e
+            self.event_manager.fire_event('wsdl_exception', ctx)
+            start_response(HTTP_500, _gen_http_headers(headers))
+            return [HTTP_500]
+
+        ctx.transport.wsdl = document.data
+        self.event_manager.fire_event('wsdl', ctx)
+
+        encoding, content = document.get_content(req_env)
+        headers['ETag'] = document.etags[encoding]
+        headers['Last-Modified'] = document.last_modified
+        headers['Vary'] = 'Accept-Encoding'
+        if document.is_not_modified(req_env, encoding):
+            headers.pop('Content-Type', None)
+            start_response(HTTP_304, _gen_http_headers(headers))
+            ctx.close()
+            return []
+
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(content))
+        start_response(HTTP_200, _gen_http_headers(headers))
+        ctx.close()
+
+        return [content]
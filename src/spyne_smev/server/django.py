@@ -7,14 +7,61 @@ django.py
 :Author: tim
 """
 from spyne.server.django import DjangoApplication as _SpyneDjangoApplication
+from spyne.server.wsgi import WsgiApplication as _SpyneWsgiApplication
 
-from spyne_smev.server import _AllYourInterfaceDocuments
+try:
+    from django.http import StreamingHttpResponse as _StreamingHttpResponse
+except ImportError:
+    # django<1.5
+    _StreamingHttpResponse = None
 
+from spyne_smev.server import _AllYourInterfaceDocuments, WsdlMixin
+from spyne_smev.server.limits import LimitsMixin, RequestLimits
 
-class DjangoApplication(_SpyneDjangoApplication):
+
+class DjangoApplication(WsdlMixin, LimitsMixin, _SpyneDjangoApplication):
+    """
+    Параметры limits, admission и wsdl_urls такие же, как у
+    :class:`spyne_smev.server.wsgi.WsgiApplication`
+    """
 
     def __init__(self, app, chunked=True, max_content_length=2 * 1024 * 1024,
-                 block_length=8 * 1024):
+                 block_length=8 * 1024, limits=None, admission=None,
+                 wsdl_urls=()):
+        self.limits = limits or RequestLimits(max_content_length, block_length)
+        self.admission = admission
         super(DjangoApplication, self).__init__(
-            app, chunked, max_content_length, block_length)
-        self.doc = _AllYourInterfaceDocuments(app.interface)
\ No newline at end of file
+            app, chunked, self.limits.hard_limit, self.limits.block_length)
+        self.doc = _AllYourInterfaceDocuments(app.interface, wsdl_urls)
+
+    def __call__(self, request):
+        status_headers = []
+
+        def start_response(status, headers):
+            status_headers[:] = status, headers
+
+        response = _SpyneWsgiApplication.__call__(
+            self, request.META.copy(), start_response)
+        status, headers = status_headers
+
+        if _StreamingHttpResponse is not None and any(
+                header.lower() == "content-type"
+                and value.startswith("multipart/related")
+                for header, value in headers):
+            # вложения MTOM отдаются по мере чтения из временных файлов
+            retval = _StreamingHttpResponse(response)
+        else:
+            retval = self.HttpResponseObject()
+            try:
+                self.set_response(retval, response)
+            finally:
+                # ответ прочитан целиком, освобождаем ресурсы запроса
+                if (not getattr(retval, "streaming", False)
+                        and hasattr(response, "close")):
+                    response.close()
+
+        retval.status_code = int(status.split(' ', 1)[0])
+        for header, value in headers:
+            retval[header] = value
+
+        return retval
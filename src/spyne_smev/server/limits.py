@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+"""
+limits.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+import threading as _threading
+
+from spyne.const.http import HTTP_411, HTTP_413, HTTP_503
+from spyne.error import RequestTooLongError as _RequestTooLongError
+from spyne.model.fault import Fault as _Fault
+from spyne.server.wsgi import WsgiMethodContext as _WsgiMethodContext
+
+
+class RequestLimits(object):
+    """
+    Size limits of request bodies
+
+    :param int max_content_length: Limit of methods not listed below
+    :param int block_length: Size of blocks request body is read by
+    :param dict services: {service class name: max content length}
+    :param dict methods: {method name: max content length}, overrides
+        limit of the service
+    """
+
+    def __init__(
+            self, max_content_length=2 * 1024 * 1024, block_length=8 * 1024,
+            services=None, methods=None):
+        self.max_content_length = max_content_length
+        self.block_length = block_length
+        self.services = dict(services or {})
+        self.methods = dict(methods or {})
+
+    @property
+    def hard_limit(self):
+        """
+        The largest of limits, passed to spyne as its own cap
+        """
+        return max(
+            [self.max_content_length] + self.services.values()
+            + self.methods.values())
+
+    def get(self, service=None, method=None):
+        if method in self.methods:
+            return self.methods[method]
+        return self.services.get(service, self.max_content_length)
+
+
+class AdmissionController(object):
+    """
+    Caps total size of request bodies processed by the process at once.
+    Request is admitted with its Content-Length, or with the limit of its
+    method if the length is unknown, and holds it until the response is
+    sent.
+
+    :param int max_bytes_in_flight: Maximum total size of admitted requests
+    """
+
+    def __init__(self, max_bytes_in_flight=64 * 1024 * 1024):
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.bytes_in_flight = 0
+        self.max_seen_in_flight = 0
+        self.requests_in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._lock = _threading.Lock()
+
+    @property
+    def metrics(self):
+        return {
+            "max_bytes_in_flight": self.max_bytes_in_flight,
+            "bytes_in_flight": self.bytes_in_flight,
+            "max_seen_in_flight": self.max_seen_in_flight,
+            "requests_in_flight": self.requests_in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+    def acquire(self, size):
+        """
+        :return bool: Whether the request of ``size`` bytes is admitted
+        """
+        with self._lock:
+            if self.bytes_in_flight + size > self.max_bytes_in_flight:
+                self.rejected += 1
+                return False
+            self.bytes_in_flight += size
+            self.requests_in_flight += 1
+            self.admitted += 1
+            self.max_seen_in_flight = max(
+                self.max_seen_in_flight, self.bytes_in_flight)
+        return True
+
+    def release(self, size):
+        with self._lock:
+            self.bytes_in_flight -= size
+            self.requests_in_flight -= 1
+
+
+class ServerBusyError(_Fault):
+    """
+    Request is rejected because too many bytes are in flight
+    """
+
+    def __init__(self):
+        super(ServerBusyError, self).__init__(
+            "Server.Busy", "Server is busy, try again later")
+
+
+class _Response(object):
+    """
+    WSGI response iterable, calls ``release`` when the response is closed
+    """
+
+    def __init__(self, response, release):
+        self.response = response
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.response)
+
+    def close(self):
+        try:
+            close = getattr(self.response, "close", None)
+            if close is not None:
+                close()
+        finally:
+            release, self.release = self.release, None
+            if release is not None:
+                release()
+
+
+class LengthRequiredError(_Fault):
+    """
+    Request without Content-Length to a method with a limit lower than the
+    largest one
+    """
+
+    def __init__(self):
+        super(LengthRequiredError, self).__init__(
+            "Client.LengthRequired", "Content-Length is required")
+
+
+class _LimitedInput(object):
+    """
+    wsgi.input wrapper, counts bytes read and raises RequestTooLongError
+    once more than ``limit`` bytes are sent
+    """
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        # one byte more than the limit is enough to see it is exceeded
+        left = self.limit - self.bytes_read + 1
+        if size < 0 or size > left:
+            size = left
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise _RequestTooLongError()
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _content_length(req_env):
+    try:
+        return int(req_env.get("CONTENT_LENGTH") or "")
+    except ValueError:
+        return None
+
+
+class LimitsMixin(object):
+    """
+    Applies :class:`RequestLimits` and :class:`AdmissionController` to
+    rpc requests of spyne WsgiApplication.
+
+    Before the body is read, the method is recognized by SOAPAction
+    header, which is the operation name in SMEV wsdl, and the body is
+    read up to the limit of that method. Requests without Content-Length
+    are accepted only if the limit is the largest one. Once the request is
+    parsed, the number of bytes read is checked against the limit of the
+    method actually called, so a wrong SOAPAction gains nothing.
+    """
+
+    limits = None
+    admission = None
+
+    def _get_request_method(self, req_env):
+        action = req_env.get("HTTP_SOAPACTION", "").strip().strip('"')
+        if not action:
+            return None, None
+        method = action.rsplit("/", 1)[-1].rsplit("#", 1)[-1]
+        descriptors = self.app.interface.service_method_map.get(
+            "{{{0}}}{1}".format(self.app.tns, method))
+        service = (
+            descriptors[0].service_class.__name__ if descriptors else None)
+        return service, method
+
+    def _reject(self, req_env, start_response, status, error):
+        ctx = _WsgiMethodContext(
+            self, req_env, self.app.out_protocol.mime_type)
+        ctx.transport.resp_code = status
+        ctx.out_error = error
+        return self.handle_error(ctx, [], error, start_response)
+
+    def handle_rpc(self, req_env, start_response):
+        if self.limits is None:
+            return super(LimitsMixin, self).handle_rpc(
+                req_env, start_response)
+
+        service, method = self._get_request_method(req_env)
+        limit = self.limits.get(service, method)
+        length = _content_length(req_env)
+        if length is None and limit < self.limits.hard_limit:
+            logger.warning(
+                "Request to %s without Content-Length rejected", method)
+            return self._reject(
+                req_env, start_response, HTTP_411, LengthRequiredError())
+        if length is not None and length > limit:
+            logger.warning(
+                "Request of %s bytes to %s exceeds limit of %s bytes",
+                length, method, limit)
+            return self._reject(
+                req_env, start_response, HTTP_413, _RequestTooLongError())
+        if req_env.get("wsgi.input") is not None:
+            req_env["wsgi.input"] = _LimitedInput(req_env["wsgi.input"], limit)
+        if self.admission is None:
+            return super(LimitsMixin, self).handle_rpc(
+                req_env, start_response)
+
+        size = limit if length is None else length
+        if not self.admission.acquire(size):
+            logger.warning(
+                "Request of %s bytes to %s rejected, %s bytes in flight",
+                size, method, self.admission.bytes_in_flight)
+            return self._reject(
+                req_env, start_response, HTTP_503, ServerBusyError())
+        try:
+            response = super(LimitsMixin, self).handle_rpc(
+                req_env, start_response)
+        except:
+            self.admission.release(size)
+            raise
+        return _Response(response, lambda: self.admission.release(size))
+
+    def generate_contexts(self, ctx, in_string_charset=None):
+        contexts = super(LimitsMixin, self).generate_contexts(
+            ctx, in_string_charset)
+        p_ctx = contexts[0]
+        stream = ctx.transport.req_env.get("wsgi.input")
+        if not isinstance(stream, _LimitedInput):
+            return contexts
+
+        if not p_ctx.in_error and p_ctx.descriptor is not None:
+            descriptor = p_ctx.descriptor
+            limit = self.limits.get(
+                descriptor.service_class.__name__, descriptor.name)
+            if stream.bytes_read > limit:
+                logger.warning(
+                    "Request of %s bytes to %s exceeds limit of %s bytes",
+                    stream.bytes_read, descriptor.name, limit)
+                p_ctx.in_object = None
+                p_ctx.in_error = p_ctx.out_error = _RequestTooLongError()
+                contexts = [p_ctx]
+        if isinstance(p_ctx.in_error, _RequestTooLongError):
+            # soap protocols answer any fault with code 500
+            p_ctx.transport.resp_code = HTTP_413
+        return contexts
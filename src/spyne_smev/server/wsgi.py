@@ -10,13 +10,27 @@ wsgi.py
 
 from spyne.server.wsgi import WsgiApplication as _SpyneWsgiApplication
 
-from spyne_smev.server import _AllYourInterfaceDocuments
+from spyne_smev.server import _AllYourInterfaceDocuments, WsdlMixin
+from spyne_smev.server.limits import LimitsMixin, RequestLimits
 
 
-class WsgiApplication(_SpyneWsgiApplication):
+class WsgiApplication(WsdlMixin, LimitsMixin, _SpyneWsgiApplication):
+    """
+    :param limits: Ограничения размера запросов по сервисам и методам,
+        по умолчанию строятся из max_content_length и block_length
+    :type limits: spyne_smev.server.limits.RequestLimits
+    :param admission: Ограничение суммарного размера обрабатываемых
+        запросов, сверх него запросы отклоняются с кодом 503
+    :type admission: spyne_smev.server.limits.AdmissionController
+    :param wsdl_urls: Адреса, wsdl для которых строится при создании
+        приложения, а не при первом запросе
+    """
 
     def __init__(self, app, chunked=True, max_content_length=2 * 1024 * 1024,
-                 block_length=8 * 1024):
-        super(WsgiApplication, self).__init__(app, chunked, max_content_length,
-                                              block_length)
-        self.doc = _AllYourInterfaceDocuments(app.interface)
+                 block_length=8 * 1024, limits=None, admission=None,
+                 wsdl_urls=()):
+        self.limits = limits or RequestLimits(max_content_length, block_length)
+        self.admission = admission
+        super(WsgiApplication, self).__init__(
+            app, chunked, self.limits.hard_limit, self.limits.block_length)
+        self.doc = _AllYourInterfaceDocuments(app.interface, wsdl_urls)
@@ -4,15 +4,20 @@
 :Created: 3/12/14
 :Author: timic
 """
+import base64
 import datetime
 import os
+from copy import deepcopy
 
 from lxml import etree
+from spyne.model.binary import File
 
 from .._base import BaseSmev, BaseSmevWsdl
-from .._utils import EmptyCtx, el_name_with_ns
+from .._utils import EmptyCtx, el_name_with_ns, transplant
 from .. fault import ApiError as _ApiError
 from .. import _xmlns as ns
+from ..mtom import Attachment
+from ..streaming import is_stream, new_marker
 
 from model import MessageType, ServiceType, HeaderType, AppDocument
 
@@ -51,12 +56,17 @@ class Smev256(BaseSmev):
     def construct_smev_envelope(self, ctx, message):
         smev_message = self._create_message_element(ctx)
         message_data = self._create_message_data_element(ctx)
-        app_data = message_data.find("./{{{smev}}}AppData".format(**self._ns))
-        body_response = ctx.out_body_doc.getchildren()[0]
-        app_data.extend(body_response.getchildren())
-        body_response.clear()
-        body_response.append(smev_message)
-        body_response.append(message_data)
+        app_data = message_data[0]
+        body_response = ctx.out_body_doc[0]
+        # элемент ответа целиком становится AppData, а его место в Body
+        # занимает новый пустой элемент с тем же именем и атрибутами
+        response = etree.Element(
+            body_response.tag, body_response.attrib, body_response.nsmap)
+        transplant(response, body_response)
+        body_response.attrib.clear()
+        transplant(body_response, app_data, app_data.tag)
+        response.append(smev_message)
+        response.append(message_data)
 
     def create_in_smev_objects(self, ctx):
 
@@ -72,6 +82,12 @@ class Smev256(BaseSmev):
                 self, ctx, AppDocument, ctx.udc.in_smev_appdoc_document)
         else:
             ctx.udc.in_smev_appdoc = AppDocument()
+        attachment = ctx.udc.in_smev_attachment
+        if attachment:
+            # вложение MTOM передается файлом, без чтения в память
+            attachment.file.seek(0)
+            ctx.udc.in_smev_appdoc.BinaryData = File.Value(
+                type=attachment.content_type, handle=attachment.file)
         ctx.udc.out_smev_message = MessageType(
             Sender=MessageType.Sender(),
             Recipient=MessageType.Recipient(),
@@ -79,115 +95,183 @@ class Smev256(BaseSmev):
         ctx.udc.out_smev_header = HeaderType()
         ctx.udc.out_smev_appdoc = AppDocument()
 
+    #: Поля smev:Message в порядке схемы
+    _message_fields = (
+        ("Sender", ("Code", "Name")),
+        ("Recipient", ("Code", "Name")),
+        ("Originator", ("Code", "Name")),
+        ("Service", ("Mnemonic", "Version")),
+        ("TypeCode", ()),
+        ("Status", ()),
+        ("Date", ()),
+        ("ExchangeType", ()),
+        ("RequestIdRef", ()),
+        ("OriginRequestIdRef", ()),
+        ("ServiceCode", ()),
+        ("CaseNumber", ()),
+        ("OKTMO", ()),
+        ("TestMsg", ()),
+    )
+
+    _message_template = None
+
+    def _get_message_template(self):
+        """
+        Болванка smev:Message со всеми полями и постоянными для сервиса
+        значениями из smev_params. Строится один раз.
+
+        :return: (элемент, номера узлов болванки в порядке обхода по имени)
+        """
+        if self._message_template is not None:
+            return self._message_template
+
+        SMEV = el_name_with_ns(self._ns["smev"])
+        params = self.smev_params
+        defaults = {
+            "Sender/Code": params.get("SenderCode", ""),
+            "Sender/Name": params.get("SenderName", ""),
+            "Recipient/Code": params.get("RecipientCode", ""),
+            "Recipient/Name": params.get("RecipientName", ""),
+            "Service/Mnemonic": params.get("Mnemonic", ""),
+            "Service/Version": params.get("Version", ""),
+            "TypeCode": "GSRV",
+            "ExchangeType": params.get("ExchangeType"),
+            "ServiceCode": params.get("ServiceCode"),
+            "OKTMO": params.get("OKTMO", ""),
+        }
+        root = etree.Element(SMEV("Message"), nsmap={"smev": self._ns["smev"]})
+        positions = {}
+        for name, children in self._message_fields:
+            if name == "OKTMO" and "OKTMO" not in params:
+                continue
+            element = etree.SubElement(root, SMEV(name))
+            element.text = defaults.get(name)
+            positions[name] = len(positions) + 1
+            for child in children:
+                path = "{0}/{1}".format(name, child)
+                etree.SubElement(element, SMEV(child)).text = (
+                    defaults.get(path))
+                positions[path] = len(positions) + 1
+
+        self._message_template = root, positions
+        return self._message_template
+
     def _create_message_element(self, ctx):
         """
-        Констрирует болванку для smev:Message
+        Констрирует smev:Message по болванке сервиса, заполняя только
+        зависящие от сообщения поля
 
         :param ctx: Сквозной контекст метода
         :rtype: lxml.etree.Element
         """
 
-        # TODO: сделать нормальный биндинг
-
         if getattr(ctx, "udc", None) is None:
             ctx.udc = EmptyCtx()
         if not getattr(ctx.udc, "out_smev_message", None):
             ctx.udc.out_smev_message = EmptyCtx()
 
-        SMEV = el_name_with_ns(self._ns["smev"])
+        template, positions = self._get_message_template()
+        root = deepcopy(template)
+        nodes = list(root.iter())
+        out_message = ctx.udc.out_smev_message
+        in_message = ctx.udc.in_smev_message
+
+        def node(name):
+            return nodes[positions[name]]
+
+        def patch(name, value):
+            if value:
+                node(name).text = value
+
+        def drop(name):
+            element = node(name)
+            element.getparent().remove(element)
+
+        patch("Sender/Code", out_message.Sender.Code)
+        patch("Sender/Name", out_message.Sender.Name)
+        patch("Recipient/Code", (
+            out_message.Recipient.Code
+            or node("Recipient/Code").text
+            or in_message.Sender.Code or ""))
+        patch("Recipient/Name", (
+            out_message.Recipient.Name
+            or node("Recipient/Name").text
+            or in_message.Sender.Name or ""))
+
+        if out_message.Originator:
+            node("Originator/Code").text = out_message.Originator.Code or ""
+            node("Originator/Name").text = out_message.Originator.Name or ""
+        else:
+            drop("Originator")
+
+        in_service = in_message.Service
+        patch("Service/Mnemonic", (
+            out_message.Service.Mnemonic
+            or node("Service/Mnemonic").text
+            or (in_service and in_service.Mnemonic or "")))
+        patch("Service/Version", (
+            out_message.Service.Version
+            or node("Service/Version").text
+            or (in_service and in_service.Version)
+            or "1.00"))
+        patch("TypeCode", out_message.TypeCode)
 
-        root = etree.Element(SMEV("Message"), nsmap={"smev": self._ns["smev"]})
-        sender = etree.SubElement(root, SMEV("Sender"))
-        etree.SubElement(sender, SMEV("Code")).text = (
-            ctx.udc.out_smev_message.Sender.Code
-            or self.smev_params.get("SenderCode", ""))
-        etree.SubElement(sender, SMEV("Name")).text = (
-            ctx.udc.out_smev_message.Sender.Name
-            or self.smev_params.get("SenderName", ""))
-        recipient = etree.SubElement(root, SMEV("Recipient"))
-        etree.SubElement(recipient, SMEV("Code")).text = (
-            ctx.udc.out_smev_message.Recipient.Code
-            or self.smev_params.get("RecipientCode", "")
-            or ctx.udc.in_smev_message.Sender.Code or "")
-        etree.SubElement(recipient, SMEV("Name")).text = (
-            ctx.udc.out_smev_message.Recipient.Name
-            or self.smev_params.get("RecipientName", "")
-            or ctx.udc.in_smev_message.Sender.Name or "")
-        if ctx.udc.out_smev_message.Originator:
-            originator = etree.SubElement(root, SMEV("Originator"))
-            etree.SubElement(originator, SMEV(
-                "Code")).text = ctx.udc.out_smev_message.Originator.Code or ""
-            etree.SubElement(originator, SMEV(
-                "Name")).text = ctx.udc.out_smev_message.Originator.Name or ""
-        service = etree.SubElement(root, SMEV("Service"))
-        etree.SubElement(service, SMEV("Mnemonic")).text = (
-            ctx.udc.out_smev_message.Service.Mnemonic
-            or self.smev_params.get("Mnemonic", "")
-            or (ctx.udc.in_smev_message.Service
-                and ctx.udc.in_smev_message.Service.Mnemonic
-                or ""))
-        etree.SubElement(service, SMEV("Version")).text = (
-            ctx.udc.out_smev_message.Service.Version
-            or self.smev_params.get("Version", "")
-            or (ctx.udc.in_smev_message.Service
-                and ctx.udc.in_smev_message.Service.Version)
-            or "1.00")
-        etree.SubElement(root, SMEV(
-            "TypeCode")).text = ctx.udc.out_smev_message.TypeCode or "GSRV"
         if ctx.out_error and isinstance(ctx.out_error, _ApiError):
             status = getattr(ctx.out_error, "Status", None) or "INVALID"
         else:
             status = "RESULT"
-
-        etree.SubElement(root, SMEV(
-            "Status")).text = ctx.udc.out_smev_message.Status or status
-        etree.SubElement(
-            root, SMEV("Date")).text = datetime.datetime.utcnow().isoformat()
-
-        exchange_type = (
-            self.smev_params.get("ExchangeType") or
-            unicode(ctx.udc.in_smev_message.ExchangeType) or
-            "0")
-        etree.SubElement(root, SMEV("ExchangeType")).text = exchange_type
+        patch("Status", out_message.Status or status)
+        patch("Date", datetime.datetime.utcnow().isoformat())
+        if not node("ExchangeType").text:
+            patch("ExchangeType", unicode(in_message.ExchangeType) or "0")
 
         request_id_ref = (
-            ctx.udc.out_smev_message.RequestIdRef
-            or ctx.udc.in_smev_header.MessageId)
-        if request_id_ref:
-            etree.SubElement(root, SMEV("RequestIdRef")).text = request_id_ref
+            out_message.RequestIdRef or ctx.udc.in_smev_header.MessageId)
         origin_request_id_ref = (
-            ctx.udc.out_smev_message.OriginRequestIdRef or
-            ctx.udc.in_smev_message.OriginRequestIdRef or request_id_ref)
-        if origin_request_id_ref:
-            etree.SubElement(
-                root, SMEV("OriginRequestIdRef")).text = origin_request_id_ref
-
+            out_message.OriginRequestIdRef or
+            in_message.OriginRequestIdRef or request_id_ref)
         service_code = (
-            ctx.udc.out_smev_message.ServiceCode or
-            self.smev_params.get("ServiceCode") or
-            ctx.udc.in_smev_message.ServiceCode)
-        if service_code:
-            etree.SubElement(root, SMEV("ServiceCode")).text = service_code
-
-        case_number = (
-            ctx.udc.out_smev_message.CaseNumber or
-            ctx.udc.in_smev_message.CaseNumber)
-        if case_number:
-            etree.SubElement(
-                root, SMEV("CaseNumber")
-            ).text = case_number or ""
-
-        if "OKTMO" in self.smev_params:
-            etree.SubElement(
-                root, SMEV("OKTMO")).text = self.smev_params.get("OKTMO", "")
-        test_msg = (
-            ctx.udc.out_smev_message.TestMsg
-            or ctx.udc.in_smev_message.TestMsg or None)
-        if test_msg:
-            etree.SubElement(root, SMEV("TestMsg")).text = test_msg
+            out_message.ServiceCode or
+            node("ServiceCode").text or
+            in_message.ServiceCode)
+        case_number = out_message.CaseNumber or in_message.CaseNumber
+        test_msg = out_message.TestMsg or in_message.TestMsg or None
+        for name, value in (
+                ("RequestIdRef", request_id_ref),
+                ("OriginRequestIdRef", origin_request_id_ref),
+                ("ServiceCode", service_code),
+                ("CaseNumber", case_number),
+                ("TestMsg", test_msg)):
+            if value:
+                node(name).text = value
+            else:
+                drop(name)
 
         return root
 
+    def _append_attachment(self, ctx, app_document):
+        """
+        Передает BinaryData вложением MTOM: в AppDocument добавляются
+        ссылка на вложение и его хэш
+        """
+        SMEV = el_name_with_ns(self._ns["smev"])
+
+        attachment = Attachment.from_value(
+            ctx.udc.out_smev_appdoc.BinaryData,
+            spool_size=self.mtom.spool_size)
+        if not ctx.udc.out_attachments:
+            ctx.udc.out_attachments = []
+        ctx.udc.out_attachments.append(attachment)
+
+        reference = etree.SubElement(app_document, SMEV("Reference"))
+        etree.SubElement(
+            reference, "{{{0}}}Include".format(ns.xop),
+            nsmap={"xop": ns.xop}, href=attachment.href)
+        etree.SubElement(
+            app_document, SMEV("DigestValue")
+        ).text = base64.b64encode(
+            attachment.digest(self.mtom.digest_method))
+
     def _create_message_data_element(self, ctx):
         """
         Конструирует болванку для MessageData
@@ -204,8 +288,20 @@ class Smev256(BaseSmev):
             etree.SubElement(
                 app_document, SMEV("RequestCode")
             ).text = ctx.udc.out_smev_appdoc.RequestCode
-            etree.SubElement(
-                app_document, SMEV("BinaryData")
-            ).text = ctx.udc.out_smev_appdoc.BinaryData
+            binary_data = ctx.udc.out_smev_appdoc.BinaryData
+            if self.mtom:
+                self._append_attachment(ctx, app_document)
+            elif is_stream(binary_data):
+                # содержимое подставляется при выводе, см. streaming
+                marker = new_marker()
+                if not ctx.udc.out_binary_streams:
+                    ctx.udc.out_binary_streams = {}
+                ctx.udc.out_binary_streams[marker] = Attachment.from_value(
+                    binary_data)
+                etree.SubElement(
+                    app_document, SMEV("BinaryData")).text = marker
+            else:
+                etree.SubElement(
+                    app_document, SMEV("BinaryData")).text = binary_data
 
         return root
\ No newline at end of file
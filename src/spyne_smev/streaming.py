@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+
+"""
+streaming.py
+"""
+import os as _os
+from tempfile import SpooledTemporaryFile as _SpooledTemporaryFile
+import uuid as _uuid
+
+from lxml import etree as _etree
+
+_marker_prefix = b"SpyneSmevBinary0"
+_marker_length = len(_marker_prefix) + 32
+
+
+def new_marker():
+    """
+    Returns placeholder text of streamed element. Marker consists of
+    characters which are kept as is by serialization and canonicalization
+    and is valid base64 text, so the document passes schema validation.
+    """
+    return _marker_prefix + _uuid.uuid4().hex
+
+
+def is_stream(value):
+    """
+    Checks whether value of binary field should be streamed: file-like
+    object, ``spyne.model.binary.File`` value or path of existing file.
+    Other strings are base64 encoded content.
+    """
+    if isinstance(value, basestring):
+        return len(value) < 4096 and _os.path.isfile(value)
+    return value is not None
+
+
+class SplicingWriter(object):
+    """
+    File-like object, passes written data to ``target`` replacing markers
+    with base64 encoded content of corresponding streams
+
+    :param target: Object with ``write`` method
+    :param dict streams: {marker: spyne_smev.mtom.Attachment}
+    """
+
+    def __init__(self, target, streams, block_size=48 * 1024):
+        self.target = target
+        self.streams = streams
+        self.block_size = block_size
+        self._buf = b""
+
+    def write(self, data):
+        buf = self._buf + data
+        while True:
+            index = buf.find(_marker_prefix)
+            if index < 0:
+                # marker prefix may be split between writes
+                keep = len(_marker_prefix) - 1
+                if len(buf) > keep:
+                    self.target.write(buf[:-keep])
+                    buf = buf[-keep:]
+                break
+            if len(buf) < index + _marker_length:
+                if index:
+                    self.target.write(buf[:index])
+                buf = buf[index:]
+                break
+            if index:
+                self.target.write(buf[:index])
+            marker = buf[index:index + _marker_length]
+            stream = self.streams.get(marker)
+            if stream is None:
+                self.target.write(marker)
+            else:
+                for chunk in stream.base64_chunks(self.block_size):
+                    self.target.write(chunk)
+            buf = buf[index + _marker_length:]
+        self._buf = buf
+
+    def flush(self):
+        if self._buf:
+            self.target.write(self._buf)
+            self._buf = b""
+
+
+class Tee(object):
+    """
+    File-like object, writes data to several targets
+    """
+
+    def __init__(self, *targets):
+        self.targets = targets
+
+    def write(self, data):
+        for target in self.targets:
+            target.write(data)
+
+
+class BodySpool(object):
+    """
+    Keeps canonical form of signed soap Body produced while its digest is
+    calculated. Content stays in memory until ``spool_size`` bytes are
+    written, then it is moved to a temporary file.
+    """
+
+    def __init__(self, spool_size=1024 * 1024):
+        self.file = _SpooledTemporaryFile(spool_size)
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def discard(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.size = 0
+
+    def chunks(self, block_size=64 * 1024):
+        self.file.seek(0)
+        for chunk in iter(lambda: self.file.read(block_size), b""):
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+class SpilledText(object):
+    """
+    Text of large element moved out of parsed document to a temporary file.
+    Text is kept as it was in the document, so the canonical form with the
+    marker spliced back by :class:`SplicingWriter` is the original one.
+    """
+
+    def __init__(self, spool_size=1024 * 1024):
+        self.file = _SpooledTemporaryFile(spool_size)
+        self.size = 0
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        self.file.write(data)
+        self.size += len(data)
+
+    def chunks(self, block_size=64 * 1024):
+        self.file.seek(0)
+        for chunk in iter(lambda: self.file.read(block_size), b""):
+            yield chunk
+
+    def base64_chunks(self, block_size=48 * 1024):
+        # content is base64 text already
+        return self.chunks(block_size)
+
+    def close(self):
+        self.file.close()
+
+
+class _SpillingTarget(object):
+    """
+    Parser target building the document with lxml.etree.TreeBuilder. Text
+    of ``spilled_tags`` elements is passed through as the parser reports it
+    and goes to a temporary file once it is longer than ``spill_size``, so
+    the whole text never exists as one string.
+    """
+
+    def __init__(self, spilled_tags, spill_size, spool_size):
+        self.builder = _etree.TreeBuilder()
+        self.spilled_tags = frozenset(spilled_tags)
+        self.spill_size = spill_size
+        self.spool_size = spool_size
+        self.streams = {}
+        self._text = None
+        self._size = 0
+        self._spilled = None
+
+    def start(self, tag, attrib, nsmap):
+        self._flush_text()
+        if tag in self.spilled_tags:
+            self._text = []
+        self.builder.start(
+            tag, attrib,
+            dict((prefix or None, uri) for prefix, uri in nsmap.iteritems()))
+
+    def data(self, data):
+        if self._text is None:
+            self.builder.data(data)
+        elif self._spilled is not None:
+            self._spilled.write(data)
+        else:
+            self._text.append(data)
+            self._size += len(data)
+            if self._size > self.spill_size:
+                self._spilled = SpilledText(self.spool_size)
+                for text in self._text:
+                    self._spilled.write(text)
+                del self._text[:]
+
+    def _flush_text(self):
+        if self._text is None:
+            return
+        if self._spilled is not None:
+            marker = new_marker()
+            self.streams[marker] = self._spilled
+            self.builder.data(marker)
+        else:
+            for text in self._text:
+                self.builder.data(text)
+        self._text = self._spilled = None
+        self._size = 0
+
+    def end(self, tag):
+        self._flush_text()
+        return self.builder.end(tag)
+
+    def comment(self, text):
+        self._flush_text()
+        return self.builder.comment(text)
+
+    def pi(self, target, data=None):
+        self._flush_text()
+        return self.builder.pi(target, data)
+
+    def close(self):
+        return self.builder.close()
+
+    def discard(self):
+        if self._spilled is not None:
+            self._spilled.close()
+        for stream in self.streams.itervalues():
+            stream.close()
+
+
+def parse_document(
+        chunks, spilled_tags=(), spill_size=64 * 1024,
+        spool_size=1024 * 1024, **parser_kwargs):
+    """
+    Parses document fed to the parser chunk by chunk, chunks are never
+    joined into one string. Text of ``spilled_tags`` elements longer than
+    ``spill_size`` characters is written to temporary files as it is
+    parsed and replaced with markers, canonical form of such document
+    written through :class:`SplicingWriter` is the original one.
+
+    Huge text nodes are allowed, size of the document should be limited by
+    the server.
+
+    :param chunks: Iterable of document chunks
+    :param spilled_tags: Tags of elements with large base64 content
+    :param parser_kwargs: Options of lxml parser
+    :return: (root element, {marker: SpilledText})
+    :raises: lxml.etree.XMLSyntaxError
+    """
+    if isinstance(chunks, basestring):
+        chunks = (chunks,)
+    options = dict(
+        (name, value) for name, value in parser_kwargs.iteritems()
+        if value is not None)
+    options["huge_tree"] = True
+    target = _SpillingTarget(spilled_tags, spill_size, spool_size)
+    parser = _etree.XMLParser(target=target, **options)
+    try:
+        for chunk in chunks:
+            # large chunk is fed in parts, so text is reported in parts
+            for index in xrange(0, len(chunk), spill_size):
+                parser.feed(chunk[index:index + spill_size])
+        root = parser.close()
+    except:
+        target.discard()
+        raise
+    return root, target.streams
+
+
+class _Chunks(list):
+
+    def write(self, data):
+        self.append(data)
+
+
+def _streamed_ancestors(root, streams):
+    """
+    Returns set of elements which contain streamed elements
+    """
+    ancestors = set()
+    for element in root.iter():
+        if element.text in streams:
+            ancestors.add(element)
+            ancestors.update(element.iterancestors())
+    return ancestors
+
+
+def _write_element(xf, element, streams, ancestors, block_size, nsmap):
+    new_nsmap = dict(
+        (prefix, uri) for prefix, uri in element.nsmap.iteritems()
+        if nsmap.get(prefix) != uri)
+    with xf.element(element.tag, element.attrib, new_nsmap):
+        stream = streams.get(element.text)
+        if stream is not None:
+            for chunk in stream.base64_chunks(block_size):
+                xf.write(chunk)
+                xf.flush()
+                yield
+        elif element.text:
+            xf.write(element.text)
+        for child in element:
+            if child in ancestors:
+                for _ in _write_element(
+                        xf, child, streams, ancestors, block_size,
+                        element.nsmap):
+                    yield
+                if child.tail:
+                    xf.write(child.tail)
+            else:
+                xf.write(child)
+    xf.flush()
+    yield
+
+
+def iter_document(
+        root, streams, encoding="UTF-8", xml_declaration=True,
+        block_size=48 * 1024):
+    """
+    Serializes document with lxml.etree.xmlfile, content of streamed
+    elements is written as base64 in chunks of ``block_size`` source bytes,
+    so it never exists as a whole in memory. Streams are closed after the
+    document is written.
+
+    :param root: Document root element
+    :param dict streams: {marker: spyne_smev.mtom.Attachment}
+    :return: Iterator of document chunks
+    """
+    chunks = _Chunks()
+    ancestors = _streamed_ancestors(root, streams)
+    try:
+        with _etree.xmlfile(chunks, encoding=encoding) as xf:
+            if xml_declaration:
+                xf.write_declaration()
+            for _ in _write_element(
+                    xf, root, streams, ancestors, block_size, {}):
+                if chunks:
+                    yield b"".join(chunks)
+                    del chunks[:]
+        if chunks:
+            yield b"".join(chunks)
+    finally:
+        for stream in streams.itervalues():
+            stream.close()
+
+
+def iter_signed_document(root, body, streams=None, xml_declaration=True):
+    """
+    Serializes signed soap envelope with lxml.etree.xmlfile. Header goes
+    first, then canonical form of the Body is copied from ``body`` spool as
+    it was produced during signing. Document is written in UTF-8, the
+    encoding of canonical form.
+
+    :param root: Signed soap envelope
+    :param body: Spool with canonical form of the Body
+    :type body: BodySpool
+    :param dict streams: Streams of the document to close when done, their
+        content is already in the spool
+    :return: Iterator of document chunks
+    """
+    chunks = _Chunks()
+    body_node = root.find("{http://schemas.xmlsoap.org/soap/envelope/}Body")
+    try:
+        with _etree.xmlfile(chunks, encoding="UTF-8") as xf:
+            if xml_declaration:
+                xf.write_declaration()
+            with xf.element(root.tag, root.attrib, root.nsmap):
+                if root.text:
+                    xf.write(root.text)
+                for child in root:
+                    if child is not body_node:
+                        xf.write(child)
+                        continue
+                    xf.flush()
+                    yield b"".join(chunks)
+                    del chunks[:]
+                    for chunk in body.chunks():
+                        yield chunk
+                    if child.tail:
+                        xf.write(child.tail)
+        if chunks:
+            yield b"".join(chunks)
+    finally:
+        body.close()
+        for stream in (streams or {}).itervalues():
+            stream.close()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+transport.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+import base64 as _base64
+import cPickle as _pickle
+from datetime import datetime as _datetime, timedelta as _timedelta
+import errno as _errno
+from hashlib import sha1 as _sha1
+import httplib as _httplib
+import os as _os
+import socket as _socket
+from StringIO import StringIO as _StringIO
+import tempfile as _tempfile
+import threading as _threading
+from urlparse import urlsplit as _urlsplit
+
+import suds as _suds
+from suds.cache import FileCache as _FileCache
+from suds.cache import ObjectCache as _ObjectCache
+from suds.properties import Unskin as _Unskin
+from suds.transport import Reply as _Reply
+from suds.transport import Transport as _Transport
+from suds.transport import TransportError as _TransportError
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive HTTP connections grouped by scheme and host. Pool is thread
+    safe, a connection is used by one request at a time.
+
+    :param int max_idle: Maximum number of idle connections per host
+    :param ssl_context: SSL context of HTTPS connections
+    """
+
+    def __init__(self, max_idle=4, ssl_context=None):
+        self.max_idle = max_idle
+        self.ssl_context = ssl_context
+        self.created = 0
+        self.reused = 0
+        self._idle = {}
+        self._lock = _threading.Lock()
+
+    @property
+    def metrics(self):
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "idle": sum(map(len, self._idle.itervalues())),
+        }
+
+    def get(self, key, timeout=None):
+        """
+        Returns idle connection to ``key`` host or creates new one
+
+        :param key: (scheme, netloc)
+        :return: (connection, whether it was used before)
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            connection = idle.pop() if idle else None
+            if connection is None:
+                self.created += 1
+            else:
+                self.reused += 1
+
+        if connection is not None:
+            # timeout of this request, not of the one opened the connection
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            return connection, True
+
+        scheme, netloc = key
+        if scheme == "https":
+            kwargs = {}
+            if self.ssl_context is not None:
+                kwargs["context"] = self.ssl_context
+            connection = _httplib.HTTPSConnection(
+                netloc, timeout=timeout, **kwargs)
+        else:
+            connection = _httplib.HTTPConnection(netloc, timeout=timeout)
+        return connection, False
+
+    def put(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.itervalues():
+            for connection in connections:
+                connection.close()
+
+
+#: Pool shared by transports created without explicit pool
+default_pool = ConnectionPool()
+
+
+def _is_closed_before_response(error):
+    if isinstance(error, _httplib.BadStatusLine):
+        # no status line at all, newer pythons put a message instead of it
+        return (
+            not error.line.strip("'\"")
+            or error.line.startswith("No status line"))
+    return (
+        isinstance(error, _socket.error)
+        and not isinstance(error, _socket.timeout)
+        and error.errno == _errno.ECONNRESET)
+
+
+class PooledTransport(_Transport):
+    """
+    Suds transport which keeps HTTP connections alive and reuses them
+    across calls and across clients sharing the pool.
+
+    Supports ``timeout``, ``username`` and ``password`` suds transport
+    options, proxies are not supported.
+
+    :param pool: Connection pool, :data:`default_pool` by default
+    :type pool: ConnectionPool
+    """
+
+    def __init__(self, pool=None, **kwargs):
+        _Transport.__init__(self)
+        _Unskin(self.options).update(kwargs)
+        self.pool = pool or default_pool
+
+    def open(self, request):
+        logger.debug("opening (%s)", request.url)
+        status, reason, _, data = self._request(
+            "GET", request.url, None, request.headers)
+        if status != 200:
+            raise _TransportError(reason, status, _StringIO(data))
+        return _StringIO(data)
+
+    def send(self, request):
+        logger.debug("sending:\n%s", request)
+        status, reason, headers, data = self._request(
+            "POST", request.url, request.message, request.headers)
+        if status in (202, 204):
+            return None
+        if status >= 300:
+            raise _TransportError(reason, status, _StringIO(data))
+        reply = _Reply(200, headers, data)
+        logger.debug("received:\n%s", reply)
+        return reply
+
+    def _request(self, method, url, body, headers):
+        parts = _urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = "{0}?{1}".format(path, parts.query)
+        headers = dict(headers)
+        username = self.options.username
+        if username is not None:
+            headers["Authorization"] = "Basic {0}".format(
+                _base64.b64encode("{0}:{1}".format(
+                    username, self.options.password or "")))
+
+        key = (parts.scheme, parts.netloc)
+        while True:
+            connection, reused = self.pool.get(key, self.options.timeout)
+            # the server could close an idle connection, then the request
+            # is repeated on a new one. It is done only if the server
+            # surely got no complete request: sending failed, or the
+            # connection was closed before any response bytes.
+            try:
+                connection.request(method, path, body, headers)
+            except (_httplib.HTTPException, _socket.error), e:
+                connection.close()
+                if reused and not isinstance(e, _socket.timeout):
+                    continue
+                raise
+            try:
+                response = connection.getresponse()
+            except (_httplib.HTTPException, _socket.error), e:
+                connection.close()
+                if reused and _is_closed_before_response(e):
+                    continue
+                raise
+            try:
+                data = response.read()
+            except:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.pool.put(key, connection)
+            return (
+                response.status, response.reason,
+                dict(response.getheaders()), data)
+
+    def __deepcopy__(self, memo={}):
+        clone = self.__class__(self.pool)
+        _Unskin(clone.options).update(_Unskin(self.options))
+        return clone
+
+
+_pickled_objects = {}
+
+
+class VersionedObjectCache(_ObjectCache):
+    """
+    Cache of parsed wsdl and schemas. Files are kept in a directory named
+    after suds version and ``version``, so changing ``version`` (e.g. on
+    release of the service wsdl) invalidates the cache. Pickled objects are
+    also kept in process memory, clients created after the first one don't
+    read the files.
+
+    :param str location: Base directory of cache files
+    :param str version: Version of the service wsdl
+    :param duration: Lifetime of cached objects, e.g. ``days=1``, forever
+        by default
+    """
+
+    def __init__(self, location=None, version="", **duration):
+        if location is None:
+            location = _os.path.join(
+                _tempfile.gettempdir(), "spyne-smev-suds")
+        key = _sha1("{0}:{1}".format(_suds.__version__, version)).hexdigest()
+        _ObjectCache.__init__(
+            self, _os.path.join(location, key[:16]), **duration)
+
+    def _expired(self, created):
+        unit, value = self.duration
+        return value > 0 and (
+            created + _timedelta(**{unit: value}) < _datetime.now())
+
+    def get(self, id):
+        key = (self.location, id)
+        cached = _pickled_objects.get(key)
+        if cached is None or self._expired(cached[0]):
+            fp = _FileCache.getf(self, id)
+            if fp is None:
+                _pickled_objects.pop(key, None)
+                return None
+            with fp:
+                cached = _pickled_objects[key] = (
+                    _datetime.fromtimestamp(_os.path.getctime(fp.name)),
+                    fp.read())
+        try:
+            return _pickle.loads(cached[1])
+        except Exception:
+            _pickled_objects.pop(key, None)
+            self.purge(id)
+
+    def put(self, id, object):
+        data = _pickle.dumps(object, self.protocol)
+        _FileCache.put(self, id, data)
+        _pickled_objects[(self.location, id)] = (_datetime.now(), data)
+        return object
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+validation.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+import Queue as _queue
+import random as _random
+import threading as _threading
+
+from lxml import etree as _etree
+
+#: Проверять все элементы СМЭВ
+FULL = "full"
+#: Проверять только Message и Header, MessageData пропускать
+HEADERS = "headers"
+#: Проверять MessageData у части сообщений и у отмеченных отправителей
+SAMPLED = "sampled"
+#: Проверять MessageData в фоне после обработки сообщения
+ASYNC = "async"
+
+
+class ValidationPolicy(object):
+    """
+    Политика проверки входящих сообщений СМЭВ по xsd-схеме
+
+    Message и Header проверяются всегда, политика определяет только
+    проверку MessageData, самого тяжелого элемента сообщения.
+
+    :param str mode: Режим проверки: FULL, HEADERS, SAMPLED или ASYNC
+    :param float sample_rate: Доля проверяемых сообщений в режиме SAMPLED
+    :param flagged_senders: Коды отправителей, сообщения которых в режиме
+        SAMPLED проверяются всегда
+    :param hook: Функция ``hook(message_data, errors)``, получает
+        результат фоновой проверки в режиме ASYNC (errors пуст, если
+        ошибок нет)
+    :param int max_queue: Размер очереди фоновой проверки, сообщения сверх
+        нее не проверяются
+    """
+
+    def __init__(
+            self, mode=FULL, sample_rate=0.1, flagged_senders=(), hook=None,
+            max_queue=1000):
+        if mode not in (FULL, HEADERS, SAMPLED, ASYNC):
+            raise ValueError("Unknown validation mode: {0}".format(mode))
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.flagged_senders = frozenset(flagged_senders)
+        self.hook = hook
+        self.validated = 0
+        self.skipped = 0
+        self.failed = 0
+        self._lock = _threading.Lock()
+        self._queue = _queue.Queue(max_queue)
+        self._worker = None
+
+    @property
+    def counters(self):
+        return {
+            "validated": self.validated,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
+
+    def count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def should_validate(self, sender_code):
+        """
+        Нужно ли проверять MessageData сообщения сразу
+        """
+        if self.mode == FULL:
+            return True
+        if self.mode == SAMPLED:
+            return (
+                sender_code in self.flagged_senders
+                or _random.random() < self.sample_rate)
+        return False
+
+    def defer(self, validate, data):
+        """
+        Ставит MessageData в очередь фоновой проверки
+
+        :param validate: Функция проверки, возвращает список ошибок
+        :param bytes data: Сериализованный элемент MessageData. Исходный
+            документ изменяется при обработке сообщения, а строка
+            занимает в очереди меньше памяти, чем копия дерева
+        :return bool: Принят ли элемент в очередь
+        """
+        self._start()
+        try:
+            self._queue.put_nowait((validate, data))
+        except _queue.Full:
+            logger.warning("Validation queue is full, message skipped")
+            return False
+        return True
+
+    def _start(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                worker = _threading.Thread(
+                    target=self._work, name="spyne-smev-validation")
+                worker.daemon = True
+                worker.start()
+                self._worker = worker
+
+    def _work(self):
+        while True:
+            validate, data = self._queue.get()
+            try:
+                # размер сообщения уже ограничен при разборе запроса
+                message_data = _etree.fromstring(
+                    data, _etree.XMLParser(huge_tree=True))
+                errors = validate(message_data)
+                self.count("failed" if errors else "validated")
+                if self.hook is not None:
+                    self.hook(message_data, errors)
+            except Exception, e:
+                logger.exception(e)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+wirelog.py
+"""
+import logging as _logging
+
+import random as _random
+import re as _re
+
+_redacted_re = _re.compile(
+    r"(<(?:[\w.-]+:)?(?:BinarySecurityToken|BinaryData)\b[^>]*(?<!/)>)"
+    r"[^<]*")
+
+
+class _WireMessage(object):
+    """
+    Captured message. Text is assembled only when the record is formatted
+    by a log handler.
+    """
+
+    def __init__(self, header, charset, max_length, redact):
+        self.header = header
+        self.charset = charset
+        self.max_length = max_length
+        self.redact = redact
+        self.chunks = []
+        self.length = 0
+        self.truncated = False
+
+    def record(self, chunks):
+        for chunk in chunks:
+            if not self.truncated:
+                # only references to the chunks are kept, nothing is copied
+                self.chunks.append(chunk)
+            self.length += len(chunk)
+            self.truncated = (
+                self.max_length is not None
+                and self.length > self.max_length)
+            yield chunk
+
+    def __str__(self):
+        text = b"".join(self.chunks)
+        if self.max_length is not None:
+            text = text[:self.max_length]
+        text = text.decode(self.charset or "utf-8", "replace")
+        if self.redact:
+            text = _redacted_re.sub(r"\1***", text)
+        if self.truncated:
+            text += u"... ({0} bytes truncated)".format(
+                self.length - self.max_length)
+        return u"{0} {1}".format(self.header, text).encode("utf-8")
+
+
+class WireLogger(object):
+    """
+    Logs raw messages as they come from the wire.
+
+    :param logger: Logger or logger name, may be a separate sink
+    :param int level: Logging level of messages
+    :param int max_length: Maximum number of bytes logged per message,
+        None to log whole messages
+    :param float sample_rate: Share of messages to log, from 0 to 1
+    :param bool redact: Hide content of BinarySecurityToken and BinaryData
+    """
+
+    def __init__(
+            self, logger="spyne_smev.wire", level=_logging.DEBUG,
+            max_length=None, sample_rate=1.0, redact=True):
+        if not isinstance(logger, _logging.Logger):
+            logger = _logging.getLogger(logger)
+        self.logger = logger
+        self.level = level
+        self.max_length = max_length
+        self.sample_rate = sample_rate
+        self.redact = redact
+
+    def enabled(self):
+        """
+        Checks effective logger level and sampling
+        """
+        return self.logger.isEnabledFor(self.level) and (
+            self.sample_rate >= 1 or _random.random() < self.sample_rate)
+
+    def capture(self, chunks, charset=None, header=""):
+        """
+        Wraps message chunks iterator, chunks are recorded while consumed
+
+        :return: (new iterator of chunks, message to pass to :meth:`log`)
+        """
+        message = _WireMessage(header, charset, self.max_length, self.redact)
+        return message.record(chunks), message
+
+    def log(self, message):
+        self.logger.log(self.level, "%s", message)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+cache.py
+"""
+from collections import OrderedDict as _OrderedDict
+import threading as _threading
+import time as _time
+
+
+class SignatureReplayError(ValueError):
+    """
+    Signature has already been verified once and replays are rejected
+    """
+
+
+class VerifiedSignatureCache(object):
+    """
+    Bounded LRU/TTL cache of already verified signatures.
+
+    Keys are ``(certificate fingerprint, body digest, signature value)``
+    tuples. On a hit the public key operation is skipped, or, in replay
+    rejection mode, :class:`SignatureReplayError` is raised instead.
+
+    :param int maxsize: Maximum number of remembered signatures
+    :param float ttl: Seconds an entry stays valid
+    :param bool reject_replays: Reject repeated signatures instead of
+        accepting them without verification
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, reject_replays=False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.reject_replays = reject_replays
+        self.hits = 0
+        self.misses = 0
+        self._entries = _OrderedDict()
+        self._lock = _threading.Lock()
+
+    def check(self, key):
+        """
+        Returns True if signature with given key was verified recently.
+
+        In replay rejection mode the key is remembered by the same locked
+        operation, so of concurrent duplicates only the first passes.
+        It should be :meth:`discard`-ed if the signature turns out to be
+        invalid.
+
+        :raises: SignatureReplayError
+        """
+        now = _time.time()
+        with self._lock:
+            expires = self._entries.pop(key, None)
+            if expires is None or expires < now:
+                self.misses += 1
+                if self.reject_replays:
+                    self._add(key, now)
+                return False
+
+            self.hits += 1
+            self._entries[key] = expires
+
+        if self.reject_replays:
+            raise SignatureReplayError("Signature has already been used")
+        return True
+
+    def _add(self, key, now):
+        self._entries.pop(key, None)
+        self._entries[key] = now + self.ttl
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def add(self, key):
+        """
+        Remembers successfully verified signature
+        """
+        with self._lock:
+            self._add(key, _time.time())
+
+    def discard(self, key):
+        """
+        Forgets signature, e.g. the one failed verification
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -10,22 +10,29 @@ import logging as _logging
 logger = _logging.getLogger(__name__)
 #TODO: add log messages
 
-from copy import deepcopy as _deepcopy
-
+from lxml.etree import XMLParser as _XMLParser
+from lxml.etree import XMLSyntaxError as _XMLSyntaxError
 from spyne.const import ansi_color as _color
 from spyne.model.fault import Fault as _Fault
 from spyne.protocol.soap import Soap11 as _Soap11
+from spyne.protocol.soap.soap11 import _parse_xml_string
 
 from spyne_smev import crypto as _crypto
-from spyne_smev.wsse.utils import _c14n_nsmap, verify_document, sign_document
+from spyne_smev import mtom as _mtom
+from spyne_smev import streaming as _streaming
+from spyne_smev._utils import EmptyCtx as _EmptyCtx
+from spyne_smev.executor import ExecutorBusy as _ExecutorBusy
+from spyne_smev.wirelog import WireLogger as _WireLogger
+from spyne_smev.wsse.utils import (
+    _c14n_nsmap, verify_document, SigningProfile)
 
 
 class BaseWSS(object):
 
-    def apply(self, envelope):
+    def apply(self, envelope, streams=None, body_sink=None):
         raise NotImplementedError()
 
-    def validate(self, envelope):
+    def validate(self, envelope, streams=None):
         raise NotImplementedError()
 
 
@@ -36,7 +43,8 @@ class X509TokenProfile(BaseWSS):
             private_key_path=None, private_key=None, private_key_pass=None,
             certificate_path=None, certificate=None,
             digest_method="sha1",
-            exclusive_c14n=True, c14n_with_comments=False):
+            exclusive_c14n=True, c14n_with_comments=False,
+            verified_cache=None, trust_store=None, executor=None):
 
         assert private_key_path or private_key, (
             "Either `private_key_path` or `private_key` should be defined")
@@ -49,8 +57,14 @@ class X509TokenProfile(BaseWSS):
         self._certificate = certificate
         self._private_key = private_key
         self.digest_method = digest_method
+        self.verified_cache = verified_cache
+        self.trust_store = trust_store
+        self.executor = executor
 
         self._c14n = _c14n_nsmap.get((exclusive_c14n, c14n_with_comments))
+        self.signing_profile = SigningProfile(
+            self.certificate, self.private_key, self._private_key_pass,
+            digest_method, exclusive_c14n, c14n_with_comments)
 
     @property
     def private_key(self):
@@ -66,35 +80,56 @@ class X509TokenProfile(BaseWSS):
                 self._certificate = fd.read()
         return self._certificate
 
-    def apply(self, envelope):
+    def _call(self, fn, *args, **kwargs):
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        return self.executor.run(fn, *args, **kwargs)
+
+    def apply(self, envelope, streams=None, body_sink=None):
         """
         Применяет профиль безопасности к конверту SOAP
 
         :param envelope: Soap конверт
+        :param dict streams: Потоковое содержимое двоичных элементов
+            конверта, см. :mod:`spyne_smev.streaming`
+        :param body_sink: Получает каноническую форму подписанного Body,
+            см. :class:`spyne_smev.streaming.BodySpool`
         :return: Soap envelope with applied security
         """
         logger.info("Signing document ...")
-        unsigned = _deepcopy(envelope)
         try:
-            return sign_document(
-                envelope, self.certificate, self.private_key,
-                self._private_key_pass, self.digest_method)
+            try:
+                return self._call(
+                    self.signing_profile.sign, envelope, in_place=True,
+                    streams=streams, body_sink=body_sink)
+            except _ExecutorBusy:
+                # метод сервиса уже выполнен, отказ оставил бы клиента без
+                # ответа, поэтому конверт подписывается в текущем потоке
+                return self.signing_profile.sign(
+                    envelope, in_place=True, streams=streams,
+                    body_sink=body_sink)
         except ValueError, e:
             logger.error(
                 "Error occurred while signing document:\n{0}\n"
                 "Keep it unsigned ...".format(e.message))
-            return unsigned
+            return envelope
 
-    def validate(self, envelope):
+    def validate(self, envelope, streams=None):
         """
         Проверяем, удовлетворяет ли конверт требованиям безопасности
 
         :param envelope: Soap конверт
+        :param dict streams: Содержимое элементов, вынесенное из конверта
+            при потоковом разборе
         :raises: spyne.model.fault.Fault
         """
         logger.info("Validate signed document")
         try:
-            verify_document(envelope, self.certificate)
+            self._call(
+                verify_document, envelope, self.certificate,
+                self.verified_cache, self.trust_store, streams=streams)
+        except _ExecutorBusy, e:
+            raise _Fault("Server.Busy", unicode(e))
         except (_crypto.Error, ValueError), e:
             logger.error("Signature check failed! Error:\n{0}".format(
                 unicode(e)))
@@ -111,14 +146,38 @@ class Soap11WSSE(_Soap11):
 
     :param wsse_security: Объек WS-Security
     :type wsse_security: wsfactory.spyne_smev.security.BaseWSSecurity
+    :param wire_logger: Логгер входящих сообщений, по умолчанию сообщения
+        пишутся в лог этого модуля с уровнем DEBUG
+    :type wire_logger: spyne_smev.wirelog.WireLogger
+    :param mtom: Параметры MTOM. Входящие multipart/related сообщения
+        принимаются всегда, вложения исходящих сообщений передаются
+        отдельными MIME-частями, только если параметр задан
+    :type mtom: spyne_smev.mtom.Mtom
+    :param bool stream_output: Отдавать подписанный ответ по частям.
+        Каноническая форма Body пишется во временный файл при вычислении
+        дайджеста и выводится как есть после заголовков, ответ всегда
+        в кодировке UTF-8
+    :param bool stream_input: Разбирать запрос через etree.iterparse по
+        мере чтения, не склеивая его в одну строку. Длинное содержимое
+        элементов :attr:`spilled_tags` переносится во временные файлы
     """
 
+    #: Элементы с двоичным содержимым, выносимым из дерева запроса
+    spilled_tags = ()
+    #: Содержимое длиннее этого числа символов выносится из дерева
+    spill_size = 64 * 1024
+
     def __init__(
         self, app=None, validator=None, xml_declaration=True,
         cleanup_namespaces=True, encoding="UTF-8", pretty_print=False,
-        wsse_security=None,
+        wsse_security=None, wire_logger=None, mtom=None,
+        stream_output=False, stream_input=False,
     ):
         self.wsse_security = wsse_security
+        self.wire_logger = wire_logger or _WireLogger(logger)
+        self.mtom = mtom
+        self.stream_output = stream_output
+        self.stream_input = stream_input
         if self.wsse_security:
             pretty_print = False
         super(Soap11WSSE, self).__init__(
@@ -127,22 +186,97 @@ class Soap11WSSE(_Soap11):
             pretty_print=pretty_print)
 
     def create_in_document(self, ctx, charset=None):
-        if logger.level == _logging.DEBUG:
-            line_header = '%sRequest%s' % (
-                _color.LIGHT_GREEN, _color.END_COLOR)
-            in_string = list(ctx.in_string)
-            if charset:
-                xml_string = ''.join([s.decode(charset) for s in in_string])
+        content_type = _mtom.get_content_type(ctx)
+        related = _mtom.is_related(content_type)
+        if related:
+            # вложения сразу пишутся во временные файлы, дальше
+            # разбирается только soap-конверт
+            try:
+                ctx.in_string, attachments = (
+                    self.mtom or _mtom.Mtom()).decode(
+                        content_type, ctx.in_string)
+            except ValueError, e:
+                raise _Fault(
+                    "Client.MtomError", "Invalid MTOM message: {0}".format(e))
+            if ctx.udc is None:
+                ctx.udc = _EmptyCtx()
+            ctx.udc.in_attachments = attachments
+
+        wire_message = None
+        if self.wire_logger.enabled():
+            ctx.in_string, wire_message = self.wire_logger.capture(
+                ctx.in_string, charset,
+                '%sRequest%s' % (_color.LIGHT_GREEN, _color.END_COLOR))
+        try:
+            if self.stream_input:
+                ctx.in_document = self._parse_stream(ctx, charset)
+            elif related:
+                ctx.in_document = _parse_xml_string(
+                    ctx.in_string, _XMLParser(**self.parser_kwargs))
             else:
-                xml_string = ''.join(in_string)
-            ctx.in_string = iter(in_string)
-            logger.debug("%s %s" % (line_header, xml_string))
-        super(Soap11WSSE, self).create_in_document(ctx, charset)
+                super(Soap11WSSE, self).create_in_document(ctx, charset)
+        finally:
+            if wire_message is not None:
+                self.wire_logger.log(wire_message)
         if self.wsse_security:
             in_document, _ = ctx.in_document
-            self.wsse_security.validate(in_document)
+            streams = getattr(ctx.udc, "in_binary_streams", None)
+            if streams:
+                self.wsse_security.validate(in_document, streams)
+            else:
+                self.wsse_security.validate(in_document)
+
+    def _parse_stream(self, ctx, charset=None):
+        """
+        Разбирает запрос по мере чтения, вынесенное из дерева содержимое
+        сохраняется в ctx.udc.in_binary_streams
+        """
+        parser_kwargs = dict(self.parser_kwargs)
+        if charset:
+            parser_kwargs["encoding"] = charset
+        try:
+            root, streams = _streaming.parse_document(
+                ctx.in_string, self.spilled_tags, self.spill_size,
+                **parser_kwargs)
+        except _XMLSyntaxError, e:
+            raise _Fault("Client.XMLSyntaxError", str(e))
+        if ctx.udc is None:
+            ctx.udc = _EmptyCtx()
+        ctx.udc.in_binary_streams = streams
+        return root, {}
 
     def create_out_string(self, ctx, charset=None):
+        streams = getattr(ctx.udc, "out_binary_streams", None)
+        body = None
         if self.wsse_security and ctx.method_name:
-            ctx.out_document = self.wsse_security.apply(ctx.out_document)
-        super(Soap11WSSE, self).create_out_string(ctx, charset)
+            if self.stream_output:
+                body = _streaming.BodySpool()
+                ctx.out_document = self.wsse_security.apply(
+                    ctx.out_document, streams, body)
+            elif streams:
+                ctx.out_document = self.wsse_security.apply(
+                    ctx.out_document, streams)
+            else:
+                ctx.out_document = self.wsse_security.apply(
+                    ctx.out_document)
+        if body is not None and not body.size:
+            # документ не подписан
+            body.close()
+            body = None
+
+        if body is not None:
+            ctx.out_string = _streaming.iter_signed_document(
+                ctx.out_document, body, streams, self.xml_declaration)
+        elif streams:
+            # двоичное содержимое выводится в base64 по частям
+            ctx.out_string = _streaming.iter_document(
+                ctx.out_document, streams, charset or self.encoding,
+                self.xml_declaration)
+        else:
+            super(Soap11WSSE, self).create_out_string(ctx, charset)
+
+        attachments = getattr(ctx.udc, "out_attachments", None)
+        if self.mtom and attachments:
+            content_type, ctx.out_string = self.mtom.encode(
+                ctx.out_string, attachments)
+            ctx.transport.resp_headers["Content-Type"] = content_type
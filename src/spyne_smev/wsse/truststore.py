@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+"""
+truststore.py
+"""
+import logging as _logging
+logger = _logging.getLogger(__name__)
+
+import os as _os
+import re as _re
+import threading as _threading
+import time as _time
+
+from spyne_smev import crypto as _crypto
+from spyne_smev.wsse.utils import _get_clean_cert_data, _token_fingerprint
+
+_pem_certificate_re = _re.compile(
+    r"-----BEGIN CERTIFICATE-----\s.*?\s-----END CERTIFICATE-----",
+    _re.DOTALL)
+
+_certificate_extensions = (".pem", ".crt", ".cer")
+
+
+class _Entry(object):
+
+    def __init__(self, pem):
+        self.pem = pem
+        self._certificate = None
+
+    @property
+    def certificate(self):
+        if self._certificate is None:
+            self._certificate = _crypto.Certificate.from_pem(self.pem)
+        return self._certificate
+
+
+class TrustStore(object):
+    """
+    Set of trusted certificates indexed by SHA-1 digest of certificate DER
+    data, so the certificate of incoming message is found with a single
+    dict lookup. Parsed public key is kept per certificate.
+
+    Certificates are loaded from a directory of PEM files or from a PEM
+    bundle file. The source is checked for changes not more often than
+    once in ``reload_interval`` seconds and reloaded if changed.
+
+    :param path: Directory with certificates or PEM bundle file path
+    :param certificates: PEM certificates to trust in addition to ``path``
+    :param float reload_interval: Seconds between source checks,
+        ``None`` disables reloading
+    """
+
+    def __init__(self, path=None, certificates=(), reload_interval=5):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._static = {}
+        self._entries = {}
+        self._snapshot = None
+        self._checked = 0
+        self._lock = _threading.Lock()
+
+        for pem in certificates:
+            self._add(self._static, pem)
+        self._entries = self._static.copy()
+        if path:
+            self.reload()
+
+    @classmethod
+    def from_directory(cls, path, reload_interval=5):
+        return cls(path=path, reload_interval=reload_interval)
+
+    @classmethod
+    def from_bundle(cls, bundle):
+        """
+        Creates store from PEM bundle text
+
+        :param basestring bundle: Concatenated PEM certificates
+        """
+        return cls(certificates=_pem_certificate_re.findall(bundle))
+
+    @staticmethod
+    def _add(entries, pem):
+        # PEM files exported on Windows have CRLF line endings
+        pem = "\n".join(pem.splitlines())
+        token = _get_clean_cert_data(pem)
+        entries[_token_fingerprint(token)] = _Entry(pem)
+
+    def _read_snapshot(self):
+        if _os.path.isdir(self.path):
+            files = sorted(
+                _os.path.join(self.path, name)
+                for name in _os.listdir(self.path)
+                if name.lower().endswith(_certificate_extensions))
+        else:
+            files = [self.path]
+
+        return tuple((name, _os.path.getmtime(name)) for name in files)
+
+    def _read_entries(self, snapshot):
+        entries = self._static.copy()
+        for name, _ in snapshot:
+            with open(name) as fd:
+                for pem in _pem_certificate_re.findall(fd.read()):
+                    try:
+                        self._add(entries, pem)
+                    except ValueError, e:
+                        logger.error(
+                            "Cannot load certificate from {0}: {1}".format(
+                                name, e))
+        return entries
+
+    def reload(self):
+        """
+        Rereads certificates from ``path``. If it can't be read, the
+        previously loaded certificates are kept.
+
+        :return: Whether certificates were reloaded
+        :rtype: bool
+        """
+        with self._lock:
+            try:
+                snapshot = self._read_snapshot()
+                entries = self._read_entries(snapshot)
+            except EnvironmentError, e:
+                logger.error("Cannot load trust store {0}: {1}".format(
+                    self.path, e))
+                self._checked = _time.time()
+                return False
+            # keep already parsed certificates
+            for fingerprint, entry in self._entries.iteritems():
+                if fingerprint in entries:
+                    entries[fingerprint] = entry
+            self._entries = entries
+            self._snapshot = snapshot
+            self._checked = _time.time()
+            return True
+
+    def _check_reload(self):
+        if (not self.path or self.reload_interval is None
+                or _time.time() - self._checked < self.reload_interval):
+            return
+        self._checked = _time.time()
+        try:
+            changed = self._read_snapshot() != self._snapshot
+        except EnvironmentError, e:
+            logger.error("Cannot check trust store: {0}".format(e))
+            return
+        if changed:
+            logger.info("Trust store {0} changed, reloading".format(self.path))
+            self.reload()
+
+    def get(self, fingerprint):
+        """
+        Returns trusted certificate by fingerprint of its DER data
+
+        :param bytes fingerprint: SHA-1 digest of certificate
+        :rtype: spyne_smev.crypto.Certificate or None
+        """
+        self._check_reload()
+        entry = self._entries.get(fingerprint)
+        return entry.certificate if entry is not None else None
+
+    def find(self, token):
+        """
+        Returns trusted certificate by content of BinarySecurityToken
+
+        :param basestring token: Base64 encoded certificate
+        :rtype: spyne_smev.crypto.Certificate or None
+        """
+        return self.get(_token_fingerprint(token))
+
+    def __contains__(self, token):
+        return self.find(token) is not None
+
+    def __len__(self):
+        return len(self._entries)
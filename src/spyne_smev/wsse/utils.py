@@ -7,14 +7,19 @@ utils.py
 :Author: tim    
 """
 
+from collections import deque as _deque
 from copy import deepcopy as _deepcopy
 import base64 as _base64
+import binascii as _binascii
+import cPickle as _pickle
 from functools import partial as _partial
+import hashlib as _hashlib
 import uuid as _uuid
 
 from lxml import etree as _etree
 
 from spyne_smev import crypto as _crypto
+from spyne_smev import streaming as _streaming
 from spyne_smev import _utils
 from spyne_smev import _xmlns
 
@@ -55,8 +60,26 @@ _signature_method_exclusions = {
     "id-GostR3411-94-with-GostR3410-2001": "md_gost94",
 }
 
+_wsu_id = "{{{wsu}}}Id".format(**_nsmap)
+_header_tag = "{{{soapenv}}}Header".format(**_nsmap)
+_header_path = "./" + _header_tag
+_body_path = "./{{{soapenv}}}Body".format(**_nsmap)
+_security_tag = "{{{wsse}}}Security".format(**_nsmap)
+_security_path = "./" + _security_tag
+_bst_path = "./{{{wsse}}}BinarySecurityToken".format(**_nsmap)
+_token_reference_path = (
+    "./{{{ds}}}Signature/{{{ds}}}KeyInfo/{{{wsse}}}SecurityTokenReference"
+    "/{{{wsse}}}Reference".format(**_nsmap))
+_signed_info_path = "./{{{ds}}}Signature/{{{ds}}}SignedInfo".format(**_nsmap)
+_signature_value_path = (
+    "./{{{ds}}}Signature/{{{ds}}}SignatureValue".format(**_nsmap))
+_reference_path = "./{{{ds}}}Reference".format(**_nsmap)
+_digest_value_path = "./{{{ds}}}DigestValue".format(**_nsmap)
+
 
 def _get_clean_cert_data(certificate):
+    if isinstance(certificate, _crypto.Certificate):
+        certificate = certificate.pem
     begin_marker = "-----BEGIN CERTIFICATE-----\n"
     end_marker = "\n-----END CERTIFICATE-----"
     begin_marker_pos = certificate.find(begin_marker)
@@ -67,6 +90,55 @@ def _get_clean_cert_data(certificate):
         begin_marker_pos + len(begin_marker):end_marker_pos].split())
 
 
+def _b64decode(text, name):
+    """
+    Decodes base64 text of untrusted message, malformed or missing text
+    raises ValueError
+    """
+    if not text:
+        raise ValueError("Empty {0}".format(name))
+    try:
+        return _base64.b64decode(text)
+    except (TypeError, _binascii.Error), e:
+        raise ValueError("Malformed {0}: {1}".format(name, e))
+
+
+def _token_fingerprint(token):
+    return _hashlib.sha1(
+        _b64decode(token, "binary security token")).digest()
+
+
+def c14n_digest(
+        node, digest, exclusive=True, with_comments=False,
+        inclusive_ns_prefixes=None, streams=None, copy_to=None):
+    """
+    Canonicalizes node and returns digest of the canonical form. Canonical
+    output is fed to the digest in chunks as it is produced, so it never
+    exists as a whole string in memory.
+
+    :param node: Element to canonicalize
+    :type node: lxml.etree.Element
+    :param digest: Digest object or digest algorithm name
+    :type digest: spyne_smev.crypto.Digest or str
+    :param dict streams: Streamed binary content by placeholder markers,
+        see :mod:`spyne_smev.streaming`
+    :param copy_to: File-like object, receives the canonical form too
+    :return str: Binary digest value
+    """
+    if not isinstance(digest, _crypto.Digest):
+        digest = _crypto.Digest(digest)
+    sink = digest if copy_to is None else _streaming.Tee(digest, copy_to)
+    if streams:
+        sink = _streaming.SplicingWriter(sink, streams)
+    _etree.ElementTree(node).write_c14n(
+        sink, exclusive=exclusive, with_comments=with_comments,
+        inclusive_ns_prefixes=inclusive_ns_prefixes)
+    if streams:
+        sink.flush()
+
+    return digest.final()
+
+
 def _construct_wsse_header(
         certificate,
         actor="http://smev.gosuslugi.ru/actors/smev",
@@ -139,121 +211,325 @@ def _construct_wsse_header(
     return root
 
 
+class SigningProfile(object):
+    """
+    Precompiled signing profile. Everything that depends only on the key
+    and certificate (cleaned base64 token, algorithm URIs, digest methods,
+    the ``wsse:Security`` subtree) is resolved once, so signing a message
+    only stamps out a copy of the header template and computes digests.
+
+    :param certificate: Certificate PEM data or loaded handle
+    :type certificate: bytes or spyne_smev.crypto.Certificate
+    :param bytes private_key: Private key text data
+    :param unicode private_key_pass: Private key password
+    :param str digest_method: Body digest method name
+    :param bool c14n_exclusive: Use exclusive canonicalization
+    :param bool c14n_with_comments: Keep comments while canonicalization
+    """
+
+    def __init__(
+            self, certificate, private_key, private_key_pass=None,
+            digest_method="sha1", c14n_exclusive=True,
+            c14n_with_comments=False,
+            actor="http://smev.gosuslugi.ru/actors/smev"):
+
+        self.certificate = _crypto.load_certificate(certificate)
+        self.private_key = _crypto.load_private_key(
+            private_key, private_key_pass)
+        self.digest_method = digest_method
+        self.digest_method_ns = _digest_method_nsmap.get(digest_method, None)
+        if self.digest_method_ns is None:
+            raise ValueError(
+                "No such digest method: {0}".format(digest_method))
+
+        self.signature_method = self.certificate.signature_algorithm_name
+        self.signature_method_ns = _signature_method_nsmap.get(
+            self.signature_method, None)
+        if self.signature_method_ns is None:
+            raise ValueError(
+                "No such signature method: {0}".format(self.signature_method))
+        self.signature_digest_name = _signature_method_exclusions.get(
+            self.signature_method, self.signature_method)
+
+        # resolve both digests now to fail on construction rather than on
+        # the first message
+        _crypto.get_digest_method(self.digest_method)
+        _crypto.get_digest_method(self.signature_digest_name)
+
+        self.c14n_exclusive = c14n_exclusive
+        self.c14n_with_comments = c14n_with_comments
+        self._c14n = _partial(
+            _etree.tostring, method="c14n",
+            exclusive=c14n_exclusive, with_comments=c14n_with_comments)
+
+        self._template = _construct_wsse_header(
+            certificate, actor=actor, digest_method=digest_method,
+            signature_method=self.signature_method)
+        self.token = self._template.find(_bst_path).text
+
+    def create_security_header(self):
+        """
+        Returns fresh ``wsse:Security`` element made from the template
+
+        :rtype: lxml.etree.Element
+        """
+        security = _deepcopy(self._template)
+        cert_id = "CertId-{0}".format(_uuid.uuid4().hex)
+        security.find(_bst_path).attrib[_wsu_id] = cert_id
+        security.find(_token_reference_path).attrib["URI"] = "#{0}".format(
+            cert_id)
+        return security
+
+    def sign(
+            self, document, in_place=False, digest=None, streams=None,
+            body_sink=None):
+        """
+        Signs soap envelope according to SMEV recommendations
+
+        :param document: Document to sign
+        :type document: lxml.etree.Element
+        :param bool in_place: Sign document itself instead of its copy. If
+            signing fails, the header and attribute changes made are rolled
+            back, so the document is left unsigned but intact.
+        :param digest: Digest context to reuse for the body digest
+        :type digest: spyne_smev.crypto.Digest
+        :param dict streams: Streamed binary content of the document
+        :param body_sink: Object with ``write`` and ``discard`` methods,
+            receives canonical form of the signed Body, so it can be
+            written out without serializing the Body once again. It is
+            discarded if signing fails.
+        :return: Signed document
+        :rtype: lxml.etree.Element
+        """
+        if not in_place:
+            return self._sign(
+                _deepcopy(document), digest, streams, body_sink)
+
+        header_node = document.find(_header_path)
+        header_length = len(header_node) if header_node is not None else 0
+        security_node = security_copy = None
+        if header_node is not None:
+            security_node = header_node.find(_security_path)
+            if security_node is not None:
+                security_copy = _deepcopy(security_node)
+        body_node = document.find(_body_path)
+        if body_node is not None:
+            body_id = body_node.attrib.get(_wsu_id)
+            body_nsmap = body_node.nsmap
+        try:
+            return self._sign(document, digest, streams, body_sink)
+        except:
+            if header_node is None:
+                header_node = document.find(_header_path)
+                if header_node is not None:
+                    document.remove(header_node)
+            else:
+                del header_node[header_length:]
+                if security_copy is not None:
+                    header_node.replace(security_node, security_copy)
+            if body_node is not None:
+                if body_id is None:
+                    body_node.attrib.pop(_wsu_id, None)
+                else:
+                    body_node.attrib[_wsu_id] = body_id
+                self._remove_added_namespaces(body_node, body_nsmap)
+            raise
+
+    @staticmethod
+    def _remove_added_namespaces(node, nsmap):
+        added = set(
+            prefix for prefix, namespace in node.nsmap.iteritems()
+            if nsmap.get(prefix) != namespace)
+        if not added:
+            return
+        # declarations of the document are kept even if they look unused,
+        # e.g. the ones used only in QName values
+        keep = set(
+            prefix for element in node.iter()
+            if isinstance(element.tag, basestring)
+            for prefix in element.nsmap if prefix)
+        _etree.cleanup_namespaces(node, keep_ns_prefixes=keep - added)
+
+    def _sign(self, out_document, digest=None, streams=None, body_sink=None):
+        header_node = out_document.find(_header_path)
+        if header_node is None:
+            header_node = _etree.Element(_header_tag)
+            out_document.insert(0, header_node)
+
+        security_node = header_node.find(_security_path)
+        if security_node is None:
+            security_node = self.create_security_header()
+            header_node.append(security_node)
+
+        body_node = out_document.find(_body_path)
+        body_id = "Id-%s" % str(_uuid.uuid4())
+        body_node.attrib[_wsu_id] = body_id
+
+        sign_info_node = security_node.find(_signed_info_path)
+        reference_node = sign_info_node.find(_reference_path)
+        reference_node.attrib['URI'] = "#{0}".format(body_id)
+
+        try:
+            reference_node.find(_digest_value_path).text = _base64.b64encode(
+                c14n_digest(
+                    body_node, digest or self.digest_method,
+                    self.c14n_exclusive, self.c14n_with_comments,
+                    streams=streams, copy_to=body_sink))
+
+            security_node.find(_signature_value_path).text = (
+                _base64.b64encode(_crypto.sign(
+                    self._c14n(sign_info_node), self.private_key,
+                    digest_name=self.signature_digest_name)))
+        except:
+            if body_sink is not None:
+                body_sink.discard()
+            raise
+
+        return out_document
+
+
 def sign_document(
         document, cert_data, pkey_data, pkey_pass,
         digest_method="sha1", c14n_exclusive=True,
-        c14n_with_comments=False):
+        c14n_with_comments=False, in_place=False):
     """
     Soap envelope signing according to SMEV recommendations
 
+    .. note::
+        Each call compiles new :class:`SigningProfile`, use it directly
+        when signing many documents with the same key
+
     :param document: Document to sign
     :type document: lxml.etree.Element
     :param bytes pkey_data: Private key text data
     :param unicode pkey_pass: Private key password
     :param bytes cert_data: Certificate text data
+    :param bool in_place: Sign document itself instead of its copy
     :return: Signed document
     :rtype: lxml.etree.Element
     """
+    return SigningProfile(
+        cert_data, pkey_data, pkey_pass, digest_method,
+        c14n_exclusive, c14n_with_comments).sign(document, in_place)
+
+
+class SignatureNodes(object):
+    """
+    XMLDSIG structure of a signed soap envelope. Attributes of nodes which
+    are absent in the envelope are left ``None``.
+    """
+
+    def __init__(self):
+        self.body = None
+        self.binary_security_token = None
+        self.signed_info = None
+        self.c14n_method = None
+        self.signature_method = None
+        self.transform = None
+        self.digest_method = None
+        self.digest_value = None
+        self.signature_value = None
+
+
+_signature_node_names = {
+    "{{{wsse}}}BinarySecurityToken".format(**_nsmap): "binary_security_token",
+    "{{{ds}}}SignedInfo".format(**_nsmap): "signed_info",
+    "{{{ds}}}CanonicalizationMethod".format(**_nsmap): "c14n_method",
+    "{{{ds}}}SignatureMethod".format(**_nsmap): "signature_method",
+    "{{{ds}}}Transform".format(**_nsmap): "transform",
+    "{{{ds}}}DigestMethod".format(**_nsmap): "digest_method",
+    "{{{ds}}}DigestValue".format(**_nsmap): "digest_value",
+    "{{{ds}}}SignatureValue".format(**_nsmap): "signature_value",
+}
+
+
+def locate_signature(document):
+    """
+    Finds all XMLDSIG nodes of the envelope in one walk over
+    ``soapenv:Header/wsse:Security``, so lookup cost doesn't depend on
+    the ``Body`` size. The first node of each kind in document order wins.
+
+    :param document: Soap envelope
+    :type document: lxml.etree.Element
+    :rtype: SignatureNodes
+    """
+    nodes = SignatureNodes()
+    nodes.body = document.find(_body_path)
+    header = document.find(_header_path)
+    if header is None:
+        return nodes
+
+    for security in header.iterchildren(_security_tag):
+        for node in security.iter(*_signature_node_names):
+            name = _signature_node_names[node.tag]
+            if getattr(nodes, name) is None:
+                setattr(nodes, name, node)
+
+    return nodes
 
-    _c14n = _partial(
-        _etree.tostring, method="c14n",
-        exclusive=c14n_exclusive, with_comments=c14n_with_comments)
-
-    out_document = _deepcopy(document)
-    header_node = out_document.find(
-        "./{{{soapenv}}}Header".format(**_nsmap))
-    if header_node is None:
-        header_node = _etree.Element("{{{soapenv}}}Header".format(**_nsmap))
-        out_document.insert(0, header_node)
-
-    security_node = out_document.find(
-        "./{{{soapenv}}}Header/{{{wsse}}}Security".format(**_nsmap))
-    if not security_node:
-        wsse_header_node = _construct_wsse_header(
-            certificate=cert_data, digest_method=digest_method)
-        header_node.append(wsse_header_node)
-
-    body_node = out_document.find(
-        "./{{{soapenv}}}Body".format(**_nsmap))
-    body_id = "Id-%s" % str(_uuid.uuid4())
-    body_node.attrib["{{{0}}}Id".format(_xmlns.wsu)] = body_id
-
-    reference_node = out_document.find(
-        "./{{{soapenv}}}Header/{{{wsse}}}Security/"
-        "{{{ds}}}Signature/{{{ds}}}SignedInfo/{{{ds}}}Reference".format(
-            **_nsmap))
-    reference_node.attrib['URI'] = "#{0}".format(body_id)
-
-    digest_value = _base64.b64encode(_crypto.get_text_digest(
-        _c14n(body_node), digest_method))
-    digest_val_node = out_document.find(
-        "./{{{soapenv}}}Header/{{{wsse}}}Security"
-        "/{{{ds}}}Signature/{{{ds}}}SignedInfo/{{{ds}}}Reference"
-        "/{{{ds}}}DigestValue".format(**_nsmap))
-    digest_val_node.text = digest_value
-
-    sign_info_node = out_document.find(
-        "./{{{soapenv}}}Header/{{{wsse}}}Security"
-        "/{{{ds}}}Signature/{{{ds}}}SignedInfo".format(**_nsmap))
-    signature_algorithm = _crypto.get_signature_algorithm_name(cert_data)
-    signature_algorithm = _signature_method_exclusions.get(
-        signature_algorithm, signature_algorithm)
-    signature_value = _base64.b64encode(_crypto.sign(
-        _c14n(sign_info_node), pkey_data, pkey_pass, signature_algorithm))
-    sign_val_node = out_document.find(
-        "./{{{soapenv}}}Header/{{{wsse}}}Security"
-        "/{{{ds}}}Signature/{{{ds}}}SignatureValue".format(**_nsmap))
-    sign_val_node.text = signature_value
-
-    return out_document
-
-
-def verify_document(document, certificate):
+
+def verify_document(
+        document, certificate=None, verified_cache=None, trust_store=None,
+        streams=None):
     """
     Check SOAP envelope signature according to SMEV recommendations
 
     :param document: etree.Element XML Document
     :type document: lxml.etree.Element
+    :param certificate: The only certificate allowed to sign the document
+    :type certificate: bytes or spyne_smev.crypto.Certificate
+    :param trust_store: Set of certificates allowed to sign the document,
+        used instead of ``certificate``
+    :type trust_store: spyne_smev.wsse.truststore.TrustStore
+    :param verified_cache: Cache of already verified signatures. On a hit
+        the public key operation is skipped (or the replay is rejected)
+    :type verified_cache: spyne_smev.wsse.cache.VerifiedSignatureCache
+    :param dict streams: Content of elements moved out of the document,
+        see :func:`spyne_smev.streaming.parse_document`
     :raises: ValueError, spyne_smev.crypto.InvalidSignature
     """
 
-    body = document.find("./{{{soapenv}}}Body".format(**_nsmap))
+    nodes = locate_signature(document)
+    body = nodes.body
     if body is None:
         raise ValueError(
             "Incorrect soap envelope: "
             "`{{{soapenv}}}Body` tag not found".format(**_nsmap))
 
-    digest_value = document.find(".//{{{ds}}}DigestValue".format(**_nsmap))
+    digest_value = nodes.digest_value
     if digest_value is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
             "`{{{ds}}}DigestValue` tag not found".format(**_nsmap))
 
-    binary_security_token = document.find(
-        ".//{{{wsse}}}BinarySecurityToken".format(**_nsmap))
+    binary_security_token = nodes.binary_security_token
     if binary_security_token is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
             "`{{{ds}}}BinarySecurityToken` tag not found".format(**_nsmap))
 
-    if not binary_security_token.text == _get_clean_cert_data(certificate):
+    fingerprint = None
+    if trust_store is not None:
+        fingerprint = _token_fingerprint(binary_security_token.text)
+        certificate = trust_store.get(fingerprint)
+        if certificate is None:
+            raise ValueError("Untrusted binary security token")
+    elif not binary_security_token.text == _get_clean_cert_data(certificate):
         raise ValueError("Incorrect binary security token")
 
-    signed_info = document.find(".//{{{ds}}}SignedInfo".format(**_nsmap))
+    signed_info = nodes.signed_info
     if signed_info is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
             "`{{{ds}}}SignedInfo` tag not found".format(**_nsmap))
 
-    signature = document.find(".//{{{ds}}}SignatureValue".format(**_nsmap))
+    signature = nodes.signature_value
     if signature is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
             "`{{{ds}}}SignatureValue` tag not found".format(**_nsmap))
 
-    c14n = _partial(_etree.tostring, method="c14n")
-
-    digest_method = document.find(".//{{{ds}}}DigestMethod".format(**_nsmap))
+    digest_method = nodes.digest_method
     if digest_method is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
@@ -263,11 +539,10 @@ def verify_document(document, certificate):
         digest_method.attrib["Algorithm"], None)
     if digest_name is None:
         raise ValueError(
-            "Unsupported digest method algorithm: {0}".format(digest_name))
+            "Unsupported digest method algorithm: {0}".format(
+                digest_method.attrib["Algorithm"]))
 
-    transform = document.find(
-        ".//{{{ds}}}Reference/{{{ds}}}Transforms/{{{ds}}}Transform".format(
-            **_nsmap))
+    transform = nodes.transform
     if transform is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
@@ -284,15 +559,33 @@ def verify_document(document, certificate):
     else:
         inc_ns_map = None
 
-    body_digest = _base64.b64encode(_crypto.get_text_digest(
-        c14n(body, exclusive=exc_c14n, with_comments=with_comments,
-             inclusive_ns_prefixes=inc_ns_map),
-        digest_name))
+    body_digest = _base64.b64encode(c14n_digest(
+        body, digest_name, exclusive=exc_c14n, with_comments=with_comments,
+        inclusive_ns_prefixes=inc_ns_map, streams=streams))
 
     if body_digest != digest_value.text:
         raise _crypto.InvalidSignature("Invalid `Body` digest!")
-    signature_method = document.find(
-        ".//{{{ds}}}SignatureMethod".format(**_nsmap))
+
+    cache_key = None
+    if verified_cache is not None:
+        cache_key = (
+            fingerprint or _token_fingerprint(binary_security_token.text),
+            body_digest, signature.text)
+        if verified_cache.check(cache_key):
+            return
+
+    try:
+        _verify_signed_info(document, nodes, certificate)
+    except:
+        if cache_key is not None:
+            verified_cache.discard(cache_key)
+        raise
+    if cache_key is not None:
+        verified_cache.add(cache_key)
+
+
+def _verify_signed_info(document, nodes, certificate):
+    signature_method = nodes.signature_method
     if signature_method is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
@@ -305,8 +598,7 @@ def verify_document(document, certificate):
                 signature_method.attrib["Algorithm"]))
     digest_name = _signature_method_exclusions.get(digest_name, digest_name)
 
-    c14n_method_node = document.find(
-        ".//{{{ds}}}CanonicalizationMethod".format(**_nsmap))
+    c14n_method_node = nodes.c14n_method
     if c14n_method_node is None:
         raise ValueError(
             "Incorrect xmldsig structure: "
@@ -323,8 +615,146 @@ def verify_document(document, certificate):
     else:
         inc_ns_map = None
     _crypto.verify(
-        c14n(signed_info, exclusive=exc_c14n, with_comments=with_comments,
-             inclusive_ns_prefixes=inc_ns_map),
+        _etree.tostring(
+            nodes.signed_info, method="c14n", exclusive=exc_c14n,
+            with_comments=with_comments, inclusive_ns_prefixes=inc_ns_map),
         certificate,
-        _base64.b64decode(signature.text),
-        digest_name)
\ No newline at end of file
+        _b64decode(nodes.signature_value.text, "signature value"),
+        digest_name)
+
+
+#: State of batch in a forked worker process, set by the pool initializer
+_batch_state = {}
+
+
+def _picklable_error(error):
+    try:
+        _pickle.loads(_pickle.dumps(error))
+    except Exception:
+        return Exception("{0}: {1}".format(type(error).__name__, error))
+    return error
+
+
+def _sign_serialized(data):
+    profile = _batch_state["profile"]
+    digest = _batch_state.get("digest")
+    if digest is None:
+        digest = _batch_state["digest"] = _crypto.Digest(
+            profile.digest_method)
+    try:
+        return _etree.tostring(
+            profile.sign(_etree.fromstring(data), True, digest)), None
+    except Exception, e:
+        digest.reset()
+        return None, _picklable_error(e)
+
+
+def _verify_serialized(data):
+    try:
+        verify_document(_etree.fromstring(data), **_batch_state["kwargs"])
+    except Exception, e:
+        return _picklable_error(e)
+    return None
+
+
+def _init_batch(state):
+    _batch_state.update(state)
+
+
+def _imap_forked(fn, items, processes, chunksize, state):
+    # workers are forked with the initializer arguments inherited, so
+    # neither the profile nor the trust store have to be pickled, and the
+    # state of concurrent batches doesn't mix
+    import multiprocessing
+    pool = multiprocessing.Pool(processes, _init_batch, (state,))
+    try:
+        for result in pool.imap(fn, items, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _serialize_pending(documents, pending):
+    for document in documents:
+        pending.append(document)
+        yield _etree.tostring(document)
+
+
+def sign_documents(documents, profile, processes=None, chunksize=16):
+    """
+    Signs batch of documents with the same profile. One digest context,
+    loaded key and compiled header template are reused for all documents.
+
+    Results are yielded in order as ``(signed_document, error)`` tuples,
+    an error of one document doesn't abort the batch.
+
+    :param documents: Documents to sign
+    :type documents: iterable of lxml.etree.Element
+    :param SigningProfile profile: Signing profile
+    :param int processes: Fan out signing to the pool of this number of
+        forked processes, documents are passed serialized
+    :param int chunksize: Documents sent to a process at once
+    :rtype: generator
+    """
+    if processes:
+        results = _imap_forked(
+            _sign_serialized, (_etree.tostring(doc) for doc in documents),
+            processes, chunksize, {"profile": profile})
+        for data, error in results:
+            yield (_etree.fromstring(data) if error is None else None), error
+        return
+
+    digest = _crypto.Digest(profile.digest_method)
+    for document in documents:
+        try:
+            yield profile.sign(document, digest=digest), None
+        except Exception, e:
+            digest.reset()
+            yield None, e
+
+
+def verify_documents(
+        documents, trust_store=None, certificate=None, verified_cache=None,
+        processes=None, chunksize=16):
+    """
+    Verifies batch of documents. Results are yielded in order as
+    ``(document, error)`` tuples, ``error`` is None for valid documents.
+
+    :param documents: Documents to verify
+    :type documents: iterable of lxml.etree.Element
+    :param trust_store: Certificates allowed to sign documents
+    :type trust_store: spyne_smev.wsse.truststore.TrustStore
+    :param certificate: The only certificate allowed to sign documents
+    :param verified_cache: Cache of already verified signatures, can't be
+        used with ``processes``, as forked processes don't share it
+    :type verified_cache: spyne_smev.wsse.cache.VerifiedSignatureCache
+    :param int processes: Fan out verification to the pool of this number
+        of forked processes
+    :param int chunksize: Documents sent to a process at once
+    :rtype: generator
+    :raises: ValueError
+    """
+    if processes and verified_cache is not None:
+        raise ValueError(
+            "verified_cache is not shared by forked processes")
+    kwargs = dict(
+        certificate=certificate, trust_store=trust_store,
+        verified_cache=verified_cache)
+    if processes:
+        pending = _deque()
+        results = _imap_forked(
+            _verify_serialized, _serialize_pending(documents, pending),
+            processes, chunksize, {"kwargs": kwargs})
+        for error in results:
+            yield pending.popleft(), error
+        return
+
+    for document in documents:
+        try:
+            verify_document(document, **kwargs)
+        except Exception, e:
+            yield document, e
+        else:
+            yield document, None
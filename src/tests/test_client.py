@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_client.py
+"""
+
+import unittest
+
+from lxml import etree
+from suds.sax.parser import Parser
+from suds.transport import Request, Transport
+
+from spyne_smev.client import Client, _SigningTransport, _WsseSecurity
+from spyne_smev.wsse import utils
+
+from tests.test_wsse import (
+    TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS, TEST_X509_CERT)
+
+
+def _create_envelope(items):
+    return (
+        '<soapenv:Envelope '
+        'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:tns="urn:test"><soapenv:Header/><soapenv:Body>'
+        '<tns:Request>{0}</tns:Request></soapenv:Body></soapenv:Envelope>'
+        .format("".join(
+            "<tns:Item>{0}</tns:Item>".format(number)
+            for number in xrange(items))))
+
+
+class _Transport(Transport):
+
+    def send(self, request):
+        self.sent = request.message
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.security = _WsseSecurity(
+            TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS, TEST_X509_CERT,
+            TEST_X509_CERT, "sha1", Client.BOTH)
+
+    def test_signing_transport(self):
+        transport = _Transport()
+        _SigningTransport(transport, self.security).send(
+            Request("http://localhost/", _create_envelope(10)))
+
+        document = etree.fromstring(transport.sent)
+        utils.verify_document(document, TEST_X509_CERT)
+        self.assertEqual(len(document.findall(".//{urn:test}Item")), 10)
+
+    def test_sign_large_envelope(self):
+        envelope = _create_envelope(20000)
+        message = self.security.sign(
+            Parser().parse(string=envelope).root().plain().encode("utf-8"))
+
+        document = etree.fromstring(message)
+        utils.verify_document(document, TEST_X509_CERT)
+        items = document.findall(".//{urn:test}Item")
+        self.assertEqual(len(items), 20000)
+        self.assertEqual(items[-1].text, "19999")
+
+
+if __name__ == '__main__':
+    unittest.main()
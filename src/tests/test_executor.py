@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_executor.py
+"""
+
+from StringIO import StringIO
+import threading
+import time
+import unittest
+
+from lxml import etree
+from spyne.application import Application
+from spyne.decorator import rpc
+from spyne.model.fault import Fault
+from spyne.model.primitive import Unicode
+from spyne.protocol.soap import Soap11
+from spyne.server.wsgi import WsgiApplication
+from spyne.service import ServiceBase
+
+from spyne_smev import crypto
+from spyne_smev.executor import CryptoExecutor, ExecutorBusy
+from spyne_smev.wsse.protocols import Soap11WSSE, X509TokenProfile
+
+from tests.test_wsse import (
+    TEST_ENVELOPE, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS, TEST_X509_CERT)
+
+
+class TestCase(unittest.TestCase):
+
+    def test_run(self):
+        executor = CryptoExecutor(workers=1)
+        self.assertEqual(executor.run(sum, (1, 2)), 3)
+        self.assertRaises(ZeroDivisionError, executor.run, divmod, 1, 0)
+        executor.shutdown()
+        self.assertEqual(executor.completed, 2)
+
+    def test_queue_limit(self):
+        executor = CryptoExecutor(workers=1, max_queue=1)
+        event = threading.Event()
+        executor.submit(event.wait)
+        # wait for the worker to take the first task
+        while executor.queue_depth:
+            time.sleep(0.001)
+        executor.submit(event.wait)
+        self.assertRaises(ExecutorBusy, executor.submit, event.wait)
+        self.assertEqual(executor.rejected, 1)
+        event.set()
+        executor.shutdown()
+
+    def test_concurrent_clients(self):
+        executor = CryptoExecutor(workers=4, max_queue=8)
+        pkey = crypto.load_private_key(TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+        results = {}
+
+        def client(number):
+            data = str(number) * 64
+            results[number] = [
+                executor.run(crypto.sign, data, pkey) for _ in xrange(10)]
+
+        threads = [
+            threading.Thread(target=client, args=(number,))
+            for number in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        executor.shutdown()
+
+        self.assertEqual(sorted(results), range(8))
+        for number, signatures in results.iteritems():
+            for signature in signatures:
+                crypto.verify(str(number) * 64, TEST_X509_CERT, signature)
+        self.assertEqual(executor.completed, 80)
+        self.assertEqual(executor.rejected, 0)
+        self.assertLessEqual(executor.max_queue_depth, 8)
+
+
+class ProfileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = CryptoExecutor(workers=1, max_queue=1)
+        self.event = threading.Event()
+        # единственный поток занят, очередь заполнена
+        self.executor.submit(self.event.wait)
+        while self.executor.queue_depth:
+            time.sleep(0.001)
+        self.executor.submit(self.event.wait)
+        self.profile = X509TokenProfile(
+            private_key=TEST_PRIVATE_KEY,
+            private_key_pass=TEST_PRIVATE_KEY_PASS,
+            certificate=TEST_X509_CERT, executor=self.executor)
+
+    def tearDown(self):
+        self.event.set()
+        self.executor.shutdown()
+
+    def test_busy(self):
+        with self.assertRaises(Fault) as context:
+            self.profile.validate(etree.fromstring(TEST_ENVELOPE))
+        self.assertEqual(context.exception.faultcode, "Server.Busy")
+
+        # ответ подписывается в текущем потоке
+        envelope = self.profile.apply(etree.fromstring(TEST_ENVELOPE))
+        self.assertIsNotNone(envelope.find(".//{*}SignatureValue"))
+        self.assertEqual(self.executor.rejected, 2)
+
+    def test_busy_response(self):
+        class Service(ServiceBase):
+
+            @rpc(Unicode, _returns=Unicode)
+            def Echo(ctx, Data):
+                return Data
+
+        server = WsgiApplication(Application(
+            [Service], "urn:test", in_protocol=Soap11(),
+            out_protocol=Soap11WSSE(wsse_security=self.profile)))
+        body = (
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:tns="urn:test"><soapenv:Body><tns:Echo><tns:Data>hello'
+            '</tns:Data></tns:Echo></soapenv:Body></soapenv:Envelope>')
+        req_env = {
+            "REQUEST_METHOD": "POST", "CONTENT_TYPE": "text/xml",
+            "CONTENT_LENGTH": str(len(body)), "wsgi.input": StringIO(body),
+            "SERVER_NAME": "localhost", "SERVER_PORT": "80",
+            "PATH_INFO": "/", "QUERY_STRING": "",
+            "wsgi.url_scheme": "http",
+        }
+        status = []
+        response = etree.fromstring(b"".join(server(
+            req_env, lambda value, headers: status.append(value))))
+
+        self.assertEqual(status, ["200 OK"])
+        self.assertEqual(
+            response.findtext(".//{urn:test}EchoResult"), "hello")
+        self.assertIsNotNone(response.find(".//{*}SignatureValue"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_fanout.py
+"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import threading
+import time
+import unittest
+
+from lxml import etree
+
+from spyne_smev.fanout import (
+    CallTimeout, FanOutClient, SmevFault, SmevRequest)
+from spyne_smev.smev256 import Smev256
+from spyne_smev.transport import ConnectionPool
+
+SMEV = "{http://smev.gosuslugi.ru/rev120315}"
+TNS = "{urn:test}"
+
+_fault = (
+    '<soapenv:Envelope '
+    'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    '<soapenv:Body><soapenv:Fault><faultcode>soapenv:Server</faultcode>'
+    '<faultstring>{0}</faultstring></soapenv:Fault></soapenv:Body>'
+    '</soapenv:Envelope>')
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        document = etree.fromstring(
+            self.rfile.read(int(self.headers["Content-Length"])))
+        method = document[1][0]
+        delay = method.findtext(".//{0}Delay".format(TNS))
+        if delay:
+            time.sleep(float(delay))
+        if method.tag == TNS + "Fail":
+            status, body = 500, _fault.format(self.headers["SOAPAction"])
+        else:
+            # запрос возвращается как есть, только со статусом RESULT
+            method.find("{0}Message/{0}Status".format(SMEV)).text = "RESULT"
+            status, body = 200, etree.tostring(document)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{0}/".format(self.server.server_port)
+        self.client = FanOutClient(
+            Smev256(
+                SenderCode="ABCD12345", SenderName="Sender",
+                RecipientCode="EFGH12345", RecipientName="Recipient",
+                Mnemonic="Test", Version="1.00"),
+            pool=ConnectionPool(), max_concurrency=4, timeout=5)
+
+    def tearDown(self):
+        self.client.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _request(self, number, delay=0, method="Query"):
+        app_data = [etree.Element(TNS + "Number")]
+        app_data[0].text = str(number)
+        if delay:
+            app_data.append(etree.Element(TNS + "Delay"))
+            app_data[1].text = str(delay)
+        return SmevRequest(self.url, TNS + method, app_data)
+
+    def test_gather(self):
+        started = time.time()
+        responses = self.client.gather(
+            [self._request(number, 0.1) for number in xrange(12)])
+        elapsed = time.time() - started
+
+        self.assertEqual(
+            [response.app_data.findtext(TNS + "Number")
+             for response in responses],
+            [str(number) for number in xrange(12)])
+        message = responses[0].message
+        self.assertEqual(message.findtext(SMEV + "Status"), "RESULT")
+        self.assertEqual(
+            message.findtext("{0}Sender/{0}Code".format(SMEV)), "ABCD12345")
+        # 12 запросов по 0.1 с, не больше 4 одновременно
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(self.client.metrics["max_in_flight"], 4)
+        self.assertEqual(self.client.pool.metrics["created"], 4)
+
+    def test_errors(self):
+        results = self.client.gather(
+            [self._request(1), self._request(2, method="Fail"),
+             self._request(3, 2)],
+            timeout=0.5, return_exceptions=True)
+
+        self.assertEqual(results[0].app_data.findtext(TNS + "Number"), "1")
+        self.assertIsInstance(results[1], SmevFault)
+        self.assertEqual(results[1].faultstring, '"Fail"')
+        self.assertIsInstance(results[2], CallTimeout)
+        with self.assertRaises(SmevFault):
+            self.client.gather([self._request(1, method="Fail")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_limits.py
+"""
+
+from StringIO import StringIO
+import unittest
+
+from spyne.application import Application
+from spyne.decorator import rpc
+from spyne.model.primitive import Integer, Unicode
+from spyne.protocol.soap import Soap11
+from spyne.service import ServiceBase
+
+from spyne_smev.server.limits import AdmissionController, RequestLimits
+from spyne_smev.server.wsgi import WsgiApplication
+
+
+class _Service(ServiceBase):
+
+    @rpc(Unicode, _returns=Integer)
+    def Small(ctx, Data):
+        return len(Data)
+
+    @rpc(Unicode, _returns=Integer)
+    def Large(ctx, Data):
+        return len(Data)
+
+
+def _envelope(method, size):
+    return (
+        '<soapenv:Envelope '
+        'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:tns="urn:test"><soapenv:Body><tns:{0}><tns:Data>{1}'
+        '</tns:Data></tns:{0}></soapenv:Body></soapenv:Envelope>'.format(
+            method, "a" * size))
+
+
+class TestCase(unittest.TestCase):
+
+    def test_request_limits(self):
+        limits = RequestLimits(
+            1000, services={"Registry": 5000}, methods={"Upload": 9000})
+
+        self.assertEqual(limits.get(), 1000)
+        self.assertEqual(limits.get("Registry", "Query"), 5000)
+        self.assertEqual(limits.get("Registry", "Upload"), 9000)
+        self.assertEqual(limits.hard_limit, 9000)
+
+    def test_admission(self):
+        admission = AdmissionController(1000)
+
+        self.assertTrue(admission.acquire(600))
+        self.assertFalse(admission.acquire(600))
+        self.assertTrue(admission.acquire(400))
+        admission.release(600)
+        self.assertTrue(admission.acquire(600))
+        admission.release(600)
+        admission.release(400)
+
+        metrics = admission.metrics
+        self.assertEqual(metrics["bytes_in_flight"], 0)
+        self.assertEqual(metrics["requests_in_flight"], 0)
+        self.assertEqual(metrics["max_seen_in_flight"], 1000)
+        self.assertEqual(metrics["admitted"], 3)
+        self.assertEqual(metrics["rejected"], 1)
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app = Application(
+            [_Service], "urn:test", in_protocol=Soap11(),
+            out_protocol=Soap11())
+        self.server = WsgiApplication(app, limits=RequestLimits(
+            10000, methods={"Small": 1000}))
+
+    def _call(self, action, body, content_length=True):
+        req_env = {
+            "REQUEST_METHOD": "POST", "CONTENT_TYPE": "text/xml",
+            "HTTP_SOAPACTION": action, "wsgi.input": StringIO(body),
+            "SERVER_NAME": "localhost", "SERVER_PORT": "80",
+            "PATH_INFO": "/", "QUERY_STRING": "",
+            "wsgi.url_scheme": "http",
+        }
+        if content_length:
+            req_env["CONTENT_LENGTH"] = str(len(body))
+        status = []
+        b"".join(self.server(
+            req_env, lambda value, headers: status.append(value)))
+        return status[0].split()[0]
+
+    def test_method_limit(self):
+        self.assertEqual(self._call("Small", _envelope("Small", 100)), "200")
+        self.assertEqual(self._call("Small", _envelope("Small", 2000)), "413")
+        self.assertEqual(self._call("Large", _envelope("Large", 2000)), "200")
+
+    def test_soap_action_mismatch(self):
+        # лимит проверяется по вызванному методу, а не по SOAPAction
+        self.assertEqual(self._call("Large", _envelope("Small", 2000)), "413")
+
+    def test_no_content_length(self):
+        self.assertEqual(
+            self._call("Small", _envelope("Small", 100), False), "411")
+        self.assertEqual(
+            self._call("Large", _envelope("Large", 2000), False), "200")
+        self.assertEqual(
+            self._call("Large", _envelope("Small", 2000), False), "413")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_mtom.py
+"""
+
+import base64
+import cgi
+import hashlib
+import os
+import unittest
+
+from spyne_smev.mtom import Attachment, Mtom
+
+TEST_ENVELOPE = (
+    '<soapenv:Envelope '
+    'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    '<soapenv:Body/></soapenv:Envelope>')
+
+
+def _split(data, size):
+    return [data[i:i + size] for i in xrange(0, len(data), size)]
+
+
+class TestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        payload = os.urandom(200 * 1024)
+        mtom = Mtom(spool_size=1024)
+        attachment = Attachment(content_type="application/pdf")
+        attachment.write(payload)
+
+        content_type, chunks = mtom.encode(
+            _split(TEST_ENVELOPE, 10), [attachment])
+        message = b"".join(chunks)
+        # чанки не кратны границам частей
+        root, attachments = mtom.decode(
+            cgi.parse_header(content_type), _split(message, 777))
+
+        self.assertEqual(b"".join(root), TEST_ENVELOPE)
+        received = attachments[attachment.content_id]
+        self.assertEqual(received.content_type, "application/pdf")
+        self.assertEqual(received.size, len(payload))
+        self.assertEqual(b"".join(received.chunks()), payload)
+        self.assertEqual(
+            received.digest("sha1"), hashlib.sha1(payload).digest())
+
+    def test_base64_part(self):
+        payload = os.urandom(10000)
+        message = (
+            "--b\r\nContent-Type: text/xml\r\n\r\n{0}\r\n"
+            "--b\r\nContent-ID: <a%40b>\r\n"
+            "Content-Transfer-Encoding: base64\r\n\r\n{1}\r\n"
+            "--b--\r\n".format(TEST_ENVELOPE, base64.encodestring(payload)))
+        root, attachments = Mtom().decode(
+            ("multipart/related", {"boundary": "b"}), _split(message, 100))
+
+        self.assertEqual(b"".join(root), TEST_ENVELOPE)
+        self.assertEqual(b"".join(attachments["a@b"].chunks()), payload)
+
+    def test_malformed_base64_part(self):
+        message = (
+            "--b\r\nContent-Type: text/xml\r\n\r\n{0}\r\n"
+            "--b\r\nContent-ID: <a%40b>\r\n"
+            "Content-Transfer-Encoding: base64\r\n\r\nYWJj\r\nZ\r\n"
+            "--b--\r\n".format(TEST_ENVELOPE))
+        self.assertRaises(
+            ValueError, Mtom().decode,
+            ("multipart/related", {"boundary": "b"}), [message])
+        self.assertRaises(ValueError, Attachment.from_value, "YWJjZ")
+        self.assertRaises(ValueError, Attachment.from_base64, ["YWJjZ"])
+
+    def test_truncated(self):
+        self.assertRaises(
+            ValueError, Mtom().decode,
+            ("multipart/related", {"boundary": "b"}),
+            ["--b\r\n\r\n", TEST_ENVELOPE])
+
+
+if __name__ == '__main__':
+    unittest.main()
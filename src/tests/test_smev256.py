@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_smev256.py
+"""
+
+import unittest
+
+from lxml import etree
+from spyne.model.fault import Fault
+
+from spyne_smev._utils import EmptyCtx, transplant
+from spyne_smev.smev256 import Smev256
+from spyne_smev.smev256.model import MessageType, HeaderType, ServiceType
+
+SMEV_PARAMS = dict(
+    SenderCode="SNDR01001", SenderName="Sender", Mnemonic="TEST",
+    Version="1.00", ServiceCode="SRV", OKTMO="12345678")
+
+
+def _create_ctx():
+    ctx = EmptyCtx()
+    ctx.udc = EmptyCtx()
+    ctx.out_error = None
+    ctx.udc.in_smev_message = MessageType(
+        Sender=MessageType.Sender(Code="RCPT01001", Name="Recipient"),
+        ExchangeType=2, CaseNumber="42")
+    ctx.udc.in_smev_header = HeaderType(MessageId="message-id")
+    ctx.udc.out_smev_message = MessageType(
+        Sender=MessageType.Sender(),
+        Recipient=MessageType.Recipient(),
+        Service=ServiceType())
+    return ctx
+
+
+class MessageElementTestCase(unittest.TestCase):
+
+    def test_message_element(self):
+        protocol = Smev256(**SMEV_PARAMS)
+        ctx = _create_ctx()
+        ctx.udc.out_smev_message.Status = "ACCEPT"
+        message = protocol._create_message_element(ctx)
+        fields = [
+            (el.tag.split("}")[1], el.text) for el in message.iter()
+            if not len(el) and el.tag.split("}")[1] != "Date"]
+
+        self.assertEqual(fields, [
+            ("Code", "SNDR01001"), ("Name", "Sender"),
+            ("Code", "RCPT01001"), ("Name", "Recipient"),
+            ("Mnemonic", "TEST"), ("Version", "1.00"),
+            ("TypeCode", "GSRV"), ("Status", "ACCEPT"),
+            ("ExchangeType", "2"), ("RequestIdRef", "message-id"),
+            ("OriginRequestIdRef", "message-id"), ("ServiceCode", "SRV"),
+            ("CaseNumber", "42"), ("OKTMO", "12345678"),
+        ])
+        # болванка не изменяется
+        self.assertEqual(
+            protocol._create_message_element(_create_ctx()).findtext(
+                "{%s}Status" % protocol._ns["smev"]), "RESULT")
+
+
+class AppDataTestCase(unittest.TestCase):
+
+    children = 50000
+
+    def _create_response(self):
+        body = etree.Element(
+            "{http://schemas.xmlsoap.org/soap/envelope/}Body")
+        response = etree.SubElement(
+            body, "{urn:test}Response", nsmap={"tns": "urn:test"}, attr="1")
+        for number in xrange(self.children):
+            etree.SubElement(response, "{urn:test}Item").tail = str(number)
+        return body, response
+
+    def test_construct_envelope(self):
+        protocol = Smev256(**SMEV_PARAMS)
+        ctx = _create_ctx()
+        ctx.udc.out_smev_appdoc = EmptyCtx()
+        ctx.out_body_doc, response = self._create_response()
+        first, last = response[0], response[-1]
+
+        protocol.construct_smev_envelope(ctx, None)
+
+        new_response = ctx.out_body_doc[0]
+        self.assertEqual(new_response.tag, "{urn:test}Response")
+        self.assertEqual(new_response.get("attr"), "1")
+        app_data = new_response[1][0]
+        self.assertIs(app_data, response)
+        self.assertEqual(
+            app_data.tag, "{%s}AppData" % protocol._ns["smev"])
+        self.assertEqual(len(app_data), self.children)
+        self.assertIs(app_data[0], first)
+        self.assertIs(app_data[-1], last)
+        self.assertEqual(last.tail, str(self.children - 1))
+
+    def test_transplant_descendant(self):
+        body, response = self._create_response()
+        app_data = etree.SubElement(
+            etree.SubElement(response, "{urn:test}MessageData"),
+            "{urn:test}AppData")
+        app_data.extend(response[:self.children])
+        response.tail = "tail"
+
+        transplant(app_data, response, response.tag)
+
+        self.assertIs(body[0], app_data)
+        self.assertEqual(app_data.tag, "{urn:test}Response")
+        self.assertEqual(app_data.tail, "tail")
+        self.assertEqual(len(app_data), self.children)
+        self.assertEqual(app_data[-1].tail, str(self.children - 1))
+
+
+def _create_envelope(method_content):
+    return etree.fromstring(
+        '<soapenv:Envelope '
+        'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+        'xmlns:smev="http://smev.gosuslugi.ru/rev120315">'
+        '<soapenv:Header><smev:Header><smev:MessageId>1</smev:MessageId>'
+        '</smev:Header></soapenv:Header><soapenv:Body>'
+        '<tns:Method xmlns:tns="urn:test">{0}</tns:Method>'
+        '</soapenv:Body></soapenv:Envelope>'.format(method_content))
+
+
+_message = '<smev:Message><smev:Status>REQUEST</smev:Status></smev:Message>'
+_message_data = (
+    '<smev:MessageData><smev:AppData><tns:Value>1</tns:Value></smev:AppData>'
+    '<smev:AppDocument><smev:RequestCode>1</smev:RequestCode>'
+    '</smev:AppDocument></smev:MessageData>')
+
+
+class _Spilled(object):
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def chunks(self):
+        return iter(self._chunks)
+
+
+class SmevPartsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.protocol = Smev256(**SMEV_PARAMS)
+        self.smev = "{%s}" % self.protocol._ns["smev"]
+
+    def _assert_parts(self, document, parts):
+        find = lambda name: document.find(".//" + self.smev + name)
+        self.assertIs(parts.header, find("Header"))
+        self.assertIs(parts.message, find("Message"))
+        self.assertIs(parts.message_data, find("MessageData"))
+        self.assertIs(parts.app_data, find("AppData"))
+        self.assertIs(parts.app_document, find("AppDocument"))
+        self.assertIs(parts.method, document[1][0])
+
+    def test_anchored(self):
+        document = _create_envelope(_message + _message_data)
+        # элементы на своих местах находятся без поиска по документу
+        self.protocol._smev_descendants = None
+        self._assert_parts(
+            document, self.protocol._locate_smev_parts(document))
+
+    def test_fallback(self):
+        document = _create_envelope(
+            "<tns:Wrapper>{0}{1}</tns:Wrapper>".format(
+                _message, _message_data))
+        parts = self.protocol._locate_smev_parts(document)
+        self._assert_parts(document, parts)
+        self.assertEqual(parts.method.tag, "{urn:test}Method")
+
+    def test_missing(self):
+        document = _create_envelope(_message_data)
+        parts = self.protocol._locate_smev_parts(document)
+        self.assertIsNone(parts.message)
+        self.assertIs(
+            parts.message_data,
+            document.find(".//{0}MessageData".format(self.smev)))
+
+    def test_in_document(self):
+        ctx = EmptyCtx()
+        ctx.udc = None
+        ctx.in_string = [etree.tostring(
+            _create_envelope(_message + _message_data))]
+        self.protocol._validate_smev_parts = lambda parts: None
+
+        self.protocol.create_in_document(ctx)
+
+        parts = ctx.udc.in_smev_parts
+        in_document, _ = ctx.in_document
+        self.assertIs(ctx.udc.in_smev_message_document, parts.message)
+        self.assertIs(ctx.udc.in_smev_header_document, parts.header)
+        self.assertIs(ctx.udc.in_smev_appdoc_document, parts.app_document)
+        # AppData встает на место элемента метода
+        method = in_document[1][0]
+        self.assertIs(method, parts.app_data)
+        self.assertEqual(method.tag, "{urn:test}Method")
+        self.assertEqual(method.findtext("{urn:test}Value"), "1")
+
+    def test_malformed_spilled_binary_data(self):
+        document = _create_envelope(_message + _message_data)
+        parts = self.protocol._locate_smev_parts(document)
+        binary_data = etree.SubElement(
+            parts.app_document, self.smev + "BinaryData")
+        binary_data.text = "marker"
+        ctx = EmptyCtx()
+        ctx.udc = EmptyCtx()
+        ctx.udc.in_binary_streams = {"marker": _Spilled(["AAA*", "AA"])}
+
+        with self.assertRaises(Fault) as context:
+            self.protocol._resolve_attachment(ctx, parts)
+        self.assertEqual(context.exception.faultcode, "SMEV-102000")
+
+
+class MessageTemplateTestCase(unittest.TestCase):
+
+    @staticmethod
+    def _fields(message):
+        return [
+            (el.tag, el.text) for el in message.iter()
+            if el.tag.split("}")[1] != "Date"]
+
+    def test_template_clone(self):
+        protocol = Smev256(**SMEV_PARAMS)
+        first = protocol._create_message_element(_create_ctx())
+        template = protocol._message_template
+        second = protocol._create_message_element(_create_ctx())
+        protocol._message_template = None
+        scratch = protocol._create_message_element(_create_ctx())
+
+        self.assertIsNotNone(template)
+        self.assertIsNot(first, second)
+        self.assertEqual(self._fields(first), self._fields(scratch))
+        self.assertEqual(self._fields(second), self._fields(scratch))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_streaming.py
+"""
+
+import base64
+import os
+import unittest
+
+from lxml import etree
+
+from spyne_smev import streaming
+from spyne_smev.mtom import Attachment
+
+
+class _Sink(list):
+
+    def write(self, data):
+        self.append(data)
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = os.urandom(100 * 1024 + 1)
+        attachment = Attachment()
+        attachment.write(self.payload)
+        self.marker = streaming.new_marker()
+        self.streams = {self.marker: attachment}
+        self.document = etree.fromstring(
+            '<e:Envelope xmlns:e="urn:e"><e:Body><d:Doc xmlns:d="urn:d">'
+            '<d:Name>doc</d:Name>tail<d:Data>{0}</d:Data></d:Doc>'
+            '</e:Body></e:Envelope>'.format(self.marker))
+
+    def _expected(self):
+        document = etree.fromstring(etree.tostring(self.document))
+        document.find(".//{urn:d}Data").text = base64.b64encode(self.payload)
+        return document
+
+    def test_iter_document(self):
+        chunks = list(streaming.iter_document(
+            self.document, self.streams, block_size=3 * 1024))
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(
+            etree.tostring(etree.fromstring(b"".join(chunks)), method="c14n"),
+            etree.tostring(self._expected(), method="c14n"))
+
+    def test_splicing_writer(self):
+        canonical = etree.tostring(self.document, method="c14n")
+        sink = _Sink()
+        writer = streaming.SplicingWriter(sink, self.streams)
+        # маркер разрезан между записями
+        for index in xrange(0, len(canonical), 7):
+            writer.write(canonical[index:index + 7])
+        writer.flush()
+
+        self.assertEqual(
+            b"".join(sink),
+            etree.tostring(self._expected(), method="c14n"))
+
+    def test_iter_signed_document(self):
+        envelope = etree.fromstring(
+            '<e:Envelope xmlns:e="http://schemas.xmlsoap.org/soap/envelope/">'
+            '<e:Header><h:Security xmlns:h="urn:h"/></e:Header>'
+            '<e:Body/></e:Envelope>')
+        envelope[1].append(self.document[0][0])
+        body = streaming.BodySpool(spool_size=1024)
+        writer = streaming.SplicingWriter(body, self.streams)
+        writer.write(etree.tostring(envelope[1], method="c14n"))
+        writer.flush()
+
+        chunks = list(streaming.iter_signed_document(
+            envelope, body, self.streams))
+
+        document = etree.fromstring(b"".join(chunks))
+        self.assertEqual(document[0][0].tag, "{urn:h}Security")
+        self.assertEqual(
+            base64.b64decode(document.findtext(".//{urn:d}Data")),
+            self.payload)
+        self.assertTrue(body.file.closed)
+
+    def test_parse_document(self):
+        data = base64.encodestring(self.payload)
+        source = etree.tostring(self._expected()).replace(
+            base64.b64encode(self.payload), data)
+        chunks = [source[i:i + 1000] for i in xrange(0, len(source), 1000)]
+
+        root, streams = streaming.parse_document(
+            chunks, ("{urn:d}Data",), spill_size=1024)
+
+        self.assertEqual(len(streams), 1)
+        marker, spilled = streams.items()[0]
+        self.assertEqual(root.findtext(".//{urn:d}Data"), marker)
+        self.assertEqual(b"".join(spilled.chunks()), data)
+        # каноническая форма совпадает с исходной
+        sink = _Sink()
+        writer = streaming.SplicingWriter(sink, streams)
+        writer.write(etree.tostring(root, method="c14n"))
+        writer.flush()
+        self.assertEqual(
+            b"".join(sink),
+            etree.tostring(etree.fromstring(source), method="c14n"))
+
+    def test_parse_document_spills_while_parsing(self):
+        text = b"QUJD" * 256 * 1024
+        consumed = []
+        written = []
+
+        def chunks():
+            yield b'<d:Doc xmlns:d="urn:d"><d:Data>'
+            for index in xrange(0, len(text), 8192):
+                consumed.append(index)
+                yield text[index:index + 8192]
+            yield b"</d:Data></d:Doc>"
+
+        write = streaming.SpilledText.write
+
+        def record(spilled, data):
+            written.append((len(consumed), len(data)))
+            write(spilled, data)
+
+        streaming.SpilledText.write = record
+        self.addCleanup(setattr, streaming.SpilledText, "write", write)
+        root, streams = streaming.parse_document(
+            chunks(), ("{urn:d}Data",), spill_size=64 * 1024)
+
+        self.assertEqual(b"".join(streams.values()[0].chunks()), text)
+        # текст пишется частями по мере чтения документа
+        self.assertLess(max(size for _, size in written), 64 * 1024)
+        self.assertLess(written[0][0], len(consumed) / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_transport.py
+"""
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import shutil
+import socket
+from SocketServer import ThreadingMixIn
+import tempfile
+import threading
+import time
+import unittest
+
+from suds.transport import Request, TransportError
+
+from spyne_smev.transport import (
+    ConnectionPool, PooledTransport, VersionedObjectCache)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    posts = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(404 if self.path == "/missing" else 200, self.path)
+        if self.path == "/drop":
+            # соединение закрывается без заголовка Connection: close
+            self.close_connection = 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.posts.append(body)
+        if body == "stall":
+            time.sleep(1)
+        self._reply(500 if body == "fault" else 200, body[::-1])
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class TransportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(("127.0.0.1", 0), _Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{0}".format(self.server.server_port)
+        _Handler.posts = []
+        self.pool = ConnectionPool()
+        self.transport = PooledTransport(self.pool, timeout=5)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        for number in xrange(3):
+            self.assertEqual(
+                self.transport.open(
+                    Request(self.url + "/wsdl?n={0}".format(number))).read(),
+                "/wsdl?n={0}".format(number))
+        self.assertEqual(
+            self.transport.send(Request(self.url, "request")).message,
+            "tseuqer")
+
+        self.assertEqual(self.pool.metrics["created"], 1)
+        self.assertEqual(self.pool.metrics["reused"], 3)
+
+    def test_stale_connection(self):
+        self.transport.open(Request(self.url + "/drop"))
+        self.assertEqual(
+            self.transport.send(Request(self.url, "request")).message,
+            "tseuqer")
+
+        self.assertEqual(self.pool.metrics["created"], 2)
+        self.assertEqual(_Handler.posts, ["request"])
+
+    def test_timeout_is_not_retried(self):
+        transport = PooledTransport(self.pool, timeout=0.3)
+        transport.open(Request(self.url + "/wsdl"))
+        with self.assertRaises(socket.timeout):
+            transport.send(Request(self.url, "stall"))
+
+        self.assertEqual(self.pool.metrics["reused"], 1)
+        self.assertEqual(_Handler.posts, ["stall"])
+
+    def test_errors(self):
+        with self.assertRaises(TransportError) as error:
+            self.transport.send(Request(self.url, "fault"))
+        self.assertEqual(error.exception.httpcode, 500)
+        self.assertEqual(error.exception.fp.read(), "tluaf")
+        with self.assertRaises(TransportError):
+            self.transport.open(Request(self.url + "/missing"))
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def test_version(self):
+        VersionedObjectCache(self.location, "1").put("wsdl", {"a": 1})
+
+        self.assertEqual(
+            VersionedObjectCache(self.location, "1").get("wsdl"), {"a": 1})
+        self.assertIsNone(VersionedObjectCache(self.location, "2").get("wsdl"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_truststore.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from spyne_smev.wsse.truststore import TrustStore
+from spyne_smev.wsse.utils import _get_clean_cert_data
+
+from tests.test_wsse import TEST_X509_CERT
+
+TEST_TOKEN = _get_clean_cert_data(TEST_X509_CERT)
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "test.pem")
+        with open(self.path, "w") as fd:
+            fd.write(TEST_X509_CERT)
+
+    def test_bundle(self):
+        store = TrustStore.from_bundle(
+            "garbage\n{0}\n{0}".format(TEST_X509_CERT))
+        self.assertEqual(len(store), 1)
+        self.assertIn(TEST_TOKEN, store)
+        self.assertIsNotNone(store.find(TEST_TOKEN))
+        self.assertNotIn(TEST_TOKEN[:-8] + "AAAAAAA=", store)
+
+    def test_crlf(self):
+        crlf = TEST_X509_CERT.replace("\n", "\r\n")
+        self.assertIn(TEST_TOKEN, TrustStore.from_bundle(crlf))
+
+        with open(self.path, "wb") as fd:
+            fd.write(crlf)
+        self.assertIn(TEST_TOKEN, TrustStore.from_directory(self.directory))
+
+    def test_directory_changes(self):
+        store = TrustStore.from_directory(self.directory, reload_interval=0)
+        self.assertIn(TEST_TOKEN, store)
+        os.remove(self.path)
+        self.assertNotIn(TEST_TOKEN, store)
+
+    def test_unreadable_file(self):
+        store = TrustStore.from_directory(self.directory, reload_interval=0)
+        # файл с расширением сертификата, который нельзя прочитать
+        os.mkdir(os.path.join(self.directory, "broken.pem"))
+        self.assertFalse(store.reload())
+        self.assertIn(TEST_TOKEN, store)
+
+    def test_missing_path(self):
+        store = TrustStore(
+            self.path, certificates=[TEST_X509_CERT], reload_interval=None)
+        os.remove(self.path)
+        self.assertFalse(store.reload())
+        self.assertIn(TEST_TOKEN, store)
+
+        store = TrustStore(self.path)
+        self.assertEqual(len(store), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
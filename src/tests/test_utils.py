@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_utils.py
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from lxml import etree
+
+from spyne_smev._utils import _SchemaRegistry
+
+_schema = """\
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"
+    targetNamespace="urn:test" elementFormDefault="qualified">
+<xs:element name="Item" type="xs:{0}"/>
+</xs:schema>
+"""
+
+
+class SchemaRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "test.xsd")
+        self._write("integer", 1000)
+        self.registry = _SchemaRegistry()
+
+    def _write(self, item_type, mtime):
+        with open(self.path, "w") as fd:
+            fd.write(_schema.format(item_type))
+        os.utime(self.path, (mtime, mtime))
+
+    @staticmethod
+    def _item(text):
+        element = etree.Element("{urn:test}Item")
+        element.text = text
+        return element
+
+    def test_validate(self):
+        self.assertEqual(
+            self.registry.validate(self.path, self._item("1")), [])
+        errors = self.registry.validate(self.path, self._item("x"))
+        self.assertEqual(len(errors), 1)
+        self.assertRaises(
+            ValueError, self.registry.validate,
+            os.path.join(self.directory, "missing.xsd"), self._item("1"))
+
+    def test_preload_shared_by_threads(self):
+        self.registry.preload(self.path)
+        (key, schemas), = self.registry._schemas.items()
+        preloaded = schemas[0]
+        used = []
+
+        def validate():
+            used.append(self.registry._acquire(key))
+            self.registry._release(key, used[-1])
+
+        thread = threading.Thread(target=validate)
+        thread.start()
+        thread.join()
+        self.assertIs(used[0], preloaded)
+
+    def test_concurrent_validation(self):
+        results = {}
+
+        def validate(number):
+            text = str(number) if number % 2 else "x{0}".format(number)
+            results[number] = [
+                self.registry.validate(self.path, self._item(text))
+                for _ in xrange(50)]
+
+        threads = [
+            threading.Thread(target=validate, args=(number,))
+            for number in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for number, errors in results.iteritems():
+            for error in errors:
+                # у каждого потока свой журнал ошибок
+                if number % 2:
+                    self.assertEqual(error, [])
+                else:
+                    self.assertIn("'x{0}'".format(number), error[0])
+        self.assertLessEqual(len(self.registry._schemas.values()[0]), 8)
+
+    def test_changed_file(self):
+        self.registry.preload(self.path)
+        self.assertEqual(
+            len(self.registry.validate(self.path, self._item("x"))), 1)
+
+        self._write("string", 2000)
+        self.assertEqual(
+            self.registry.validate(self.path, self._item("x")), [])
+        # прежняя версия схемы удалена
+        self.assertEqual(self.registry._documents.keys(), [(self.path, 2000)])
+        self.assertEqual(self.registry._schemas.keys(), [(self.path, 2000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_validation.py
+"""
+
+import threading
+import unittest
+
+from lxml import etree
+from spyne.model.fault import Fault
+
+from spyne_smev import validation
+from spyne_smev.smev256 import Smev256
+
+from tests.test_smev256 import SMEV_PARAMS, _create_envelope
+
+_message_data = (
+    '<smev:MessageData><smev:AppData><tns:Value>1</tns:Value></smev:AppData>'
+    '</smev:MessageData>')
+
+
+class TestCase(unittest.TestCase):
+
+    def test_should_validate(self):
+        self.assertTrue(
+            validation.ValidationPolicy().should_validate("ANY"))
+        self.assertFalse(validation.ValidationPolicy(
+            validation.HEADERS).should_validate("ANY"))
+        policy = validation.ValidationPolicy(
+            validation.SAMPLED, sample_rate=0, flagged_senders=["FLAG"])
+        self.assertTrue(policy.should_validate("FLAG"))
+        self.assertFalse(policy.should_validate("ANY"))
+        self.assertRaises(ValueError, validation.ValidationPolicy, "none")
+
+    def test_defer(self):
+        done = threading.Event()
+        results = []
+
+        def hook(message_data, errors):
+            results.append((message_data.tag, errors))
+            done.set()
+
+        policy = validation.ValidationPolicy(validation.ASYNC, hook=hook)
+        self.assertTrue(policy.defer(
+            lambda element: ["error"], "<MessageData/>"))
+        done.wait(5)
+        self.assertEqual(results, [("MessageData", ["error"])])
+        self.assertEqual(policy.counters["failed"], 1)
+
+
+class SmevValidationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.validated = []
+        self.errors = []
+
+    def _validate(self, policy, sender_code="SNDR01001"):
+        protocol = Smev256(smev_validation=policy, **SMEV_PARAMS)
+
+        def get_smev_errors(element):
+            self.validated.append(etree.QName(element).localname)
+            if element.tag == protocol._smev_tags["MessageData"]:
+                return self.errors
+            return []
+
+        protocol._get_smev_errors = get_smev_errors
+        document = _create_envelope(
+            '<smev:Message><smev:Sender><smev:Code>{0}</smev:Code>'
+            '</smev:Sender></smev:Message>{1}'.format(
+                sender_code, _message_data))
+        parts = protocol._locate_smev_parts(document)
+        protocol._validate_smev_parts(parts)
+        return parts
+
+    def test_full(self):
+        policy = validation.ValidationPolicy()
+        self._validate(policy)
+        self.assertEqual(
+            self.validated, ["Message", "Header", "MessageData"])
+
+        self.errors = ["error"]
+        self.assertRaises(Fault, self._validate, policy)
+        self.assertEqual(
+            policy.counters, {"validated": 1, "skipped": 0, "failed": 1})
+
+    def test_headers(self):
+        policy = validation.ValidationPolicy(validation.HEADERS)
+        self.errors = ["error"]
+        self._validate(policy)
+        self.assertEqual(self.validated, ["Message", "Header"])
+        self.assertEqual(
+            policy.counters, {"validated": 0, "skipped": 1, "failed": 0})
+
+    def test_sampled(self):
+        policy = validation.ValidationPolicy(
+            validation.SAMPLED, sample_rate=0, flagged_senders=["FLAG"])
+        self._validate(policy)
+        self._validate(policy, "FLAG")
+        self.assertEqual(self.validated.count("MessageData"), 1)
+        self.assertEqual(
+            policy.counters, {"validated": 1, "skipped": 1, "failed": 0})
+
+    def test_async(self):
+        done = threading.Event()
+        results = []
+
+        def hook(message_data, errors):
+            results.append((etree.tostring(message_data), errors))
+            done.set()
+
+        policy = validation.ValidationPolicy(validation.ASYNC, hook=hook)
+        self.errors = ["error"]
+        parts = self._validate(policy)
+        expected = etree.tostring(parts.message_data)
+        # обработка сообщения не влияет на отложенную проверку
+        del parts.message_data[:]
+        self.assertTrue(done.wait(5))
+
+        self.assertEqual(results, [(expected, ["error"])])
+        self.assertEqual(
+            policy.counters, {"validated": 0, "skipped": 0, "failed": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_wirelog.py
+"""
+
+import logging
+import random
+import unittest
+
+from spyne_smev.wirelog import WireLogger
+
+TEST_MESSAGE = (
+    '<soapenv:Envelope '
+    'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+    '<soapenv:Header><wsse:BinarySecurityToken wsu:Id="1">MIIC</wsse:'
+    'BinarySecurityToken></soapenv:Header><soapenv:Body><smev:BinaryData/>'
+    '<BinaryData>secret</BinaryData><Name>World</Name></soapenv:Body>'
+    '</soapenv:Envelope>')
+
+
+class _Handler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("tests.wire")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.handler = _Handler()
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def _log(self, wire_logger, chunks):
+        passed, message = wire_logger.capture(iter(chunks), header="Request")
+        self.assertEqual(list(passed), chunks)
+        wire_logger.log(message)
+        return self.handler.messages[-1]
+
+    def test_redacted(self):
+        text = self._log(
+            WireLogger(self.logger), [TEST_MESSAGE[:50], TEST_MESSAGE[50:]])
+
+        self.assertTrue(text.startswith("Request <soapenv:Envelope"))
+        self.assertIn("wsu:Id=\"1\">***</wsse:BinarySecurityToken>", text)
+        self.assertIn("<smev:BinaryData/><BinaryData>***</BinaryData>", text)
+        self.assertIn("<Name>World</Name>", text)
+        self.assertNotIn("MIIC", text)
+
+        text = self._log(
+            WireLogger(self.logger, redact=False), [TEST_MESSAGE])
+        self.assertEqual(text, "Request " + TEST_MESSAGE)
+
+    def test_truncated(self):
+        wire_logger = WireLogger(self.logger, max_length=60, redact=False)
+        chunks, message = wire_logger.capture(
+            iter([TEST_MESSAGE[:50], TEST_MESSAGE[50:100],
+                  TEST_MESSAGE[100:]]),
+            header="Request")
+
+        # все части передаются дальше, но запоминаются только первые
+        self.assertEqual("".join(chunks), TEST_MESSAGE)
+        self.assertEqual(len(message.chunks), 2)
+        wire_logger.log(message)
+        self.assertEqual(
+            self.handler.messages[-1],
+            "Request {0}... ({1} bytes truncated)".format(
+                TEST_MESSAGE[:60], len(TEST_MESSAGE) - 60))
+
+    def test_sampling(self):
+        self.assertTrue(WireLogger(self.logger).enabled())
+        self.assertFalse(WireLogger(self.logger, sample_rate=0).enabled())
+        # уровень ниже уровня логгера
+        self.assertFalse(WireLogger(self.logger, level=5).enabled())
+
+        state = random.getstate()
+        self.addCleanup(random.setstate, state)
+        random.seed(1)
+        wire_logger = WireLogger(self.logger, sample_rate=0.25)
+        enabled = sum(wire_logger.enabled() for _ in xrange(1000))
+        self.assertTrue(200 < enabled < 300, enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
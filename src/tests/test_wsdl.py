@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+test_wsdl.py
+"""
+
+import gzip
+import io
+import threading
+import unittest
+import zlib
+
+from spyne_smev import server
+from spyne_smev.server import WsdlDocument
+
+
+class _Interface(object):
+
+    def __init__(self):
+        self.app = _App()
+
+
+class _App(object):
+
+    def __init__(self):
+        self.in_protocol = _Protocol()
+
+
+class _Wsdl(object):
+    """
+    Документ интерфейса, построение которого для адреса ``slow_url`` ждет
+    события ``resume``
+    """
+
+    slow_url = "http://slow/"
+    started = None
+    resume = None
+
+    def __init__(self, interface):
+        self.interface = interface
+
+    def build_interface_document(self, url):
+        self.url = url
+        if url == self.slow_url:
+            self.started.set()
+            self.resume.wait(5)
+
+    def get_interface_document(self):
+        return self.url
+
+
+class _Protocol(object):
+
+    _interface_document_type = _Wsdl
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.document = WsdlDocument(b"<wsdl:definitions/>" * 100)
+
+    def test_not_modified(self):
+        document = self.document
+        self.assertTrue(document.is_not_modified(
+            {"HTTP_IF_NONE_MATCH": document.etag}))
+        self.assertTrue(document.is_not_modified(
+            {"HTTP_IF_NONE_MATCH": '"other", W/' + document.etag}))
+        self.assertFalse(document.is_not_modified(
+            {"HTTP_IF_NONE_MATCH": '"other"'}))
+        self.assertTrue(document.is_not_modified(
+            {"HTTP_IF_MODIFIED_SINCE": document.last_modified}))
+        self.assertFalse(document.is_not_modified(
+            {"HTTP_IF_MODIFIED_SINCE": "Thu, 01 Jan 2015 00:00:00 GMT"}))
+        # If-None-Match важнее If-Modified-Since
+        self.assertFalse(document.is_not_modified({
+            "HTTP_IF_NONE_MATCH": '"other"',
+            "HTTP_IF_MODIFIED_SINCE": document.last_modified}))
+        self.assertFalse(document.is_not_modified({}))
+
+    def test_etag_per_encoding(self):
+        document = self.document
+        self.assertEqual(len(set(document.etags.values())), 3)
+        gzip_etag = document.etags["gzip"]
+        self.assertTrue(document.is_not_modified(
+            {"HTTP_IF_NONE_MATCH": gzip_etag}, "gzip"))
+        # ETag сжатого варианта не подходит для несжатого
+        self.assertFalse(document.is_not_modified(
+            {"HTTP_IF_NONE_MATCH": gzip_etag}))
+        self.assertFalse(document.is_not_modified(
+            {"HTTP_IF_NONE_MATCH": document.etag}, "deflate"))
+
+    def test_content_encoding(self):
+        document = self.document
+        encoding, content = document.get_content(
+            {"HTTP_ACCEPT_ENCODING": "gzip, deflate"})
+        self.assertEqual(encoding, "gzip")
+        self.assertEqual(
+            gzip.GzipFile(fileobj=io.BytesIO(content)).read(), document.data)
+
+        encoding, content = document.get_content(
+            {"HTTP_ACCEPT_ENCODING": "gzip;q=0, deflate"})
+        self.assertEqual(encoding, "deflate")
+        self.assertEqual(zlib.decompress(content), document.data)
+
+        self.assertEqual(
+            document.get_content({"HTTP_ACCEPT_ENCODING": "identity"}),
+            (None, document.data))
+        self.assertEqual(document.get_content({}), (None, document.data))
+
+
+class InterfaceDocumentsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        _Wsdl.started = threading.Event()
+        _Wsdl.resume = threading.Event()
+        self.addCleanup(_Wsdl.resume.set)
+        self.documents = server._AllYourInterfaceDocuments(
+            _Interface(), ["http://pinned/"], max_wsdl_urls=2)
+        self.addCleanup(self._clear)
+
+    def _clear(self):
+        app = self.documents.wsdl11.interface.app
+        for key in list(server._wsdl_cache):
+            if key[0] is app:
+                del server._wsdl_cache[key]
+
+    def test_cached(self):
+        document = self.documents.get_wsdl("http://a/?wsdl")
+        self.assertEqual(document.data, "http://a/?wsdl")
+        self.assertIs(self.documents.get_wsdl("http://a/?wsdl"), document)
+        self.assertIs(self.documents.get_wsdl("http://a/"), document)
+        self.assertEqual(server._wsdl_build_locks, {})
+
+    def test_evicted_over_limit(self):
+        get_wsdl = self.documents.get_wsdl
+        pinned = get_wsdl("http://pinned/")
+        first = get_wsdl("http://a/")
+        get_wsdl("http://b/")
+        # a запрошен позже b, поэтому вытесняется b
+        self.assertIs(get_wsdl("http://a/"), first)
+        get_wsdl("http://c/")
+
+        self.assertIs(get_wsdl("http://a/"), first)
+        self.assertIs(get_wsdl("http://pinned/"), pinned)
+        app = self.documents.wsdl11.interface.app
+        self.assertEqual(
+            [url for cached, url in server._wsdl_cache if cached is app],
+            ["http://pinned/", "http://c/", "http://a/"])
+
+    def test_pinned_not_evicted(self):
+        pinned = self.documents.get_wsdl("http://pinned/")
+        for number in xrange(10):
+            self.documents.get_wsdl("http://{0}/".format(number))
+        self.assertIs(self.documents.get_wsdl("http://pinned/"), pinned)
+
+    def test_built_outside_global_lock(self):
+        slow = threading.Thread(
+            target=self.documents.get_wsdl, args=(_Wsdl.slow_url,))
+        slow.start()
+        self.assertTrue(_Wsdl.started.wait(5))
+
+        # wsdl другого адреса строится, пока медленное построение не
+        # завершено
+        fast = threading.Thread(
+            target=self.documents.get_wsdl, args=("http://a/",))
+        fast.start()
+        fast.join(1)
+        self.assertFalse(fast.is_alive())
+
+        _Wsdl.resume.set()
+        slow.join()
+        self.assertEqual(
+            self.documents.get_wsdl(_Wsdl.slow_url).data, _Wsdl.slow_url)
+
+
+if __name__ == '__main__':
+    unittest.main()
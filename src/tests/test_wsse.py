@@ -7,11 +7,338 @@ test_wsse.py
 :Author: tim    
 """
 
+import hashlib
+import threading
 import unittest
 
+from lxml import etree
+from spyne.model.fault import Fault
+
+from spyne_smev import crypto
+from spyne_smev.wsse import utils
+from spyne_smev.wsse.cache import VerifiedSignatureCache, SignatureReplayError
+from spyne_smev.wsse.protocols import X509TokenProfile
+from spyne_smev.wsse.truststore import TrustStore
+
+from tests.test_crypto import (
+    TEST_RSA_PRIVATE_KEY as TEST_PRIVATE_KEY,
+    TEST_RSA_PRIVATE_KEY_PASS as TEST_PRIVATE_KEY_PASS,
+    TEST_RSA_X509_CERT as TEST_X509_CERT)
+
+
+TEST_ENVELOPE = """\
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
+<soapenv:Body><tns:SayHello xmlns:tns="http://example.com/hello-world-tns">\
+<tns:Name>World</tns:Name><tns:Times>3</tns:Times></tns:SayHello>\
+</soapenv:Body></soapenv:Envelope>\
+"""
+
 
 class TestCase(unittest.TestCase):
 
     def test_something(self):
         self.assertEqual(True, False)
 
+
+class VerifiedSignatureCacheTestCase(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = VerifiedSignatureCache(maxsize=2)
+        self.assertFalse(cache.check("a"))
+        cache.add("a")
+        cache.add("b")
+        self.assertTrue(cache.check("a"))
+        cache.add("c")
+        self.assertFalse(cache.check("b"))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_expired(self):
+        cache = VerifiedSignatureCache(ttl=-1)
+        cache.add("a")
+        self.assertFalse(cache.check("a"))
+
+    def test_reject_replays(self):
+        cache = VerifiedSignatureCache(reject_replays=True)
+        cache.add("a")
+        self.assertRaises(SignatureReplayError, cache.check, "a")
+        # ключ запоминается самой проверкой
+        self.assertFalse(cache.check("b"))
+        self.assertRaises(SignatureReplayError, cache.check, "b")
+        cache.discard("b")
+        self.assertFalse(cache.check("b"))
+
+    def test_concurrent_replays(self):
+        cache = VerifiedSignatureCache(reject_replays=True)
+        document = etree.tostring(utils.sign_document(
+            etree.fromstring(TEST_ENVELOPE), TEST_X509_CERT,
+            TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS))
+        start = threading.Event()
+        results = []
+
+        def verify():
+            # как и в запросах, у каждого потока свое дерево
+            tree = etree.fromstring(document)
+            start.wait()
+            try:
+                utils.verify_document(tree, TEST_X509_CERT, cache)
+            except SignatureReplayError:
+                results.append(False)
+            else:
+                results.append(True)
+
+        threads = [threading.Thread(target=verify) for _ in xrange(8)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False] * 7 + [True])
+
+    def test_invalid_signature_forgotten(self):
+        cache = VerifiedSignatureCache(reject_replays=True)
+        document = utils.sign_document(
+            etree.fromstring(TEST_ENVELOPE), TEST_X509_CERT,
+            TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+        signature = document.find(
+            ".//{{{ds}}}SignatureValue".format(**utils._nsmap))
+        valid, signature.text = signature.text, "AAAA"
+        self.assertRaises(
+            crypto.InvalidSignature, utils.verify_document, document,
+            TEST_X509_CERT, cache)
+        self.assertEqual(len(cache), 0)
+        signature.text = valid
+        utils.verify_document(document, TEST_X509_CERT, cache)
+        self.assertEqual(len(cache), 1)
+
+
+class MalformedTokenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.document = utils.sign_document(
+            etree.fromstring(TEST_ENVELOPE), TEST_X509_CERT,
+            TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+        self.token = self.document.find(
+            ".//{{{wsse}}}BinarySecurityToken".format(**utils._nsmap))
+        self.trust_store = TrustStore(certificates=[TEST_X509_CERT])
+
+    def test_verify_document(self):
+        for text in ("abc", None):
+            self.token.text = text
+            self.assertRaises(
+                ValueError, utils.verify_document, self.document,
+                trust_store=self.trust_store)
+
+    def test_fault(self):
+        self.token.text = "abc"
+        profile = X509TokenProfile(
+            private_key=TEST_PRIVATE_KEY,
+            private_key_pass=TEST_PRIVATE_KEY_PASS,
+            certificate=TEST_X509_CERT, trust_store=self.trust_store)
+        self.assertRaises(Fault, profile.validate, self.document)
+
+
+class LocateSignatureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.document = utils.sign_document(
+            etree.fromstring(TEST_ENVELOPE), TEST_X509_CERT,
+            TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+
+    def _find(self, path):
+        return self.document.find(path.format(**utils._nsmap))
+
+    def test_signed(self):
+        nodes = utils.locate_signature(self.document)
+
+        self.assertIs(nodes.body, self._find("{{{soapenv}}}Body"))
+        self.assertIs(
+            nodes.binary_security_token,
+            self._find(".//{{{wsse}}}BinarySecurityToken"))
+        self.assertIs(nodes.signed_info, self._find(".//{{{ds}}}SignedInfo"))
+        self.assertIs(
+            nodes.c14n_method, self._find(".//{{{ds}}}CanonicalizationMethod"))
+        self.assertIs(
+            nodes.signature_method, self._find(".//{{{ds}}}SignatureMethod"))
+        self.assertIs(nodes.transform, self._find(".//{{{ds}}}Transform"))
+        self.assertIs(
+            nodes.digest_method, self._find(".//{{{ds}}}DigestMethod"))
+        self.assertIs(nodes.digest_value, self._find(".//{{{ds}}}DigestValue"))
+        self.assertIs(
+            nodes.signature_value, self._find(".//{{{ds}}}SignatureValue"))
+
+    def test_first_security_wins(self):
+        header = self._find("{{{soapenv}}}Header")
+        first = header[0]
+        header.append(utils.SigningProfile(
+            TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS
+        ).create_security_header())
+        # узлы подписи в Body не учитываются
+        body = self._find("{{{soapenv}}}Body")
+        body.insert(0, etree.Element(
+            "{{{ds}}}SignatureValue".format(**utils._nsmap)))
+
+        nodes = utils.locate_signature(self.document)
+        self.assertIs(
+            nodes.signature_value, first.find(
+                ".//{{{ds}}}SignatureValue".format(**utils._nsmap)))
+        self.assertIs(nodes.signed_info.getparent().getparent(), first)
+
+    def test_unsigned(self):
+        document = etree.fromstring(TEST_ENVELOPE)
+        nodes = utils.locate_signature(document)
+
+        self.assertIs(nodes.body, document[0])
+        self.assertEqual(
+            [name for name, value in vars(nodes).iteritems()
+             if value is not None],
+            ["body"])
+        self.assertRaises(ValueError, utils.verify_document, document)
+
+
+class C14nDigestTestCase(unittest.TestCase):
+
+    def test_same_as_tostring(self):
+        # пространства имен и xml-атрибуты объявлены вне Body
+        document = etree.fromstring(
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:tns="urn:test" xmlns:unused="urn:unused" xml:lang="ru">'
+            '<soapenv:Header/><soapenv:Body tns:attr="1">'
+            '<tns:Request><!-- comment --><Item b="2" a="1">1 &amp; 2'
+            '</Item><tns:Empty/></tns:Request>'
+            '</soapenv:Body></soapenv:Envelope>')
+        body = document[1]
+        for exclusive in (True, False):
+            for with_comments in (True, False):
+                canonical = etree.tostring(
+                    body, method="c14n", exclusive=exclusive,
+                    with_comments=with_comments)
+                self.assertEqual(
+                    utils.c14n_digest(body, "sha1", exclusive, with_comments),
+                    hashlib.sha1(canonical).digest(), canonical)
+
+
+class _FailingSink(object):
+
+    def write(self, data):
+        raise IOError("No space left on device")
+
+    def discard(self):
+        pass
+
+
+class RollbackTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = utils.SigningProfile(
+            TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+
+    def _assert_rolled_back(self, document):
+        original = etree.tostring(document)
+        self.assertRaises(
+            IOError, self.profile.sign, document, in_place=True,
+            body_sink=_FailingSink())
+        self.assertEqual(etree.tostring(document), original)
+
+    def test_unsigned(self):
+        # префикс q используется только в значении элемента
+        self._assert_rolled_back(etree.fromstring(
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+            '<soapenv:Body xmlns:q="urn:q"><tns:Type xmlns:tns="urn:test">'
+            'q:Value</tns:Type></soapenv:Body></soapenv:Envelope>'))
+
+    def test_signed(self):
+        self._assert_rolled_back(
+            self.profile.sign(etree.fromstring(TEST_ENVELOPE)))
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = utils.SigningProfile(
+            TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+
+    def _documents(self):
+        documents = [etree.fromstring(TEST_ENVELOPE) for _ in xrange(4)]
+        # документ без Body не подписывается
+        documents[1] = etree.fromstring(
+            '<soapenv:Envelope xmlns:soapenv='
+            '"http://schemas.xmlsoap.org/soap/envelope/"/>')
+        for number, document in enumerate(documents):
+            document.set("number", str(number))
+        return documents
+
+    def _sign(self, processes):
+        results = list(utils.sign_documents(
+            self._documents(), self.profile, processes, chunksize=1))
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[1][0], None)
+        self.assertIsInstance(results[1][1], Exception)
+        signed = [document for document, _ in results]
+        self.assertEqual(
+            [document.get("number") for document in signed
+             if document is not None],
+            ["0", "2", "3"])
+
+        # подпись третьего документа испорчена
+        name = signed[2].find(".//{http://example.com/hello-world-tns}Name")
+        name.text = "Tampered"
+        del signed[1]
+        results = list(utils.verify_documents(
+            signed, certificate=TEST_X509_CERT, processes=processes,
+            chunksize=1))
+        self.assertEqual(
+            [document.get("number") for document, _ in results],
+            ["0", "2", "3"])
+        self.assertEqual(
+            [error is None for _, error in results], [True, False, True])
+
+    def test_in_process(self):
+        self._sign(None)
+
+    def test_processes(self):
+        self._sign(2)
+
+    def test_verified_cache_with_processes(self):
+        documents = utils.verify_documents(
+            [], certificate=TEST_X509_CERT,
+            verified_cache=VerifiedSignatureCache(), processes=2)
+        self.assertRaises(ValueError, list, documents)
+
+
+class SigningProfileTestCase(unittest.TestCase):
+
+    def test_same_as_sign_document(self):
+        profile = utils.SigningProfile(
+            TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+        document = etree.fromstring(TEST_ENVELOPE)
+        original = etree.tostring(document)
+        first = profile.sign(document)
+        second = profile.sign(document)
+        expected = utils.sign_document(
+            document, TEST_X509_CERT, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+
+        self.assertEqual(etree.tostring(document), original)
+        for signed in (first, second, expected):
+            utils.verify_document(signed, TEST_X509_CERT)
+        # у каждой подписи свои идентификаторы
+        self.assertNotEqual(
+            first.find(".//{{{wsse}}}BinarySecurityToken".format(
+                **utils._nsmap)).attrib,
+            second.find(".//{{{wsse}}}BinarySecurityToken".format(
+                **utils._nsmap)).attrib)
+        self.assertEqual(
+            [element.tag for element in first.iter()],
+            [element.tag for element in expected.iter()])
+
+    def test_certificate_handle(self):
+        certificate = crypto.load_certificate(TEST_X509_CERT)
+        profile = utils.SigningProfile(
+            certificate, TEST_PRIVATE_KEY, TEST_PRIVATE_KEY_PASS)
+        signed = profile.sign(etree.fromstring(TEST_ENVELOPE))
+
+        self.assertEqual(
+            profile.token, utils._get_clean_cert_data(TEST_X509_CERT))
+        utils.verify_document(signed, TEST_X509_CERT)
+        utils.verify_document(signed, certificate)